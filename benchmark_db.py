@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки слоя базы данных.
+
+Запуск: python benchmark_db.py [сценарий ...]
+Без аргументов выполняются все сценарии. Каждый сценарий работает
+на временной базе и не трогает military_tracker.db.
+"""
+import os
+import sys
+import sqlite3
+import logging
+import tempfile
+import threading
+import time
+from statistics import median
+
+from services.db_service import DatabaseService, encode_cursor
+from services.locations import ACTION_CODES, get_location_id
+
+LOCATIONS = ["🏥 Поликлиника", "⚓ ОБРМП", "🌆 Калининград", "🛒 Магазин", "🍲 Столовая"]
+
+
+def timeit(func, repeat: int = 200) -> float:
+    """Медианная задержка одного вызова в микросекундах"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return median(samples)
+
+
+def seed_database(db: DatabaseService, users: int, records_per_user: int = 0, step_minutes: int = 1):
+    """Заполнить базу тестовыми пользователями и записями (с шагом step_minutes в прошлое)"""
+    with db.connections.writer() as conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO users (id, username, full_name) VALUES (?, ?, ?)',
+            [(uid, f"user_{uid}", f"Боец{uid:05d} И.И.") for uid in range(1, users + 1)]
+        )
+        location_ids = {name: get_location_id(conn, name) for name in LOCATIONS + ['Часть']}
+        rows = []
+        for uid in range(1, users + 1):
+            for i in range(records_per_user):
+                action = 'не в части' if i % 2 == 0 else 'в части'
+                location = LOCATIONS[(uid + i) % len(LOCATIONS)] if action == 'не в части' else 'Часть'
+                rows.append((uid, ACTION_CODES[action], location_ids[location],
+                             f"-{(records_per_user - i) * step_minutes} minutes"))
+        conn.executemany(
+            'INSERT INTO records (user_id, action, location_id, timestamp, day) '
+            "VALUES (?1, ?2, ?3, CAST(strftime('%s', 'now', ?4) AS INTEGER), date('now', ?4, 'localtime'))",
+            rows
+        )
+
+def print_table(title: str, rows):
+    print(f"\n{title}")
+    print("-" * 64)
+    for row in rows:
+        print("  ".join(str(cell).ljust(22) for cell in row))
+
+
+def bench_connections(workdir: str):
+    """Задержка вызова: соединение на каждый вызов против менеджера соединений"""
+    path = os.path.join(workdir, "connections.db")
+    db = DatabaseService(path)
+    seed_database(db, users=150, records_per_user=20)
+
+    def legacy_get_user():
+        with sqlite3.connect(path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM users WHERE id = ?', (42,)).fetchone()
+            return dict(row) if row else None
+
+    def legacy_is_admin():
+        with sqlite3.connect(path) as conn:
+            return conn.execute('SELECT 1 FROM admins WHERE user_id = ?', (42,)).fetchone() is not None
+
+    def legacy_user_records():
+        with sqlite3.connect(path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                'SELECT * FROM records_named WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?', (42, 1)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def legacy_insert():
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                'INSERT INTO records (user_id, action, location_id) VALUES (?, ?, ?)',
+                (43, ACTION_CODES['в части'], get_location_id(conn, 'Часть'))
+            )
+            conn.commit()
+
+    def managed_insert():
+        with db.connections.writer() as conn:
+            conn.execute(
+                'INSERT INTO records (user_id, action, location_id) VALUES (?, ?, ?)',
+                (43, ACTION_CODES['в части'], get_location_id(conn, 'Часть'))
+            )
+
+    rows = [("вызов", "до, мкс", "после, мкс")]
+    rows.append(("get_user", f"{timeit(legacy_get_user):.0f}", f"{timeit(lambda: db.get_user(42)):.0f}"))
+    rows.append(("is_admin", f"{timeit(legacy_is_admin):.0f}", f"{timeit(lambda: db.is_admin(42)):.0f}"))
+    rows.append(("get_user_records", f"{timeit(legacy_user_records):.0f}",
+                 f"{timeit(lambda: db.get_user_records(42, 1)):.0f}"))
+    rows.append(("INSERT records", f"{timeit(legacy_insert):.0f}", f"{timeit(managed_insert):.0f}"))
+    print_table("Соединение на вызов (до) против менеджера соединений (после)", rows)
+    db.close()
+
+
+def bench_status(workdir: str):
+    """get_current_status: N+1 запросов, один запрос по истории и таблица user_status"""
+    rows = [("пользователей", "N+1, мс", "по истории, мс", "user_status, мс")]
+    for users in (100, 1_000, 10_000):
+        path = os.path.join(workdir, f"status_{users}.db")
+        db = DatabaseService(path)
+        seed_database(db, users=users, records_per_user=10)
+
+        def legacy_status():
+            with db.connections.reader() as conn:
+                result = []
+                for user in conn.execute('SELECT id, full_name FROM users').fetchall():
+                    last = conn.execute(
+                        'SELECT action, location FROM records_named WHERE user_id = ? '
+                        'ORDER BY timestamp DESC LIMIT 1', (user['id'],)
+                    ).fetchone()
+                    result.append((user['full_name'], last))
+                return result
+
+        def history_status():
+            with db.connections.reader() as conn:
+                return conn.execute(
+                    'SELECT u.full_name, r.action, r.location FROM users u '
+                    'LEFT JOIN records_named r ON r.id = (SELECT id FROM records WHERE user_id = u.id '
+                    'ORDER BY timestamp DESC, id DESC LIMIT 1) ORDER BY u.id'
+                ).fetchall()
+
+        repeat = max(5, 20_000 // users)
+        rows.append((
+            users,
+            f"{timeit(legacy_status, repeat) / 1000:.2f}",
+            f"{timeit(history_status, repeat) / 1000:.2f}",
+            f"{timeit(db.get_current_status, repeat) / 1000:.2f}"
+        ))
+        db.close()
+    print_table("get_current_status по числу пользователей (10 записей на пользователя)", rows)
+
+def run_writers(writers: int, ops_per_writer: int, write) -> float:
+    """Запустить параллельных писателей и вернуть пропускную способность, операций/с"""
+    barrier = threading.Barrier(writers + 1)
+
+    def worker(index: int):
+        user_id = index + 1
+        barrier.wait()
+        for i in range(ops_per_writer):
+            action = 'не в части' if i % 2 == 0 else 'в части'
+            write(user_id, action, LOCATIONS[i % len(LOCATIONS)] if action == 'не в части' else 'Часть')
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return writers * ops_per_writer / (time.perf_counter() - start)
+
+
+def bench_group_commit(workdir: str):
+    """add_record: транзакция на вызов против очереди с групповой фиксацией"""
+    rows = [("synchronous", "писателей", "на вызов, оп/с", "очередь, оп/с", "ср. пакет")]
+    total_ops = 2000
+    for synchronous in ("NORMAL", "FULL"):
+        for writers in (1, 10, 100):
+            path = os.path.join(workdir, f"group_{synchronous}_{writers}.db")
+            db = DatabaseService(path)
+            seed_database(db, users=writers)
+            with db.connections.raw_writer() as conn:
+                conn.execute(f"PRAGMA synchronous={synchronous}")
+
+            def direct(user_id, action, location):
+                with db.connections.writer() as conn:
+                    return db._add_record_tx(conn, user_id, action, location)
+
+            ops = max(1, total_ops // writers)
+            per_call = run_writers(writers, ops, direct)
+            queued = run_writers(writers, ops, db.add_record)
+            rows.append((synchronous, writers, f"{per_call:.0f}", f"{queued:.0f}",
+                         db.write_queue.get_stats()['avg_batch_size']))
+            db.close()
+    print_table("Пропускная способность add_record при параллельных писателях", rows)
+
+
+def bench_pagination(workdir: str):
+    """Журнал постранично: LIMIT/OFFSET с COUNT(*) против курсора и кэшированного количества"""
+    path = os.path.join(workdir, "pagination.db")
+    db = DatabaseService(path)
+    seed_database(db, users=1000, records_per_user=100)
+    per_page = 10
+
+    def offset_page(page):
+        with db.connections.reader() as conn:
+            conn.execute(
+                'SELECT COUNT(*) FROM records r JOIN users u ON r.user_id = u.id '
+                "WHERE r.timestamp > CAST(strftime('%s', 'now', '-7 days') AS INTEGER)"
+            ).fetchone()
+            return conn.execute(
+                'SELECT r.*, u.full_name FROM records_named r JOIN users u ON r.user_id = u.id '
+                "WHERE r.timestamp > CAST(strftime('%s', 'now', '-7 days') AS INTEGER) "
+                'ORDER BY r.timestamp DESC LIMIT ? OFFSET ?',
+                (per_page, (page - 1) * per_page)
+            ).fetchall()
+
+    rows = [("страница", "OFFSET, мс", "курсор, мс")]
+    for page in (1, 100, 1000, 5000):
+        # Курсор на нужную страницу - id последней записи предыдущей страницы
+        anchor = offset_page(page - 1)[-1]['id'] if page > 1 else None
+        cursor = encode_cursor('n', anchor) if anchor is not None else None
+        rows.append((
+            page,
+            f"{timeit(lambda: offset_page(page), 20) / 1000:.2f}",
+            f"{timeit(lambda: db.get_records_paginated(cursor=cursor, per_page=per_page), 20) / 1000:.2f}"
+        ))
+    print_table("Журнал: 100 000 записей, 10 на страницу", rows)
+    db.close()
+
+
+def bench_startup(workdir: str):
+    """Запуск: отдельный DatabaseService в каждом модуле против одного общего (services.registry)"""
+    path = os.path.join(workdir, "startup.db")
+    db = DatabaseService(path)
+    seed_database(db, users=1000, records_per_user=100)
+    db.close()
+
+    def open_services(count):
+        instances = [DatabaseService(path) for _ in range(count)]
+        for instance in instances:
+            instance.close()
+
+    # Столько модулей создавали свой экземпляр при импорте
+    modules = 10
+    rows = [("вариант", "мс", "")]
+    rows.append((f"{modules} экземпляров", f"{timeit(lambda: open_services(modules), 20) / 1000:.2f}", ""))
+    rows.append(("общий экземпляр", f"{timeit(lambda: open_services(1), 20) / 1000:.2f}", ""))
+    print_table("Инициализация слоя БД при запуске (схема актуальна)", rows)
+
+
+def bench_locations(workdir: str):
+    """ТОП локаций: группировка по тексту локации против location_id из справочника"""
+    path = os.path.join(workdir, "locations.db")
+    db = DatabaseService(path)
+    seed_database(db, users=1000, records_per_user=100)
+
+    def text_top():
+        with db.connections.reader() as conn:
+            return conn.execute(
+                'SELECT location, COUNT(*) AS count FROM records_named '
+                "WHERE timestamp > CAST(strftime('%s', 'now', '-30 days') AS INTEGER) "
+                "AND action = 'не в части' GROUP BY location ORDER BY count DESC LIMIT 10"
+            ).fetchall()
+
+    with db.connections.raw_writer() as conn:
+        conn.execute('VACUUM')
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+
+    rows = [("вариант", "мс", "")]
+    rows.append(("GROUP BY location", f"{timeit(text_top, 20) / 1000:.2f}", ""))
+    rows.append(("GROUP BY location_id", f"{timeit(lambda: db.get_top_locations(30), 20) / 1000:.2f}", ""))
+    rows.append(("размер базы, МБ", f"{page_size * pages / 1_000_000:.1f}", ""))
+    print_table("ТОП локаций за 30 дней (100 000 записей)", rows)
+    db.close()
+
+
+def bench_status_at(workdir: str):
+    """get_status_at: статус на момент в прошлом при годовой истории"""
+    path = os.path.join(workdir, "status_at.db")
+    db = DatabaseService(path)
+    # 4 отметки в сутки за год
+    seed_database(db, users=500, records_per_user=4 * 365, step_minutes=360)
+    with db.connections.raw_writer() as conn:
+        conn.execute('ANALYZE')
+
+    now = int(time.time())
+    rows = [("момент", "мс", "")]
+    for title, offset in (("час назад", 3600), ("вчера", 86400), ("месяц назад", 30 * 86400),
+                          ("полгода назад", 182 * 86400)):
+        rows.append((title, f"{timeit(lambda: db.get_status_at(now - offset), 20) / 1000:.2f}", ""))
+    rows.append(("текущий (user_status)", f"{timeit(db.get_current_status, 20) / 1000:.2f}", ""))
+    print_table("Статус на момент: 500 бойцов, 730 000 записей за год", rows)
+    db.close()
+
+
+SCENARIOS = {
+    'connections': bench_connections,
+    'status': bench_status,
+    'group_commit': bench_group_commit,
+    'pagination': bench_pagination,
+    'startup': bench_startup,
+    'locations': bench_locations,
+    'status_at': bench_status_at,
+}
+
+
+def main(argv):
+    logging.basicConfig(level=logging.ERROR)
+    names = argv or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Неизвестные сценарии: {', '.join(unknown)}. Доступны: {', '.join(SCENARIOS)}")
+        return 1
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            SCENARIOS[name](workdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
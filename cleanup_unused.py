@@ -2,11 +2,11 @@
 import os
 import logging
 from datetime import datetime, timedelta
-from services.db_service import DatabaseService
+from services.registry import get_db
 
 class SystemCleaner:
     def __init__(self):
-        self.db = DatabaseService()
+        self.db = get_db()
         self.logger = logging.getLogger(__name__)
     
     def full_cleanup(self) -> dict:
@@ -36,5 +36,18 @@ LOCATIONS = [
 # Настройки базы данных
 DB_NAME = 'military_tracker.db'
 
+# Каталог реплики базы (services/replication.py); не задан - репликация выключена.
+# REPLICA_APPLY=0 - реплику применяет отдельный процесс:
+# python -m services.replication apply <каталог>
+REPLICA_DIR = os.getenv('REPLICA_DIR')
+REPLICA_APPLY = os.getenv('REPLICA_APPLY', '1') != '0'
+
+# Обработка обновлений (services/update_queue.py): сколько обновлений разных
+# пользователей обрабатывается одновременно, сколько ждет очереди (сверх -
+# отклоняются) и сколько ждущих допускается от одного пользователя
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', 8))
+UPDATE_QUEUE_LIMIT = int(os.getenv('UPDATE_QUEUE_LIMIT', 200))
+UPDATE_USER_QUEUE_LIMIT = int(os.getenv('UPDATE_USER_QUEUE_LIMIT', 5))
+
 # Настройки экспорта
 EXPORT_FILENAME = 'military_records.xlsx'
\ No newline at end of file
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Служебные команды для базы данных.
+
+Запуск: python db_tools.py <команда> [--db путь]
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from services.db_service import DatabaseService
+from services.indexes import sync_indexes
+from utils.validators import parse_moment
+
+
+def cmd_rebuild_status(db: DatabaseService, args) -> int:
+    """Пересчитать таблицу текущих статусов по истории записей"""
+    count = db.rebuild_user_status()
+    print(f"✅ user_status пересчитана: {count} пользователей")
+    return 0
+
+
+def cmd_rebuild_absences(db: DatabaseService, args) -> int:
+    """Пересобрать интервалы отсутствия по истории записей"""
+    count = db.rebuild_absences()
+    print(f"✅ absences пересобрана: {count} интервалов")
+    return 0
+
+
+def cmd_rebuild_rollups(db: DatabaseService, args) -> int:
+    """Пересобрать сводки по дням и часам по истории записей"""
+    counts = db.rebuild_rollups()
+    print(f"✅ Сводки пересобраны: {counts['daily']} строк по дням, {counts['hourly']} по часам")
+    return 0
+
+
+def cmd_maintenance(db: DatabaseService, args) -> int:
+    """Выполнить обслуживание сейчас: incremental_vacuum, optimize, checkpoint"""
+    converted = db.maintenance.convert_to_incremental()
+    if converted is not None:
+        print("✅ База переведена в auto_vacuum=INCREMENTAL")
+    result = db.maintenance.run_all()
+    vacuum = result['incremental_vacuum'] or {}
+    print(f"✅ Освобождено страниц: {vacuum.get('freed_pages', 0)}")
+    print(f"✅ PRAGMA optimize: {'OK' if result['optimize'] else 'ошибка'}")
+    print(f"✅ Checkpoint: {result['wal_checkpoint']}")
+    return 0
+
+
+def cmd_maintenance_log(db: DatabaseService, args) -> int:
+    """Показать последние запуски обслуживания"""
+    for run in db.maintenance.get_recent_runs():
+        started = datetime.fromtimestamp(run['started_at']).strftime('%d.%m.%Y %H:%M:%S')
+        status = '✅' if run['success'] else '❌'
+        print(f"{status} {started} {run['task']:<24} {run['duration_ms']:>10.1f} мс  {run['details']}")
+    return 0
+
+
+def cmd_indexes(db: DatabaseService, args) -> int:
+    """Привести индексы к управляемому набору services/indexes.py"""
+    with db.connections.writer() as conn:
+        result = sync_indexes(conn)
+    if not any(result.values()):
+        print("✅ Индексы соответствуют набору")
+    for action, names in result.items():
+        for name in names:
+            print(f"✅ {action}: {name}")
+    return 0
+
+
+def cmd_backup(db: DatabaseService, args) -> int:
+    """Сделать снимок базы сейчас"""
+    result = db.backup_now()
+    if result is None:
+        print("❌ Снимок не создан - подробности в логе")
+        return 1
+    print(f"✅ {result['path']}")
+    print(f"   База: {result['db_size'] / 1024 / 1024:.1f} МБ, снимок: {result['size'] / 1024 / 1024:.1f} МБ")
+    print(f"   Копирование: {result['copy_seconds']} с ({result['steps']} шагов), всего: {result['duration']} с")
+    return 0
+
+
+def cmd_backups(db: DatabaseService, args) -> int:
+    """Показать снимки и архив WAL"""
+    for snapshot in db.backups.list_snapshots():
+        created = datetime.fromtimestamp(snapshot['created_at']).strftime('%d.%m.%Y %H:%M:%S')
+        print(f"📦 {created}  {snapshot['size'] / 1024 / 1024:>8.1f} МБ  {os.path.basename(snapshot['path'])}")
+    status = db.get_backup_status()
+    print(f"🗂 Сегментов WAL: {status.get('wal_segments', 0)}, {status.get('wal_size', 0) / 1024 / 1024:.1f} МБ")
+    return 0
+
+
+def cmd_restore(db: DatabaseService, args) -> int:
+    """Восстановить базу из снимков и архива WAL в новый файл"""
+    moment = None
+    if args.at:
+        moment = parse_moment(args.at)
+        if moment is None:
+            print(f"❌ Не удалось разобрать момент: {args.at}")
+            return 1
+    try:
+        result = db.backups.restore(args.output, moment.timestamp() if moment else None)
+    except (ValueError, FileExistsError) as e:
+        print(f"❌ {e}")
+        return 1
+    restored_to = datetime.fromtimestamp(result['restored_to']).strftime('%d.%m.%Y %H:%M:%S')
+    print(f"✅ {result['path']}: состояние на {restored_to}")
+    print(f"   Снимок: {os.path.basename(result['snapshot'])}, сегментов WAL: {result['segments']}, "
+          f"транзакций: {result['transactions']}, за {result['duration']} с")
+    print(f"   integrity_check: {result['integrity']}")
+    return 0 if result['integrity'] == 'ok' else 1
+
+
+COMMANDS = {
+    'rebuild-status': (cmd_rebuild_status, "Пересчитать user_status по истории записей"),
+    'rebuild-absences': (cmd_rebuild_absences, "Пересобрать интервалы отсутствия по истории записей"),
+    'rebuild-rollups': (cmd_rebuild_rollups, "Пересобрать сводки stats_daily/stats_hourly по истории записей"),
+    'maintenance': (cmd_maintenance, "Обслуживание базы: перевод в incremental auto_vacuum, optimize, checkpoint"),
+    'maintenance-log': (cmd_maintenance_log, "Журнал фонового обслуживания"),
+    'indexes': (cmd_indexes, "Создать недостающие и удалить лишние индексы (services/indexes.py)"),
+    'backup': (cmd_backup, "Снимок базы через backup API в backups/"),
+    'backups': (cmd_backups, "Список снимков и размер архива WAL"),
+    'restore': (cmd_restore, "Восстановить базу на момент времени в новый файл"),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Служебные команды базы данных")
+    parser.add_argument('--db', default=None, help="Путь к базе (по умолчанию DB_NAME из config.py)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+    restore = subparsers.choices['restore']
+    restore.add_argument('output', help="Файл восстановленной базы (не должен существовать)")
+    restore.add_argument('--at', default=None,
+                         help="Момент: \"14:00\", \"вчера 9:30\", \"17.10 12:00\", ISO; по умолчанию - последний захват WAL")
+    return parser
+
+
+def main(argv) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    args = build_parser().parse_args(argv)
+
+    db_path = args.db
+    if db_path is None:
+        from config import DB_NAME
+        db_path = DB_NAME
+
+    db = DatabaseService(db_path)
+    try:
+        handler, _ = COMMANDS[args.command]
+        return handler(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
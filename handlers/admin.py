@@ -3,23 +3,25 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from services.db_service import DatabaseService
+from services.registry import get_async_db, get_render_cache
 from config import MAIN_ADMIN_ID
+import asyncio
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 from monitoring import monitor, advanced_logger, get_system_status
+from utils.validators import parse_moment
 
 # Проверяем наличие необходимых библиотек для экспорта
 try:
-    import pandas as pd
     import openpyxl
     EXPORT_AVAILABLE = True
     logging.info("✅ Библиотеки экспорта загружены успешно")
 except ImportError as e:
     EXPORT_AVAILABLE = False
     logging.error(f"❌ Ошибка импорта библиотек экспорта: {e}")
-    logging.error("Необходимо установить: pip install pandas openpyxl")
+    logging.error("Необходимо установить: pip install openpyxl")
 
 router = Router()
 
@@ -29,15 +31,18 @@ class AdminStates(StatesGroup):
     waiting_for_search_query = State()
     waiting_for_filter_period = State()
     waiting_for_bulk_action = State()
+    waiting_for_status_moment = State()
 
 # Инициализация базы данных
-db = DatabaseService()
+db = get_async_db()
+render_cache = get_render_cache()
 
 def get_admin_panel_keyboard(is_main_admin: bool = False):
     """Создать клавиатуру админ-панели"""
     keyboard = [
         [
             InlineKeyboardButton(text="📊 Сводка", callback_data="admin_summary"),
+            InlineKeyboardButton(text="🕰 На момент", callback_data="admin_status_at"),
             InlineKeyboardButton(text="🔍 Поиск", callback_data="admin_search")
         ],
         [
@@ -153,7 +158,7 @@ async def is_admin(user_id: int) -> bool:
     """Проверить права администратора"""
     if user_id == MAIN_ADMIN_ID:
         return True
-    return db.is_admin(user_id)
+    return await db.is_admin(user_id)
 
 @router.callback_query(F.data == "admin_panel")
 async def callback_admin_panel(callback: CallbackQuery):
@@ -206,15 +211,10 @@ async def handle_search_query(message: Message, state: FSMContext):
     await state.clear()
 
     try:
-        # Поиск пользователей
-        users = db.get_all_users()
-        found_users = [u for u in users if query.lower() in u['full_name'].lower()]
-
-        # Поиск записей
-        records = db.get_all_records(days=30)
-        found_records = [r for r in records if 
-                        query.lower() in r['full_name'].lower() or 
-                        query.lower() in r['location'].lower()]
+        # Полнотекстовый поиск бойцов и записей за 30 дней
+        results = await db.search(query, limit=20, days=30)
+        found_users = results['users']
+        found_records = results['records']
 
         text = f"🔍 **Результаты поиска: '{query}'**\n\n"
 
@@ -229,7 +229,7 @@ async def handle_search_query(message: Message, state: FSMContext):
         if found_records:
             text += f"📋 **Найдено записей: {len(found_records)}**\n"
             for record in found_records[:5]:
-                timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
+                timestamp = datetime.fromtimestamp(record['timestamp'])
                 formatted_time = timestamp.strftime('%d.%m %H:%M')
                 action_emoji = "🔴" if record['action'] == "не в части" else "🟢"
                 text += f"{action_emoji} {record['full_name']} - {record['location']} ({formatted_time})\n"
@@ -292,21 +292,21 @@ async def callback_filter_journal(callback: CallbackQuery):
 
         if filter_type in ["1", "7", "30"]:
             days = int(filter_type)
-            records = db.get_all_records(days=days, limit=50)
+            records = await db.get_all_records(days=days, limit=50)
             period_text = f"{days} дн."
         elif filter_type == "arrived":
-            records = db.get_all_records(days=7, limit=50)
+            records = await db.get_all_records(days=7, limit=50)
             records = [r for r in records if r['action'] == 'в части']
             period_text = "прибытия (7 дн.)"
         elif filter_type == "departed":
-            records = db.get_all_records(days=7, limit=50)
+            records = await db.get_all_records(days=7, limit=50)
             records = [r for r in records if r['action'] == 'не в части']
             period_text = "убытия (7 дн.)"
         elif filter_type == "reset":
-            records = db.get_all_records(days=7, limit=50)
+            records = await db.get_all_records(days=7, limit=50)
             period_text = "все (7 дн.)"
         else:
-            records = db.get_all_records(days=7, limit=50)
+            records = await db.get_all_records(days=7, limit=50)
             period_text = "все (7 дн.)"
 
         if not records:
@@ -318,7 +318,7 @@ async def callback_filter_journal(callback: CallbackQuery):
 
             for i, record in enumerate(records[:15], 1):
                 try:
-                    timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
+                    timestamp = datetime.fromtimestamp(record['timestamp'])
                     formatted_date = timestamp.strftime('%d.%m')
                     formatted_time = timestamp.strftime('%H:%M')
 
@@ -389,6 +389,48 @@ async def callback_admin_personnel(callback: CallbackQuery):
     )
     await callback.answer()
 
+PERSONNEL_PAGE_SIZE = 20
+
+async def show_personnel_page(callback: CallbackQuery, cursor: str = None):
+    """Список всех бойцов постранично (пагинация по курсору)"""
+    page = await db.get_users_paginated(cursor=cursor, per_page=PERSONNEL_PAGE_SIZE)
+
+    text = f"👥 **Все бойцы (~{page['total_users']})**\n\n"
+    if not page['users']:
+        text += "📝 Список пуст или устарел. Откройте его заново."
+    for user in page['users']:
+        text += f"• {user['full_name']}\n"
+
+    navigation = []
+    if page['has_prev']:
+        navigation.append(InlineKeyboardButton(text="⬅️", callback_data=f"personnel_page_{page['prev_cursor']}"))
+    if page['has_next']:
+        navigation.append(InlineKeyboardButton(text="➡️", callback_data=f"personnel_page_{page['next_cursor']}"))
+
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="admin_personnel")])
+
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("personnel_page_"))
+async def callback_personnel_page(callback: CallbackQuery):
+    """Листание списка бойцов"""
+    user_id = callback.from_user.id
+    if not await is_admin(user_id):
+        await callback.answer("❌ У вас нет прав администратора", show_alert=True)
+        return
+
+    try:
+        await show_personnel_page(callback, callback.data[len("personnel_page_"):])
+    except Exception as e:
+        logging.error(f"Ошибка в personnel_page: {e}")
+        await callback.answer("❌ Ошибка получения данных", show_alert=True)
+
 @router.callback_query(F.data.startswith("personnel_"))
 async def callback_personnel_action(callback: CallbackQuery):
     """Действия с персоналом"""
@@ -401,15 +443,11 @@ async def callback_personnel_action(callback: CallbackQuery):
 
     try:
         if action == "all":
-            users = db.get_all_users()
-            text = f"👥 **Все бойцы ({len(users)})**\n\n"
-            for i, user in enumerate(users[:20], 1):
-                text += f"{i}. {user['full_name']}\n"
-            if len(users) > 20:
-                text += f"... и еще {len(users) - 20}"
+            await show_personnel_page(callback)
+            return
 
         elif action == "present":
-            status = db.get_current_status()
+            status = await db.get_current_status()
             present_users = status.get('present_users', [])
             text = f"✅ **В части ({len(present_users)})**\n\n"
             for i, user in enumerate(present_users[:20], 1):
@@ -418,7 +456,7 @@ async def callback_personnel_action(callback: CallbackQuery):
                 text += f"... и еще {len(present_users) - 20}"
 
         elif action == "absent":
-            status = db.get_current_status()
+            status = await db.get_current_status()
             absent_users = status.get('absent_users', [])
             text = f"❌ **Отсутствуют ({len(absent_users)})**\n\n"
             for i, user in enumerate(absent_users[:20], 1):
@@ -438,21 +476,16 @@ async def callback_personnel_action(callback: CallbackQuery):
 
         elif action == "details":
             # Показываем детальную статистику по бойцам
-            users = db.get_all_users()
+            users = await db.get_all_users()
             text = f"📊 **Детальная информация**\n\n"
             text += f"👥 Всего бойцов: {len(users)}\n\n"
 
-            # Статистика активности за последние 30 дней
-            records = db.get_all_records(days=30, limit=1000)
-            if records:
-                user_activity = {}
-                for record in records:
-                    name = record['full_name']
-                    user_activity[name] = user_activity.get(name, 0) + 1
+            # Статистика активности за последние 30 дней (сводка по дням)
+            user_activity = (await db.get_period_stats(days=30))['users']
 
+            if user_activity:
                 text += "📈 **Активность за 30 дней:**\n"
-                sorted_activity = sorted(user_activity.items(), key=lambda x: x[1], reverse=True)
-                for i, (name, count) in enumerate(sorted_activity[:10], 1):
+                for i, (name, count) in enumerate(user_activity[:10], 1):
                     text += f"{i}. {name}: {count} записей\n"
             else:
                 text += "📝 Записей активности не найдено"
@@ -512,13 +545,13 @@ async def callback_analytics_action(callback: CallbackQuery):
     try:
         if action == "general":
             # Общая статистика
-            records = db.get_all_records(days=30)
-            users = db.get_all_users()
-            status = db.get_current_status()
+            users = await db.get_all_users()
+            status = await db.get_current_status()
 
-            total_actions = len(records)
-            departures = len([r for r in records if r['action'] == 'не в части'])
-            arrivals = len([r for r in records if r['action'] == 'в части'])
+            period = await db.get_period_stats(days=30)
+            total_actions = period['total']
+            departures = period['departures']
+            arrivals = period['arrivals']
 
             text = "📊 **Общая статистика за 30 дней**\n\n"
             text += f"👥 Всего бойцов: {len(users)}\n"
@@ -534,61 +567,57 @@ async def callback_analytics_action(callback: CallbackQuery):
             text += f"• Присутствие: {(status.get('present', 0) / len(users) * 100):.1f}%\n" if users else "• Присутствие: 0%\n"
 
         elif action == "locations":
-            # Статистика по локациям
-            records = db.get_all_records(days=30)
-            locations = {}
-            for record in records:
-                if record['action'] == 'не в части':
-                    loc = record['location']
-                    locations[loc] = locations.get(loc, 0) + 1
+            # Статистика по локациям - группировка по справочнику в базе
+            locations = await db.get_top_locations(days=30, limit=None)
+            durations = await db.get_location_durations(days=30)
 
             text = "📍 **Статистика по локациям (30 дней)**\n\n"
             if locations:
-                sorted_locations = sorted(locations.items(), key=lambda x: x[1], reverse=True)
+                total_departures = sum(count for _, count in locations)
                 text += "🏆 **ТОП локации:**\n"
-                for i, (location, count) in enumerate(sorted_locations[:10], 1):
-                    percentage = (count / sum(locations.values()) * 100)
+                for i, (location, count) in enumerate(locations[:10], 1):
+                    percentage = (count / total_departures * 100)
                     text += f"{i}. {location}: {count} ({percentage:.1f}%)\n"
+
+                if durations:
+                    text += "\n⏱ **Средняя длительность отсутствия:**\n"
+                    for item in sorted(durations, key=lambda x: x['avg_seconds'], reverse=True)[:10]:
+                        text += f"• {item['location']}: {format_duration(item['avg_seconds'])}\n"
             else:
                 text += "📝 Данных по локациям не найдено"
 
         elif action == "soldiers":
             # Статистика по бойцам
-            records = db.get_all_records(days=30)
-            soldier_activity = {}
-            for record in records:
-                name = record['full_name']
-                soldier_activity[name] = soldier_activity.get(name, 0) + 1
+            soldier_activity = (await db.get_period_stats(days=30))['users']
 
             text = "👤 **Активность бойцов (30 дней)**\n\n"
             if soldier_activity:
-                sorted_soldiers = sorted(soldier_activity.items(), key=lambda x: x[1], reverse=True)
+                counts = [count for _, count in soldier_activity]
                 text += "🏆 **Самые активные:**\n"
-                for i, (name, count) in enumerate(sorted_soldiers[:10], 1):
+                for i, (name, count) in enumerate(soldier_activity[:10], 1):
                     text += f"{i}. {name}: {count} записей\n"
 
                 text += f"\n📊 **Статистика:**\n"
-                text += f"• Средняя активность: {sum(soldier_activity.values()) / len(soldier_activity):.1f}\n"
-                text += f"• Максимальная: {max(soldier_activity.values())}\n"
-                text += f"• Минимальная: {min(soldier_activity.values())}\n"
+                text += f"• Средняя активность: {sum(counts) / len(counts):.1f}\n"
+                text += f"• Максимальная: {max(counts)}\n"
+                text += f"• Минимальная: {min(counts)}\n"
             else:
                 text += "📝 Данных по активности не найдено"
 
+            absence_totals = await db.get_absence_totals(days=30)
+            if absence_totals:
+                text += "\n⏱ **Больше всего времени вне части:**\n"
+                for i, item in enumerate(absence_totals[:5], 1):
+                    text += (f"{i}. {item['full_name']}: {format_duration(item['total_seconds'])} "
+                             f"({item['absences']} отлуч.)\n")
+
         elif action == "time":
-            # Анализ по времени
-            records = db.get_all_records(days=30)
-            if records:
-                from collections import defaultdict
-                hourly_stats = defaultdict(int)
-                daily_stats = defaultdict(int)
-
-                for record in records:
-                    timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
-                    hour = timestamp.hour
-                    day = timestamp.strftime('%A')
-                    hourly_stats[hour] += 1
-                    daily_stats[day] += 1
+            # Анализ по времени - сводка по часам, разбор записей не нужен
+            distribution = await db.get_time_distribution(days=30)
+            hourly_stats = distribution['hours']
+            daily_stats = distribution['weekdays']
 
+            if hourly_stats:
                 text = "📅 **Временной анализ (30 дней)**\n\n"
 
                 # Самые активные часы
@@ -598,52 +627,35 @@ async def callback_analytics_action(callback: CallbackQuery):
                     text += f"• {hour:02d}:00 - {count} записей\n"
 
                 text += "\n📆 **По дням недели:**\n"
-                day_names = {
-                    'Monday': 'Понедельник',
-                    'Tuesday': 'Вторник', 
-                    'Wednesday': 'Среда',
-                    'Thursday': 'Четверг',
-                    'Friday': 'Пятница',
-                    'Saturday': 'Суббота',
-                    'Sunday': 'Воскресенье'
-                }
-
-                for day, count in daily_stats.items():
-                    day_ru = day_names.get(day, day)
-                    text += f"• {day_ru}: {count} записей\n"
+                day_names = ['Понедельник', 'Вторник', 'Среда', 'Четверг',
+                             'Пятница', 'Суббота', 'Воскресенье']
+
+                for day, count in sorted(daily_stats.items()):
+                    text += f"• {day_names[day]}: {count} записей\n"
             else:
                 text = "📅 **Временной анализ**\n\n📝 Недостаточно данных для анализа"
 
         elif action == "top":
             # ТОП активности
-            records = db.get_all_records(days=30)
-            users = db.get_all_users()
+            users = await db.get_all_users()
 
             text = "🏆 **ТОП активности за месяц**\n\n"
 
-            if records and users:
-                # ТОП по количеству записей
-                user_records = {}
-                location_records = {}
+            # ТОП по количеству записей
+            user_records = (await db.get_period_stats(days=30))['users']
+            location_records = await db.get_top_locations(days=30, limit=5)
 
-                for record in records:
-                    name = record['full_name']
-                    location = record['location']
-                    user_records[name] = user_records.get(name, 0) + 1
-                    if record['action'] == 'не в части':
-                        location_records[location] = location_records.get(location, 0) + 1
+            if user_records and users:
 
                 # ТОП пользователи
                 text += "👑 **Самые активные бойцы:**\n"
-                sorted_users = sorted(user_records.items(), key=lambda x: x[1], reverse=True)
-                for i, (name, count) in enumerate(sorted_users[:5], 1):
+                for i, (name, count) in enumerate(user_records[:5], 1):
                     text += f"{i}. {name} - {count} записей\n"
 
                 # ТОП локации
                 if location_records:
                     text += "\n📍 **Популярные локации:**\n"
-                    sorted_locations = sorted(location_records.items(), key=lambda x: x[1], reverse=True)
-                    for i, (location, count) in enumerate(sorted_locations[:5], 1):
+                    for i, (location, count) in enumerate(location_records, 1):
                         text += f"{i}. {location} - {count} раз\n"
             else:
                 text += "📝 Недостаточно данных для составления рейтинга"
@@ -741,9 +753,8 @@ async def callback_export_action(callback: CallbackQuery):
 
         elif export_type == "csv":
             # CSV Export logic
-            records = db.get_all_records(days=30, limit=10000)
-            if records:
-                filename = db.export_to_csv(days=30)
+            if await db.count_records(days=30):
+                filename = await db.export_to_csv(days=30)
                 if filename:
                     from aiogram.types import FSInputFile
 
@@ -806,28 +817,32 @@ async def callback_export_excel_period(callback: CallbackQuery):
             parse_mode="Markdown"
         )
 
+        # Неделя и месяц выгружаются потоково, без списка записей в памяти
+        records = None
+        days = None
+
         if period == "today":
             # Экспорт за сегодня
-            records = db.get_records_today()
+            records = await db.get_records_today()
             period_text = f"за сегодня ({datetime.now().strftime('%d.%m.%Y')})"
             filename_period = "today"
 
         elif period == "yesterday":
             # Экспорт за вчера
-            records = db.get_records_yesterday()
+            records = await db.get_records_yesterday()
             yesterday = (datetime.now() - timedelta(days=1)).date()
             period_text = f"за вчера ({yesterday.strftime('%d.%m.%Y')})"
             filename_period = "yesterday"
 
         elif period == "week":
             # Экспорт за неделю
-            records = db.get_all_records(days=7)
+            days = 7
             period_text = "за последние 7 дней"
             filename_period = "week"
 
         elif period == "month":
             # Экспорт за месяц
-            records = db.get_all_records(days=30)
+            days = 30
             period_text = "за последние 30 дней"
             filename_period = "month"
 
@@ -835,8 +850,10 @@ async def callback_export_excel_period(callback: CallbackQuery):
             await callback.answer("❌ Неизвестный период", show_alert=True)
             return
 
+        records_count = len(records) if records is not None else await db.count_records(days=days)
+
         # Проверяем есть ли данные
-        if not records:
+        if not records_count:
             await callback.message.edit_text(
                 f"❌ **Нет данных для экспорта**\n\n"
                 f"За выбранный период ({period_text}) записей не найдено.",
@@ -847,7 +864,10 @@ async def callback_export_excel_period(callback: CallbackQuery):
             return
 
         # Создаем Excel файл
-        filename = db.export_records_to_excel(records, period_text)
+        if records is not None:
+            filename = await db.export_records_to_excel(records, period_text)
+        else:
+            filename = await db.export_to_excel(days=days, period_desc=period_text)
         
         if filename:
             from aiogram.types import FSInputFile
@@ -859,7 +879,7 @@ async def callback_export_excel_period(callback: CallbackQuery):
                 await callback.message.answer_document(
                     document,
                     caption=f"📊 **Excel экспорт {period_text}**\n\n"
-                           f"📋 Записей: {len(records)}\n"
+                           f"📋 Записей: {records_count}\n"
                            f"📅 Период: {period_text}",
                     parse_mode="Markdown"
                 )
@@ -873,7 +893,7 @@ async def callback_export_excel_period(callback: CallbackQuery):
                 await callback.message.edit_text(
                     f"✅ **Excel экспорт завершен**\n\n"
                     f"📊 Файл отправлен успешно\n"
-                    f"📋 Экспортировано записей: {len(records)}",
+                    f"📋 Экспортировано записей: {records_count}",
                     reply_markup=get_back_keyboard("admin_export_menu"),
                     parse_mode="Markdown"
                 )
@@ -890,7 +910,7 @@ async def callback_export_excel_period(callback: CallbackQuery):
             await callback.message.edit_text(
                 "❌ **Ошибка экспорта**\n\n"
                 "Возможно, не установлены библиотеки для экспорта.\n"
-                "Проверьте наличие pandas и openpyxl.",
+                "Проверьте наличие openpyxl.",
                 reply_markup=get_back_keyboard("admin_export_menu"),
                 parse_mode="Markdown"
             )
@@ -926,17 +946,17 @@ async def callback_export_pdf_period(callback: CallbackQuery):
         )
 
         if period == "today":
-            records = db.get_records_today()
+            records = await db.get_records_today()
             period_text = f"за сегодня ({datetime.now().strftime('%d.%m.%Y')})"
         elif period == "yesterday":
-            records = db.get_records_yesterday()
+            records = await db.get_records_yesterday()
             yesterday = (datetime.now() - timedelta(days=1)).date()
             period_text = f"за вчера ({yesterday.strftime('%d.%m.%Y')})"
         elif period == "week":
-            records = db.get_all_records(days=7)
+            records = await db.get_all_records(days=7)
             period_text = "за последние 7 дней"
         elif period == "month":
-            records = db.get_all_records(days=30)
+            records = await db.get_all_records(days=30)
             period_text = "за последние 30 дней"
         else:
             await callback.answer("❌ Неизвестный период", show_alert=True)
@@ -1033,7 +1053,7 @@ def create_text_report(records: list, period_desc: str) -> str:
             current_date = None
             for record in sorted_records:
                 try:
-                    timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
+                    timestamp = datetime.fromtimestamp(record['timestamp'])
                     date_str = timestamp.strftime('%d.%m.%Y')
                     time_str = timestamp.strftime('%H:%M:%S')
                     
@@ -1066,6 +1086,46 @@ def create_text_report(records: list, period_desc: str) -> str:
         logging.error(f"Ошибка создания текстового отчета: {e}")
         return None
 
+def format_status_summary(stats: dict, title: str) -> str:
+    """Текст сводки по результату get_current_status/get_status_at"""
+    text = f"{title}\n\n"
+    text += f"👥 Всего бойцов: {stats['total']}\n"
+    text += f"✅ В части: {stats['present']}\n"
+    text += f"❌ Вне части: {stats['absent']}\n\n"
+
+    if stats.get('location_groups'):
+        text += "📍 **Группировка по локациям:**\n\n"
+
+        if 'В части' in stats['location_groups']:
+            group = stats['location_groups']['В части']
+            text += f"🟢 **В части: {group['count']}**\n"
+            for name in group['names'][:10]:
+                text += f"• {name}\n"
+            if len(group['names']) > 10:
+                text += f"... и еще {len(group['names']) - 10}\n"
+            text += "\n"
+
+        for location, group in stats['location_groups'].items():
+            if location != 'В части':
+                text += f"🔴 **{location}: {group['count']}**\n"
+                for name in group['names'][:5]:
+                    text += f"• {name}\n"
+                if len(group['names']) > 5:
+                    text += f"... и еще {len(group['names']) - 5}\n"
+                text += "\n"
+
+    return text
+
+async def build_status_summary() -> str:
+    """Текст «Быстрой сводки» по текущему статусу"""
+    stats = await db.get_current_status()
+    text = format_status_summary(stats, "📊 **Быстрая сводка**")
+
+    if stats['total'] == 0:
+        text += "ℹ️ Нет зарегистрированных бойцов"
+
+    return text
+
 # Остальные функции (summary, manage, и т.д.) остаются без изменений
 @router.callback_query(F.data == "admin_summary")
 async def callback_admin_summary(callback: CallbackQuery):
@@ -1077,36 +1137,8 @@ async def callback_admin_summary(callback: CallbackQuery):
         return
 
     try:
-        stats = db.get_current_status()
-
-        text = "📊 **Быстрая сводка**\n\n"
-        text += f"👥 Всего бойцов: {stats['total']}\n"
-        text += f"✅ В части: {stats['present']}\n"
-        text += f"❌ Вне части: {stats['absent']}\n\n"
-
-        if stats.get('location_groups'):
-            text += "📍 **Группировка по локациям:**\n\n"
-
-            if 'В части' in stats['location_groups']:
-                group = stats['location_groups']['В части']
-                text += f"🟢 **В части: {group['count']}**\n"
-                for name in group['names'][:10]:
-                    text += f"• {name}\n"
-                if len(group['names']) > 10:
-                    text += f"... и еще {len(group['names']) - 10}\n"
-                text += "\n"
-
-            for location, group in stats['location_groups'].items():
-                if location != 'В части':
-                    text += f"🔴 **{location}: {group['count']}**\n"
-                    for name in group['names'][:5]:
-                        text += f"• {name}\n"
-                    if len(group['names']) > 5:
-                        text += f"... и еще {len(group['names']) - 5}\n"
-                    text += "\n"
-
-        if stats['total'] == 0:
-            text += "ℹ️ Нет зарегистрированных бойцов"
+        # Сводка собирается заново только после отметок и изменений состава
+        text = await render_cache.render('status_summary', None, ('status', 'users'), build_status_summary)
 
         await callback.message.edit_text(
             text,
@@ -1118,6 +1150,126 @@ async def callback_admin_summary(callback: CallbackQuery):
         logging.error(f"Ошибка в admin_summary: {e}")
         await callback.answer("❌ Ошибка получения данных", show_alert=True)
 
+def format_duration(seconds: float) -> str:
+    """Длительность в виде '1 д 3 ч', '5 ч 20 мин', '15 мин'"""
+    minutes = int(seconds or 0) // 60
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days} д {hours} ч"
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    return f"{minutes} мин"
+
+def format_backup_report(result, status) -> str:
+    """Отчет о снимке: длительность, размеры и состояние архива"""
+    if result is None:
+        text = "❌ **Снимок не создан**\n\nПодробности в логе ошибок.\n\n"
+    else:
+        text = "💾 **Резервная копия создана**\n\n"
+        text += f"📄 Файл: `{os.path.basename(result['path'])}`\n"
+        text += f"⏱ Длительность: {result['duration']:.2f} с (копирование {result['copy_seconds']:.2f} с, шагов: {result['steps']})\n"
+        text += f"💾 База: {result['db_size'] / 1024 / 1024:.1f} МБ → снимок {result['size'] / 1024 / 1024:.1f} МБ\n\n"
+
+    text += f"📦 Снимков: {status.get('snapshots', 0)} ({status.get('snapshots_size', 0) / 1024 / 1024:.1f} МБ)\n"
+    if status.get('oldest'):
+        oldest = datetime.fromtimestamp(status['oldest']['created_at']).strftime('%d.%m.%Y %H:%M')
+        text += f"🕰 Восстановление возможно с {oldest}\n"
+    if status.get('wal_enabled'):
+        text += f"🗂 Архив WAL: {status.get('wal_segments', 0)} сегм., {status.get('wal_size', 0) / 1024 / 1024:.1f} МБ\n"
+    else:
+        text += "🗂 Архив WAL: выключен\n"
+    if status.get('wal_gap'):
+        text += "⚠️ В архиве WAL пропуск - нужен новый снимок\n"
+    return text
+
+def get_status_at_keyboard():
+    """Быстрый выбор момента для статуса в прошлом"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="⏪ Час назад", callback_data="status_at_3600"),
+            InlineKeyboardButton(text="⏪ Сутки назад", callback_data="status_at_86400")
+        ],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel")]
+    ])
+
+async def send_status_at(message: Message, moment: datetime, edit: bool = False):
+    """Отправить сводку на момент moment"""
+    stats = await db.get_status_at(int(moment.timestamp()))
+    text = format_status_summary(stats, f"🕰 **Статус на {moment.strftime('%d.%m.%Y %H:%M')}**")
+
+    history_from = stats.get('history_from')
+    if history_from is not None and history_from > stats['at']:
+        oldest = datetime.fromtimestamp(history_from).strftime('%d.%m.%Y')
+        text += f"⚠️ История в базе начинается с {oldest}, данные неполные\n"
+    if stats['total'] == 0:
+        text += "ℹ️ На этот момент бойцов не было"
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🕰 Другой момент", callback_data="admin_status_at")],
+        [InlineKeyboardButton(text="🔙 Админ-панель", callback_data="admin_panel")]
+    ])
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    else:
+        await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+
+@router.callback_query(F.data == "admin_status_at")
+async def callback_admin_status_at(callback: CallbackQuery, state: FSMContext):
+    """Статус на момент в прошлом: запрос времени"""
+    user_id = callback.from_user.id
+    if not await is_admin(user_id):
+        await callback.answer("❌ У вас нет прав администратора", show_alert=True)
+        return
+
+    await state.set_state(AdminStates.waiting_for_status_moment)
+    await callback.message.edit_text(
+        "🕰 **Кто где был на момент времени**\n\n"
+        "Введите время:\n"
+        "• 14:00 - последние прошедшие 14:00\n"
+        "• вчера 14:00\n"
+        "• 16.10 14:00 или 16.10.2025 14:00",
+        reply_markup=get_status_at_keyboard(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("status_at_"))
+async def callback_status_at_preset(callback: CallbackQuery, state: FSMContext):
+    """Статус на момент: быстрый выбор"""
+    user_id = callback.from_user.id
+    if not await is_admin(user_id):
+        await callback.answer("❌ У вас нет прав администратора", show_alert=True)
+        return
+
+    await state.clear()
+    try:
+        seconds_ago = int(callback.data.split("_")[-1])
+        await send_status_at(callback.message, datetime.now() - timedelta(seconds=seconds_ago), edit=True)
+        await callback.answer()
+    except Exception as e:
+        logging.error(f"Ошибка статуса на момент: {e}")
+        await callback.answer("❌ Ошибка получения данных", show_alert=True)
+
+@router.message(AdminStates.waiting_for_status_moment)
+async def handle_status_moment(message: Message, state: FSMContext):
+    """Статус на момент: разбор введенного времени"""
+    moment = parse_moment(message.text or "")
+    if moment is None:
+        await message.answer(
+            "❌ Не удалось распознать время или оно в будущем.\n"
+            "Примеры: 14:00, вчера 14:00, 16.10 14:00",
+            reply_markup=get_status_at_keyboard()
+        )
+        return
+
+    await state.clear()
+    try:
+        await send_status_at(message, moment)
+    except Exception as e:
+        logging.error(f"Ошибка статуса на момент: {e}")
+        await message.answer("❌ Ошибка получения данных")
+
 @router.callback_query(F.data == "admin_manage")
 async def callback_admin_manage(callback: CallbackQuery):
     """Управление админами (только для главного админа)"""
@@ -1177,7 +1329,7 @@ async def handle_admin_id_input(message: Message, state: FSMContext):
         )
         return
 
-    target_user = db.get_user(admin_id)
+    target_user = await db.get_user(admin_id)
     if not target_user:
         await message.answer(
             "❌ Пользователь с таким ID не найден!\n"
@@ -1186,12 +1338,12 @@ async def handle_admin_id_input(message: Message, state: FSMContext):
         )
         return
 
-    if db.is_admin(admin_id):
+    if await db.is_admin(admin_id):
         await message.answer(f"❌ Пользователь {target_user['full_name']} уже является администратором!")
         await state.clear()
         return
 
-    if db.add_admin(admin_id):
+    if await db.add_admin(admin_id):
         await state.clear()
         await message.answer(f"✅ Администратор {target_user['full_name']} успешно добавлен!")
     else:
@@ -1207,7 +1359,7 @@ async def callback_admin_list(callback: CallbackQuery):
         return
 
     try:
-        admins = db.get_all_admins()
+        admins = await db.get_all_admins()
 
         if not admins:
             text = "👥 Администраторы не найдены."
@@ -1239,7 +1391,7 @@ async def callback_admin_remove(callback: CallbackQuery):
         return
 
     try:
-        admins = db.get_all_admins()
+        admins = await db.get_all_admins()
         regular_admins = [admin for admin in admins if admin['id'] != MAIN_ADMIN_ID]
 
         if not regular_admins:
@@ -1283,7 +1435,7 @@ async def callback_remove_admin_select(callback: CallbackQuery):
 
     admin_id_to_remove = int(callback.data.split("_")[-1])
 
-    admin_to_remove = db.get_user(admin_id_to_remove)
+    admin_to_remove = await db.get_user(admin_id_to_remove)
 
     if not admin_to_remove:
         await callback.answer("❌ Администратор не найден", show_alert=True)
@@ -1320,13 +1472,13 @@ async def callback_remove_admin_confirm(callback: CallbackQuery):
 
     admin_id_to_remove = int(callback.data.split("_")[-1])
 
-    admin_to_remove = db.get_user(admin_id_to_remove)
+    admin_to_remove = await db.get_user(admin_id_to_remove)
 
     if not admin_to_remove:
         await callback.answer("❌ Администратор не найден", show_alert=True)
         return
 
-    if db.delete_admin(admin_id_to_remove):
+    if await db.delete_admin(admin_id_to_remove):
         await callback.message.edit_text(
             f"✅ Администратор **{admin_to_remove['full_name']}** успешно удален!",
             reply_markup=get_back_keyboard("admin_manage"),
@@ -1353,6 +1505,18 @@ async def cmd_admin(message: Message):
         parse_mode="Markdown"
     )
 
+@router.message(Command("backup"))
+async def cmd_backup(message: Message):
+    """Команда /backup - снимок базы сейчас"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав администратора")
+        return
+
+    status_message = await message.answer("💾 Создаю резервную копию...")
+    result = await db.backup_now()
+    status = await db.get_backup_status()
+    await status_message.edit_text(format_backup_report(result, status), parse_mode="Markdown")
+
 def get_notifications_keyboard():
     """Клавиатура настроек уведомлений"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -1382,6 +1546,7 @@ def get_settings_keyboard():
             InlineKeyboardButton(text="🔄 Оптимизация БД", callback_data="settings_optimize"),
             InlineKeyboardButton(text="📊 Статистика БД", callback_data="settings_db_stats")
         ],
+        [InlineKeyboardButton(text="💾 Резервная копия", callback_data="settings_backup")],
         [
             InlineKeyboardButton(text="⚙️ Системная информация", callback_data="settings_system_info"),
             InlineKeyboardButton(text="🛠️ Технические настройки", callback_data="settings_technical")
@@ -1514,7 +1679,7 @@ async def callback_confirm_full_cleanup(callback: CallbackQuery):
 
     try:
         # Выполняем полную очистку
-        deleted_count = db.clear_all_data()
+        deleted_count = await db.clear_all_data()
         text = f"🗑️ **Полная очистка завершена**\n\n"
         text += f"Удалено записей: {deleted_count}\n"
         text += f"ВСЕ данные системы были удалены.\n\n"
@@ -1531,6 +1696,32 @@ async def callback_confirm_full_cleanup(callback: CallbackQuery):
         logging.error(f"Ошибка полной очистки: {e}")
         await callback.answer("❌ Ошибка при очистке", show_alert=True)
 
+class CleanupProgress:
+    """Прогресс очистки в сообщении админа (не чаще раза в PROGRESS_INTERVAL секунд)"""
+
+    PROGRESS_INTERVAL = 2
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.last_update = 0
+
+    async def update(self, stats: dict):
+        now = time.monotonic()
+        if stats['finished'] or now - self.last_update < self.PROGRESS_INTERVAL:
+            return
+        self.last_update = now
+        percent = stats['deleted'] * 100 // stats['total'] if stats['total'] else 100
+        try:
+            await self.message.edit_text(
+                f"🧹 **Очистка...**\n\n"
+                f"Удалено: {stats['deleted']} из {stats['total']} ({percent}%)\n"
+                f"В архиве: {stats['archived']}",
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logging.error(f"Ошибка обновления прогресса очистки: {e}")
+
+
 @router.callback_query(F.data.startswith("settings_"))
 async def callback_settings_action(callback: CallbackQuery):
     """Действия с настройками"""
@@ -1543,12 +1734,37 @@ async def callback_settings_action(callback: CallbackQuery):
 
     try:
         if action == "cleanup":
-            # Очищаем записи старше 90 дней
-            deleted_count = db.cleanup_old_records(90)
-            text = f"🧹 **Очистка завершена**\n\n"
-            text += f"Удалено старых записей: {deleted_count}\n"
-            text += f"Записи старше 90 дней были удалены из системы.\n\n"
-            text += "✅ База данных очищена"
+            # Очищаем записи старше 90 дней пакетами, показывая прогресс
+            await callback.answer("🧹 Очистка запущена")
+            progress = CleanupProgress(callback.message)
+            # Запрос уже отвечен - итог и ошибки показываем только в сообщении
+            try:
+                stats = await db.retention.run_async(90, progress.update, executor=db.executor)
+            except Exception as e:
+                logging.error(f"Ошибка очистки записей: {e}")
+                await callback.message.edit_text(
+                    f"❌ **Ошибка очистки**\n\nНе удалось очистить старые записи: {e}",
+                    reply_markup=get_back_keyboard("admin_settings"),
+                    parse_mode="Markdown"
+                )
+                return
+
+            if stats['skipped']:
+                text = "⏳ **Очистка уже выполняется**\n\nДождитесь ее завершения."
+            else:
+                text = f"🧹 **Очистка завершена**\n\n"
+                text += f"Удалено старых записей: {stats['deleted']}\n"
+                text += f"Записи старше 90 дней были удалены из системы.\n"
+                if stats['archives']:
+                    text += f"📦 Архивы: {', '.join(os.path.basename(path) for path in stats['archives'])}\n"
+                text += "\n✅ База данных очищена"
+
+            await callback.message.edit_text(
+                text,
+                reply_markup=get_back_keyboard("admin_settings"),
+                parse_mode="Markdown"
+            )
+            return
 
         elif action == "full_cleanup":
             # Показываем предупреждение о полной очистке
@@ -1575,20 +1791,33 @@ async def callback_settings_action(callback: CallbackQuery):
         elif action == "optimize":
             # Оптимизация базы данных
             try:
-                db.optimize_database()
+                result = await db.optimize_database()
+                vacuum = result.get('incremental_vacuum') or {}
                 text = f"🔄 **Оптимизация завершена**\n\n"
                 text += f"База данных оптимизирована.\n"
-                text += f"Индексы перестроены.\n"
-                text += f"Неиспользуемое пространство очищено.\n\n"
+                text += f"Статистика планировщика обновлена.\n"
+                text += f"Освобождено страниц: {vacuum.get('freed_pages', 0)}\n\n"
                 text += "✅ Производительность улучшена"
             except Exception as e:
                 text = f"❌ **Ошибка оптимизации**\n\n"
                 text += f"Не удалось оптимизировать базу данных: {str(e)}"
 
+        elif action == "backup":
+            # Снимок идет в пуле потоков; запись отметок между шагами не ждет
+            await callback.answer("💾 Создаю резервную копию...")
+            result = await db.backup_now()
+            status = await db.get_backup_status()
+            await callback.message.edit_text(
+                format_backup_report(result, status),
+                reply_markup=get_back_keyboard("admin_settings"),
+                parse_mode="Markdown"
+            )
+            return
+
         elif action == "stats" and "db" in callback.data:
             # Статистика базы данных
             try:
-                stats = db.get_database_stats()
+                stats = await db.get_database_stats()
                 text = f"📊 **Статистика базы данных**\n\n"
                 text += f"👥 Пользователей: {stats.get('users', 0)}\n"
                 text += f"📋 Записей: {stats.get('records', 0)}\n"
@@ -1665,8 +1894,9 @@ async def callback_admin_monitoring(callback: CallbackQuery):
         # Инкрементируем счетчик запросов
         monitor.increment_request(True)
 
-        # Получаем статус системы
-        status_text = get_system_status()
+        # Получаем статус системы: метрики читают базу и ждут секунду замера CPU -
+        # в отдельном потоке, не задерживая обновления других пользователей
+        status_text = await asyncio.to_thread(get_system_status)
 
         keyboard = [
             [
@@ -1709,7 +1939,7 @@ async def callback_monitoring_action(callback: CallbackQuery):
     try:
         if action == "detailed":
             # Детальная статистика
-            health = monitor.get_health_status()
+            health = await asyncio.to_thread(monitor.get_health_status)
             metrics = health['metrics']
 
             text = f"📊 **Детальная статистика системы**\n\n"
@@ -1756,7 +1986,7 @@ async def callback_monitoring_action(callback: CallbackQuery):
 
         elif action == "health":
             # Проверка здоровья
-            health = monitor.get_health_status()
+            health = await asyncio.to_thread(monitor.get_health_status)
 
             status_emoji = {
                 'healthy': '🟢',
@@ -3,13 +3,13 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from services.db_service import DatabaseService
+from services.registry import get_async_db
 from datetime import datetime, timedelta
 import logging
 import asyncio
 
 router = Router()
-db = DatabaseService()
+db = get_async_db()
 
 class NotificationStates(StatesGroup):
     waiting_for_custom_message = State()
@@ -17,48 +17,34 @@ class NotificationStates(StatesGroup):
 
 class SmartNotificationSystem:
     def __init__(self):
-        self.db = DatabaseService()
+        self.db = get_async_db()
         self.active_alerts = {}
         
     async def check_suspicious_patterns(self):
         """Проверка подозрительных паттернов"""
         alerts = []
         
-        # Проверяем частые отлучки одного бойца
-        records = self.db.get_all_records(days=7)
-        user_departures = {}
-        
-        for record in records:
-            if record['action'] == 'не в части':
-                name = record['full_name']
-                user_departures[name] = user_departures.get(name, 0) + 1
-        
-        for name, count in user_departures.items():
-            if count > 10:  # Более 10 отлучек за неделю
+        # Проверяем частые отлучки одного бойца: считаются только убытия за
+        # неделю, отсутствие, начатое раньше, в порог не входит
+        for item in await self.db.get_absence_totals(days=7):
+            if item['departures'] > 10:  # Более 10 отлучек за неделю
                 alerts.append({
                     'type': 'frequent_departures',
-                    'user': name,
-                    'count': count,
-                    'message': f"⚠️ {name} имеет {count} отлучек за неделю"
+                    'user': item['full_name'],
+                    'count': item['departures'],
+                    'message': f"⚠️ {item['full_name']} имеет {item['departures']} отлучек за неделю"
                 })
         
-        # Проверяем длительные отсутствия
-        current_status = self.db.get_current_status()
-        for user in current_status.get('absent_users', []):
-            # Ищем последнюю отметку "в части"
-            last_present = self.db.get_last_present_record(user['user_id'])
-            if last_present:
-                last_time = datetime.fromisoformat(last_present['timestamp'].replace('Z', '+00:00'))
-                hours_absent = (datetime.now() - last_time).total_seconds() / 3600
-                
-                if hours_absent > 24:  # Отсутствует более суток
-                    alerts.append({
-                        'type': 'long_absence',
-                        'user': user['name'],
-                        'hours': int(hours_absent),
-                        'location': user['location'],
-                        'message': f"🚨 {user['name']} отсутствует {int(hours_absent)} часов ({user['location']})"
-                    })
+        # Проверяем длительные отсутствия (более суток) по открытым интервалам
+        for absence in await self.db.get_long_absences(min_hours=24):
+            hours = int(absence['hours'])
+            alerts.append({
+                'type': 'long_absence',
+                'user': absence['full_name'],
+                'hours': hours,
+                'location': absence['location'],
+                'message': f"🚨 {absence['full_name']} отсутствует {hours} часов ({absence['location']})"
+            })
         
         return alerts
     
@@ -151,7 +137,7 @@ async def handle_custom_message(message: Message, state: FSMContext):
         return
     
     # Получаем всех пользователей
-    users = db.get_all_users()
+    users = await db.get_all_users()
     
     keyboard = [
         [
@@ -180,7 +166,7 @@ async def callback_confirm_broadcast(callback: CallbackQuery, state: FSMContext)
         await callback.answer("❌ Текст сообщения потерян", show_alert=True)
         return
     
-    users = db.get_all_users()
+    users = await db.get_all_users()
     sent_count = 0
     failed_count = 0
     
@@ -295,7 +281,7 @@ async def callback_send_emergency(callback: CallbackQuery):
     ]
     
     message_text = emergency_templates[template_index]
-    users = db.get_all_users()
+    users = await db.get_all_users()
     
     await callback.message.edit_text("🚨 ОТПРАВКА ЭКСТРЕННОГО УВЕДОМЛЕНИЯ...", parse_mode="Markdown")
     
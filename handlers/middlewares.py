@@ -0,0 +1,82 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import MAIN_ADMIN_ID
+from services.rows import UserContext
+from services.update_queue import UpdateScheduler
+
+OVERLOAD_TEXT = "⏳ Бот перегружен, повторите через минуту."
+
+
+class UserProfileMiddleware(BaseMiddleware):
+    """Профиль, права и текущий статус пользователя - один раз на обновление.
+
+    Outer-middleware для сообщений и нажатий кнопок: get_user_context (один
+    запрос, результат в кэше DatabaseService) передается обработчикам
+    аргументом user_ctx, поэтому обработчики не проверяют регистрацию, права
+    и последнюю отметку сами.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is not None:
+            try:
+                ctx = await self.db.get_user_context(user.id)
+            except Exception as e:
+                logging.error(f"Ошибка получения контекста пользователя {user.id}: {e}")
+                ctx = UserContext(user.id, None, False)
+            if not ctx.is_admin and user.id == MAIN_ADMIN_ID:
+                # Главный админ - даже без строки в admins (см. ensure_main_admin)
+                ctx = UserContext(ctx.user_id, ctx.user, True, ctx.action, ctx.location, ctx.since)
+            data['user_ctx'] = ctx
+        return await handler(event, data)
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """Очередь обновлений: параллельно для разных пользователей, по порядку для одного.
+
+    Outer-middleware на dp.update (после встроенного, который определяет
+    event_from_user). Обновление, не попавшее в очередь, не обрабатывается:
+    пользователь получает короткий ответ о перегрузке.
+    """
+
+    def __init__(self, scheduler: UpdateScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        async with self.scheduler.slot(user.id if user is not None else None) as admitted:
+            if admitted:
+                return await handler(event, data)
+
+        logging.warning(f"Обновление отклонено из-за перегрузки (пользователь {user.id if user else '-'})")
+        await self._reject(event)
+        return None
+
+    async def _reject(self, event: TelegramObject):
+        """Ответить на отклоненное обновление: снять «часики» с кнопки или написать"""
+        if not isinstance(event, Update):
+            return
+        try:
+            if event.callback_query is not None:
+                await event.callback_query.answer(OVERLOAD_TEXT)
+            elif event.message is not None:
+                await event.message.answer(OVERLOAD_TEXT)
+        except Exception as e:
+            logging.error(f"Ошибка ответа на отклоненное обновление: {e}")
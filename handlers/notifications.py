@@ -1,6 +1,7 @@
 from aiogram import Router, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from services.db_service import DatabaseService
+from services.registry import get_async_db
+from services.retention import ARCHIVE_DIR as RETENTION_ARCHIVE_DIR
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, time
 import logging
@@ -10,7 +11,7 @@ import os
 import asyncio
 
 router = Router()
-db = DatabaseService()
+db = get_async_db()
 scheduler = AsyncIOScheduler()
 
 # Креативные тексты для уведомлений
@@ -110,7 +111,7 @@ def is_quiet_time():
 async def send_notification_to_admins(bot: Bot, message: str, parse_mode: str = None):
     """Отправить уведомление всем админам"""
     try:
-        admins = db.get_all_admins()
+        admins = await db.get_all_admins()
         sent_count = 0
 
         for admin in admins:
@@ -150,12 +151,12 @@ async def send_evening_reminder(bot: Bot):
 
     try:
         # Получаем статистику дня
-        records_today = db.get_records_today()
-        status = db.get_current_status()
+        today = await db.get_period_stats(days=1)
+        status = await db.get_current_status()
 
         text = get_random_text('evening')
         text += f"\n\n📊 **Статистика дня:**\n"
-        text += f"• Записей сегодня: {len(records_today)}\n"
+        text += f"• Записей сегодня: {today['total']}\n"
         text += f"• В части: {status['present']}\n"
         text += f"• Вне части: {status['absent']}"
 
@@ -170,22 +171,16 @@ async def send_weekly_report(bot: Bot):
         return
 
     try:
-        # Статистика за неделю
-        records_week = db.get_all_records(days=7)
-        users = db.get_all_users()
+        # Статистика за неделю (сводка по дням - все записи, без лимита выборки)
+        week = await db.get_period_stats(days=7)
+        users = await db.get_all_users()
 
-        # Топ активных пользователей
-        user_activity = {}
-        for record in records_week:
-            name = record['full_name']
-            user_activity[name] = user_activity.get(name, 0) + 1
-
-        top_users = sorted(user_activity.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_users = week['users'][:5]
 
         text = get_random_text('weekly')
         text += f"\n\n📊 **Еженедельная сводка:**\n"
-        text += f"• Всего записей: {len(records_week)}\n"
-        text += f"• Активных пользователей: {len(user_activity)}\n"
+        text += f"• Всего записей: {week['total']}\n"
+        text += f"• Активных пользователей: {len(week['users'])}\n"
         text += f"• Всего зарегистрировано: {len(users)}\n\n"
 
         if top_users:
@@ -194,7 +189,7 @@ async def send_weekly_report(bot: Bot):
                 text += f"{i}. {name}: {count} записей\n"
 
         # Создаем Excel отчет
-        filename = db.export_to_excel(days=7)
+        filename = await db.export_to_excel(days=7)
 
         await send_notification_to_admins(bot, text, parse_mode="Markdown")
 
@@ -223,12 +218,12 @@ async def send_weekly_report(bot: Bot):
 async def cleanup_old_records():
     """Очистка старых записей"""
     try:
-        deleted_count = db.cleanup_old_records(days=180)  # 6 месяцев
+        deleted_count = await db.cleanup_old_records(days=180)  # 6 месяцев
 
         if deleted_count > 0:
             message = f"🧹 **Автоматическая очистка**\n\n"
             message += f"Удалено старых записей: {deleted_count}\n"
-            message += f"Записи старше 180 дней были удалены для оптимизации."
+            message += f"Записи старше 180 дней перенесены в архив ({RETENTION_ARCHIVE_DIR}/) и удалены из базы."
 
             from config import MAIN_ADMIN_ID
             try:
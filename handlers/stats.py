@@ -1,19 +1,21 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from services.db_service import DatabaseService
+from services.registry import get_async_db, get_render_cache
 from config import MAIN_ADMIN_ID
 import logging
 from datetime import datetime, timedelta
+from handlers.admin import build_status_summary
 
 router = Router()
-db = DatabaseService()
+db = get_async_db()
+render_cache = get_render_cache()
 
 async def is_admin(user_id: int) -> bool:
     """Проверить права администратора"""
     if user_id == MAIN_ADMIN_ID:
         return True
-    return db.is_admin(user_id)
+    return await db.is_admin(user_id)
 
 @router.message(Command("stats"))
 async def cmd_stats(message: Message):
@@ -24,27 +26,32 @@ async def cmd_stats(message: Message):
         return
 
     try:
-        stats = db.get_current_status()
+        stats_text = await render_cache.render('stats_absent', None, ('status', 'users'), build_absent_stats)
+        await message.answer(stats_text, parse_mode="Markdown")
 
-        stats_text = f"""📊 **Текущая статистика**
+    except Exception as e:
+        await message.answer(f"❌ Ошибка получения статистики: {e}")
 
-👥 Всего личного состава: {stats['total']}
-✅ Присутствуют: {stats['present']}
-❌ Отсутствуют: {stats['absent']}
+async def build_absent_stats() -> str:
+    """Текст /stats: численность и список отсутствующих"""
+    stats = await db.get_current_status()
 
-**📍 Отсутствующие:**
-"""
+    lines = [
+        "📊 **Текущая статистика**",
+        "",
+        f"👥 Всего личного состава: {stats['total']}",
+        f"✅ Присутствуют: {stats['present']}",
+        f"❌ Отсутствуют: {stats['absent']}",
+        "",
+        "**📍 Отсутствующие:**"
+    ]
 
-        if stats.get('absent_list'):
-            for person in stats['absent_list']:
-                stats_text += f"• {person['name']} ({person['location']})\n"
-        else:
-            stats_text += "Все на месте! ✅"
+    if stats.get('absent_list'):
+        lines.extend(f"• {person['name']} ({person['location']})" for person in stats['absent_list'])
+    else:
+        lines.append("Все на месте! ✅")
 
-        await message.answer(stats_text, parse_mode="Markdown")
-
-    except Exception as e:
-        await message.answer(f"❌ Ошибка получения статистики: {e}")
+    return "\n".join(lines)
 
 @router.callback_query(F.data == "admin_stats")
 async def callback_admin_stats(callback: CallbackQuery):
@@ -56,12 +63,12 @@ async def callback_admin_stats(callback: CallbackQuery):
         return
 
     try:
-        # Получаем статистику за разные периоды
-        stats_today = db.get_all_records(days=1)
-        stats_week = db.get_all_records(days=7)
-        stats_month = db.get_all_records(days=30)
+        # Счетчики за периоды - из сводки по дням, без выборки записей
+        stats_today = await db.get_period_stats(days=1)
+        stats_week = await db.get_period_stats(days=7)
+        stats_month = await db.get_period_stats(days=30)
         
-        current_status = db.get_current_status()
+        current_status = await db.get_current_status()
         
         text = "📊 **Расширенная статистика**\n\n"
         
@@ -73,23 +80,15 @@ async def callback_admin_stats(callback: CallbackQuery):
         
         # Активность по периодам
         text += "📈 **Активность:**\n"
-        text += f"📅 Сегодня: {len(stats_today)} записей\n"
-        text += f"📅 За неделю: {len(stats_week)} записей\n"
-        text += f"📅 За месяц: {len(stats_month)} записей\n\n"
+        text += f"📅 Сегодня: {stats_today['total']} записей\n"
+        text += f"📅 За неделю: {stats_week['total']} записей\n"
+        text += f"📅 За месяц: {stats_month['total']} записей\n\n"
         
         # ТОП локации за неделю
-        if stats_week:
-            locations = {}
-            for record in stats_week:
-                if record['action'] == 'не в части':
-                    loc = record['location']
-                    locations[loc] = locations.get(loc, 0) + 1
-            
-            if locations:
-                text += "🏆 **ТОП локации (неделя):**\n"
-                sorted_locations = sorted(locations.items(), key=lambda x: x[1], reverse=True)[:5]
-                for i, (location, count) in enumerate(sorted_locations, 1):
-                    text += f"{i}. {location}: {count} раз\n"
+        if stats_week['locations']:
+            text += "🏆 **ТОП локации (неделя):**\n"
+            for i, (location, count) in enumerate(stats_week['locations'][:5], 1):
+                text += f"{i}. {location}: {count} раз\n"
         
         keyboard = [
             [InlineKeyboardButton(text="📤 Экспорт данных", callback_data="admin_export")],
@@ -117,52 +116,32 @@ async def callback_journal_stats(callback: CallbackQuery):
         return
 
     try:
-        # Получаем записи за последние 7 дней
-        records = db.get_all_records(days=7, limit=1000)
+        # Счетчики за 7 дней - из сводки по дням
+        stats = await db.get_period_stats(days=7)
         
-        if not records:
+        if not stats['total']:
             text = "📊 **Статистика журнала**\n\nНет данных за последние 7 дней."
         else:
-            # Подсчет по действиям
-            actions_count = {}
-            users_activity = {}
-            locations_count = {}
-            
-            for record in records:
-                # Подсчет действий
-                action = record['action']
-                actions_count[action] = actions_count.get(action, 0) + 1
-                
-                # Активность пользователей
-                user_name = record['full_name']
-                users_activity[user_name] = users_activity.get(user_name, 0) + 1
-                
-                # Популярные локации для убытия
-                if action == 'не в части':
-                    location = record['location']
-                    locations_count[location] = locations_count.get(location, 0) + 1
-            
             text = "📊 **Статистика журнала (7 дней)**\n\n"
             
             # Статистика по действиям
             text += "📋 **По действиям:**\n"
-            for action, count in actions_count.items():
-                emoji = "🟢" if action == "в части" else "🔴"
-                text += f"{emoji} {action}: {count} раз\n"
+            if stats['arrivals']:
+                text += f"🟢 в части: {stats['arrivals']} раз\n"
+            if stats['departures']:
+                text += f"🔴 не в части: {stats['departures']} раз\n"
             text += "\n"
             
             # ТОП активных пользователей
             text += "👥 **Самые активные (ТОП-5):**\n"
-            sorted_users = sorted(users_activity.items(), key=lambda x: x[1], reverse=True)[:5]
-            for i, (user, count) in enumerate(sorted_users, 1):
+            for i, (user, count) in enumerate(stats['users'][:5], 1):
                 text += f"{i}. {user}: {count} записей\n"
             text += "\n"
             
             # ТОП локации для убытия
-            if locations_count:
+            if stats['locations']:
                 text += "📍 **Популярные места убытия:**\n"
-                sorted_locations = sorted(locations_count.items(), key=lambda x: x[1], reverse=True)[:5]
-                for i, (location, count) in enumerate(sorted_locations, 1):
+                for i, (location, count) in enumerate(stats['locations'][:5], 1):
                     text += f"{i}. {location}: {count} раз\n"
         
         keyboard = [
@@ -191,10 +170,8 @@ async def callback_journal_export(callback: CallbackQuery):
         return
 
     try:
-        records = db.get_all_records(days=30, limit=1000)
-        
-        if records:
-            filename = db.export_records_to_excel(records, "журнал за 30 дней")
+        if await db.count_records(days=30):
+            filename = await db.export_to_excel(days=30, period_desc="журнал за 30 дней")
             
             if filename:
                 from aiogram.types import FSInputFile
@@ -229,7 +206,7 @@ async def callback_admin_export(callback: CallbackQuery):
         return
 
     try:
-        filename = db.export_to_excel(days=30)
+        filename = await db.export_to_excel(days=30)
         if filename:
             from aiogram.types import FSInputFile
             document = FSInputFile(filename, filename="journal_export.xlsx")
@@ -255,40 +232,9 @@ async def cmd_stats(message: Message):
         return
 
     try:
-        current_status = db.get_current_status()
-        
-        text = "📊 **Быстрая сводка**\n\n"
-        text += f"👥 Всего бойцов: {current_status['total']}\n"
-        text += f"✅ В части: {current_status['present']}\n"
-        text += f"❌ Вне части: {current_status['absent']}\n\n"
-        
-        # Отображаем группировку по локациям
-        if current_status.get('location_groups'):
-            text += "📍 **Группировка по локациям:**\n\n"
-            
-            # Сначала показываем тех, кто в части
-            if 'В части' in current_status['location_groups']:
-                group = current_status['location_groups']['В части']
-                text += f"🟢 **В части: {group['count']}**\n"
-                for name in group['names'][:10]:  # Показываем максимум 10
-                    text += f"• {name}\n"
-                if len(group['names']) > 10:
-                    text += f"... и еще {len(group['names']) - 10}\n"
-                text += "\n"
-            
-            # Затем показываем отсутствующих по локациям
-            for location, group in current_status['location_groups'].items():
-                if location != 'В части':
-                    text += f"🔴 **{location}: {group['count']}**\n"
-                    for name in group['names'][:5]:  # Показываем максимум 5 для внешних локаций
-                        text += f"• {name}\n"
-                    if len(group['names']) > 5:
-                        text += f"... и еще {len(group['names']) - 5}\n"
-                    text += "\n"
-        
-        if current_status['total'] == 0:
-            text += "ℹ️ Нет зарегистрированных бойцов"
-        
+        # Тот же экран, что и «Быстрая сводка» админ-панели
+        text = await render_cache.render('status_summary', None, ('status', 'users'), build_status_summary)
+
         keyboard = [
             [InlineKeyboardButton(text="📈 Подробная статистика", callback_data="admin_stats")],
             [InlineKeyboardButton(text="⚙️ Админ-панель", callback_data="admin_panel")]
@@ -5,7 +5,8 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from services.db_service import DatabaseService
+from services.registry import get_async_db, get_render_cache
+from services.rows import UserContext
 from utils.validators import validate_full_name, suggest_full_name_correction, normalize_full_name
 from config import MAIN_ADMIN_ID, LOCATIONS
 from datetime import datetime
@@ -20,7 +21,8 @@ class UserStates(StatesGroup):
     showing_duplicate_action_warning = State()
 
 # Инициализация базы данных
-db = DatabaseService()
+db = get_async_db()
+render_cache = get_render_cache()
 
 def get_main_menu_keyboard(is_admin: bool = False):
     """Создать главное меню"""
@@ -69,8 +71,73 @@ def get_journal_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+def format_journal(records) -> str:
+    """Текст журнала по записям (от новых к старым); пустая строка - записей нет"""
+    if not records:
+        return ""
+
+    parts = ["📋 **Мой журнал**\n", "─" * 25 + "\n\n"]
+
+    for i, record in enumerate(records, 1):
+        timestamp = datetime.fromtimestamp(record['timestamp'])
+        formatted_date = timestamp.strftime('%d.%m.%Y')
+        formatted_time = timestamp.strftime('%H:%M')
+
+        if record['action'] == 'не в части':
+            action_emoji = "🚶"
+            action_text = "**убыл**"
+            status_color = "🔴"
+        else:
+            action_emoji = "🏠"
+            action_text = "**прибыл**"
+            status_color = "🟢"
+
+        parts.append(f"{status_color} {i}. {action_emoji} {action_text}\n")
+        parts.append(f"📍 {record['location']}\n")
+        parts.append(f"📅 {formatted_date} в {formatted_time}\n")
+
+        if i < len(records):
+            parts.append("─" * 20 + "\n\n")
+
+    return "".join(parts)
+
+async def build_journal(user_id: int) -> str:
+    """Собрать журнал пользователя - последние 10 записей"""
+    records = await db.get_user_records(user_id, limit=10)
+    return format_journal(records)
+
+def format_journal_status(user_ctx: UserContext) -> str:
+    """Блок «Текущий статус» под журналом; не кэшируется - «N мин. назад» устаревает"""
+    if user_ctx.since is None:
+        return ""
+
+    if user_ctx.action == 'не в части':
+        current_status = "🔴 **Не в части**"
+        status_desc = "Отсутствует"
+    else:
+        current_status = "🟢 **В части**"
+        status_desc = "Присутствует"
+
+    last_time = datetime.fromtimestamp(user_ctx.since)
+    time_ago = (datetime.now() - last_time.replace(tzinfo=None)).total_seconds()
+
+    if time_ago < 3600:  # Меньше часа
+        time_text = f"{int(time_ago / 60)} мин. назад"
+    elif time_ago < 86400:  # Меньше дня
+        time_text = f"{int(time_ago / 3600)} ч. назад"
+    else:
+        time_text = f"{int(time_ago / 86400)} дн. назад"
+
+    return (
+        f"\n━━━━━━━━━━━━━━━\n"
+        f"📊 **Текущий статус:** {current_status}\n"
+        f"🏷️ **Описание:** {status_desc}\n"
+        f"📍 **Локация:** {user_ctx.location}\n"
+        f"⏱️ **Обновлено:** {time_text}"
+    )
+
 @router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, user_ctx: UserContext):
     """Обработчик команды /start"""
     try:
         from aiogram.types import ReplyKeyboardRemove
@@ -80,7 +147,7 @@ async def cmd_start(message: Message, state: FSMContext):
         username = user.username or f"user_{user_id}"
 
         # Проверяем, зарегистрирован ли пользователь
-        existing_user = db.get_user(user_id)
+        existing_user = user_ctx.user
 
         if not existing_user:
             # Запрашиваем ФИО
@@ -95,7 +162,7 @@ async def cmd_start(message: Message, state: FSMContext):
             return
 
         # Пользователь уже зарегистрирован
-        is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+        is_admin = user_ctx.is_admin
         await message.answer(
             "🎖️ Электронный табель выхода в город\n\nВыберите действие:",
             reply_markup=get_main_menu_keyboard(is_admin)
@@ -112,7 +179,7 @@ async def cmd_start(message: Message, state: FSMContext):
             logging.error(f"Не удалось отправить сообщение об ошибке: {send_error}")
 
 @router.message(StateFilter(UserStates.waiting_for_name))
-async def handle_name_input(message: Message, state: FSMContext):
+async def handle_name_input(message: Message, state: FSMContext, user_ctx: UserContext):
     """Обработка ввода ФИО"""
     try:
         user = message.from_user
@@ -174,14 +241,14 @@ async def handle_name_input(message: Message, state: FSMContext):
             return
 
         # Проверка на уже существующего пользователя
-        existing_user = db.get_user(user_id)
+        existing_user = user_ctx.user
         if existing_user:
             await state.clear()
             await message.answer(
                 f"❌ Вы уже зарегистрированы как: {existing_user['full_name']}\n"
                 "Для смены ФИО обратитесь к администратору."
             )
-            is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+            is_admin = user_ctx.is_admin
             await message.answer(
                 "🎖️ Электронный табель выхода в город\n\nВыберите действие:",
                 reply_markup=get_main_menu_keyboard(is_admin)
@@ -191,9 +258,9 @@ async def handle_name_input(message: Message, state: FSMContext):
         normalized_full_name = normalize_full_name(full_name)
 
         # Сохраняем пользователя
-        if db.add_user(user_id, username, normalized_full_name):
+        if await db.add_user(user_id, username, normalized_full_name):
             await state.clear()
-            is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+            is_admin = user_ctx.is_admin
             await message.answer(
                 f"✅ Регистрация успешно завершена!\n"
                 f"👤 Добро пожаловать, {normalized_full_name}!"
@@ -210,7 +277,7 @@ async def handle_name_input(message: Message, state: FSMContext):
         await message.answer("❌ Произошла ошибка при регистрации. Попробуйте команду /start")
 
 @router.message(StateFilter(UserStates.waiting_for_custom_location))
-async def handle_custom_location(message: Message, state: FSMContext):
+async def handle_custom_location(message: Message, state: FSMContext, user_ctx: UserContext):
     """Обработка ввода кастомной локации"""
     try:
         custom_location = message.text.strip() if message.text else ""
@@ -254,7 +321,7 @@ async def handle_custom_location(message: Message, state: FSMContext):
         user_id = message.from_user.id
 
         # Проверяем пользователя
-        if not db.get_user(user_id):
+        if not user_ctx.user:
             await state.clear()
             await message.answer(
                 "❌ Вы не зарегистрированы в системе!\n"
@@ -267,7 +334,7 @@ async def handle_custom_location(message: Message, state: FSMContext):
             action = "не в части"
 
         # Добавляем запись
-        result = db.add_record(user_id, action, custom_location)
+        result = await db.add_record(user_id, action, custom_location)
         if result:
             await state.clear()
 
@@ -279,19 +346,20 @@ async def handle_custom_location(message: Message, state: FSMContext):
                 f"⏰ Время: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
             )
 
-            is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+            is_admin = user_ctx.is_admin
             await message.answer(
                 "🎖️ Электронный табель выхода в город\n\nВыберите действие:",
                 reply_markup=get_main_menu_keyboard(is_admin)
             )
 
             # Уведомляем главного админа ПОСЛЕ главного меню
-            await send_admin_notification(message.bot, user_id, action, custom_location)
+            await send_admin_notification(message.bot, user_id, action, custom_location, result['full_name'])
         else:
             await state.clear()
-            # Проверяем последнюю запись для более точного сообщения
-            last_records = db.get_user_records(user_id, 1)
-            if last_records and last_records[0]['action'] == action:
+            # Проверяем последнюю запись для более точного сообщения: статус
+            # перечитывается - отметку могло сделать параллельное обновление
+            current = await db.get_user_context(user_id)
+            if current.action == action:
                 await message.answer(
                     "ℹ️ Статус уже обновлен!\n\n"
                     "Ваша отметка была сохранена ранее.\n"
@@ -310,12 +378,10 @@ async def handle_custom_location(message: Message, state: FSMContext):
         await message.answer("❌ Произошла ошибка. Попробуйте начать заново.")
 
 @router.callback_query(F.data == "change_location")
-async def callback_change_location(callback: CallbackQuery, state: FSMContext):
+async def callback_change_location(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Сменить локацию без повторной отметки"""
-    user_id = callback.from_user.id
-
     # Проверяем, зарегистрирован ли пользователь
-    if not db.get_user(user_id):
+    if not user_ctx.user:
         await callback.message.edit_text(
             "❌ Вы не зарегистрированы в системе!\n"
             "Отправьте команду /start для регистрации."
@@ -334,10 +400,9 @@ async def callback_change_location(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "main_menu")
-async def callback_main_menu(callback: CallbackQuery, state: FSMContext):
+async def callback_main_menu(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Показать главное меню"""
-    user_id = callback.from_user.id
-    is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+    is_admin = user_ctx.is_admin
 
     # Очищаем состояние если оно было установлено
     await state.clear()
@@ -349,13 +414,13 @@ async def callback_main_menu(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("action_"))
-async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
+async def callback_action_selection(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Обработка выбора действия"""
     try:
         user_id = callback.from_user.id
 
         # Проверяем, зарегистрирован ли пользователь
-        user = db.get_user(user_id)
+        user = user_ctx.user
         if not user:
             await callback.message.edit_text(
                 "❌ Вы не зарегистрированы в системе!\n"
@@ -366,10 +431,9 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
 
         if "arrive" in callback.data:
             # Проверяем последнее действие пользователя
-            last_records = db.get_user_records(user_id, 1)
-            if last_records and last_records[0]['action'] == "в части":
+            if user_ctx.action == "в части":
                 await state.set_state(UserStates.showing_duplicate_action_warning)
-                last_time = datetime.fromisoformat(last_records[0]['timestamp'].replace('Z', '+00:00')).strftime('%d.%m.%Y в %H:%M')
+                last_time = datetime.fromtimestamp(user_ctx.since).strftime('%d.%m.%Y в %H:%M')
 
                 keyboard = [
                     [InlineKeyboardButton(text="🔙 Понятно, вернуться в меню", callback_data="main_menu")]
@@ -379,7 +443,7 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
                 await callback.message.edit_text(
                     "⚠️ **Повторная отметка о прибытии**\n\n"
                     "Вы уже отмечены как **находящийся в части**\n"
-                    f"📍 Текущая локация: **{last_records[0]['location']}**\n"
+                    f"📍 Текущая локация: **{user_ctx.location}**\n"
                     f"⏰ Время отметки: {last_time}\n\n"
                     "💡 **Что делать дальше:**\n"
                     "1️⃣ Если хотите уйти — нажмите «❌ Убыл»\n"
@@ -396,7 +460,7 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
             location = "Часть"
 
             # Добавляем запись
-            result = db.add_record(user_id, action, location)
+            result = await db.add_record(user_id, action, location)
             if result:
                 # Отправляем новое сообщение о статусе
                 await callback.message.answer(
@@ -406,14 +470,14 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
                 )
 
                 # Показываем главное меню сразу внизу
-                is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+                is_admin = user_ctx.is_admin
                 await callback.message.answer(
                     "🎖️ Электронный табель выхода в город\n\nВыберите действие:",
                     reply_markup=get_main_menu_keyboard(is_admin)
                 )
 
                 # Уведомляем главного админа ПОСЛЕ главного меню
-                await send_admin_notification(callback.message.bot, user_id, action, location)
+                await send_admin_notification(callback.message.bot, user_id, action, location, result['full_name'])
 
                 # Удаляем старое сообщение с кнопками
                 try:
@@ -430,10 +494,9 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
                 )
         else:
             # Проверяем последнее действие для "убыл"
-            last_records = db.get_user_records(user_id, 1)
-            if last_records and last_records[0]['action'] == "не в части":
+            if user_ctx.action == "не в части":
                 await state.set_state(UserStates.showing_duplicate_action_warning)
-                last_time = datetime.fromisoformat(last_records[0]['timestamp'].replace('Z', '+00:00')).strftime('%d.%m.%Y в %H:%M')
+                last_time = datetime.fromtimestamp(user_ctx.since).strftime('%d.%m.%Y в %H:%M')
 
                 keyboard = [
                     [InlineKeyboardButton(text="🔄 Сменить локацию", callback_data="change_location")],
@@ -444,7 +507,7 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
                 await callback.message.edit_text(
                     "⚠️ **Повторная отметка об убытии**\n\n"
                     "Вы уже отмечены как **отсутствующий**\n"
-                    f"📍 Текущая локация: **{last_records[0]['location']}**\n"
+                    f"📍 Текущая локация: **{user_ctx.location}**\n"
                     f"⏰ Время отметки: {last_time}\n\n"
                     "💡 **Что делать дальше:**\n"
                     "1️⃣ Если вернулись — нажмите «✅ Прибыл»\n"
@@ -470,7 +533,7 @@ async def callback_action_selection(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
 @router.callback_query(F.data.startswith("location_"))
-async def callback_location_selection(callback: CallbackQuery, state: FSMContext):
+async def callback_location_selection(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Обработка выбора локации"""
     try:
         user_id = callback.from_user.id
@@ -485,7 +548,7 @@ async def callback_location_selection(callback: CallbackQuery, state: FSMContext
         location = parts[2]
 
         # Проверяем, зарегистрирован ли пользователь
-        if not db.get_user(user_id):
+        if not user_ctx.user:
             await callback.message.edit_text(
                 "❌ Вы не зарегистрированы в системе!\n"
                 "Отправьте команду /start для регистрации."
@@ -532,7 +595,7 @@ async def callback_location_selection(callback: CallbackQuery, state: FSMContext
             action = "не в части"
 
         # Добавляем запись
-        result = db.add_record(user_id, action, location)
+        result = await db.add_record(user_id, action, location)
         if result:
             status_text = "не в части" if action == "не в части" else "в части"
 
@@ -545,14 +608,14 @@ async def callback_location_selection(callback: CallbackQuery, state: FSMContext
             )
 
             # Показываем главное меню сразу внизу
-            is_admin = db.is_admin(user_id) or user_id == MAIN_ADMIN_ID
+            is_admin = user_ctx.is_admin
             await callback.message.answer(
                 "🎖️ Электронный табель выхода в город\n\nВыберите действие:",
                 reply_markup=get_main_menu_keyboard(is_admin)
             )
 
             # Уведомляем главного админа ПОСЛЕ главного меню
-            await send_admin_notification(callback.message.bot, user_id, action, location)
+            await send_admin_notification(callback.message.bot, user_id, action, location, result['full_name'])
 
             # Удаляем старое сообщение с кнопками
             try:
@@ -560,9 +623,10 @@ async def callback_location_selection(callback: CallbackQuery, state: FSMContext
             except:
                 pass
         else:
-            # Проверяем последнюю запись для более точного сообщения об ошибке
-            last_records = db.get_user_records(user_id, 1)
-            if last_records and last_records[0]['action'] == action:
+            # Проверяем последнюю запись для более точного сообщения об ошибке:
+            # статус перечитывается - отметку могло сделать параллельное обновление
+            current = await db.get_user_context(user_id)
+            if current.action == action:
                 keyboard = [[InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu")]]
                 await callback.message.edit_text(
                     "ℹ️ Статус уже обновлен!\n\n"
@@ -588,12 +652,12 @@ async def callback_location_selection(callback: CallbackQuery, state: FSMContext
         await callback.answer()
 
 @router.message(Command("journal"))
-async def cmd_journal(message: Message, state: FSMContext):
+async def cmd_journal(message: Message, state: FSMContext, user_ctx: UserContext):
     """Команда /journal - показать личный журнал пользователя"""
     user_id = message.from_user.id
 
     # Проверяем, зарегистрирован ли пользователь
-    if not db.get_user(user_id):
+    if not user_ctx.user:
         await message.answer(
             "❌ Вы не зарегистрированы в системе!\n"
             "Отправьте команду /start для регистрации."
@@ -601,10 +665,12 @@ async def cmd_journal(message: Message, state: FSMContext):
         return
 
     try:
-        # Получаем последние 10 записей пользователя
-        records = db.get_user_records(user_id, limit=10)
+        # Журнал собирается заново только после новой отметки бойца
+        text = await render_cache.render(
+            'journal', user_id, (f'user:{user_id}', 'records'), lambda: build_journal(user_id)
+        )
 
-        if not records:
+        if not text:
             await message.answer(
                 "📋 **Мой журнал**\n\n"
                 "📝 У вас пока нет записей в журнале.\n"
@@ -613,57 +679,8 @@ async def cmd_journal(message: Message, state: FSMContext):
             )
             return
 
-        # Формируем красивый текст журнала
-        text = "📋 **Мой журнал**\n"
-        text += "─" * 25 + "\n\n"
-
-        for i, record in enumerate(records, 1):
-            timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
-            formatted_date = timestamp.strftime('%d.%m.%Y')
-            formatted_time = timestamp.strftime('%H:%M')
-
-            if record['action'] == 'не в части':
-                action_emoji = "🚶"
-                action_text = "**убыл**"
-                status_color = "🔴"
-            else:
-                action_emoji = "🏠"
-                action_text = "**прибыл**"
-                status_color = "🟢"
-
-            text += f"{status_color} {i}. {action_emoji} {action_text}\n"
-            text += f"📍 {record['location']}\n"
-            text += f"📅 {formatted_date} в {formatted_time}\n"
-
-            if i < len(records):
-                text += "─" * 20 + "\n\n"
-
-        # Показываем текущий статус (берем последнюю запись)
-        latest_records = db.get_user_records(user_id, limit=1)  # Получаем последнюю запись
-        if latest_records:
-            last_record = latest_records[0]  # Берем первую (самую новую)
-            if last_record['action'] == 'не в части':
-                current_status = "🔴 **Не в части**"
-                status_desc = "Отсутствует"
-            else:
-                current_status = "🟢 **В части**"
-                status_desc = "Присутствует"
-
-            last_time = datetime.fromisoformat(last_record['timestamp'].replace('Z', '+00:00'))
-            time_ago = (datetime.now() - last_time.replace(tzinfo=None)).total_seconds()
-
-            if time_ago < 3600:  # Меньше часа
-                time_text = f"{int(time_ago / 60)} мин. назад"
-            elif time_ago < 86400:  # Меньше дня
-                time_text = f"{int(time_ago / 3600)} ч. назад"
-            else:
-                time_text = f"{int(time_ago / 86400)} дн. назад"
-
-            text += f"\n━━━━━━━━━━━━━━━\n"
-            text += f"📊 **Текущий статус:** {current_status}\n"
-            text += f"🏷️ **Описание:** {status_desc}\n"
-            text += f"📍 **Локация:** {last_record['location']}\n"
-            text += f"⏱️ **Обновлено:** {time_text}"
+        # Текущий статус - из контекста обновления, «обновлено N назад» на момент показа
+        text += format_journal_status(user_ctx)
 
         # Кнопка возврата в главное меню
         keyboard = [[InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu")]]
@@ -678,13 +695,13 @@ async def cmd_journal(message: Message, state: FSMContext):
 # Убираем пагинацию журнала - не нужна для максимум 10 записей
 
 @router.callback_query(F.data == "show_journal")
-async def callback_show_journal(callback: CallbackQuery):
+async def callback_show_journal(callback: CallbackQuery, user_ctx: UserContext):
     """Показать журнал пользователя"""
     try:
         user_id = callback.from_user.id
 
         # Проверяем, зарегистрирован ли пользователь
-        user = db.get_user(user_id)
+        user = user_ctx.user
         if not user:
             await callback.message.edit_text(
                 "❌ Вы не зарегистрированы в системе!\n"
@@ -693,10 +710,12 @@ async def callback_show_journal(callback: CallbackQuery):
             await callback.answer()
             return
 
-        # Получаем последние 10 записей пользователя
-        records = db.get_user_records(user_id, limit=10)
+        # Журнал собирается заново только после новой отметки бойца
+        text = await render_cache.render(
+            'journal', user_id, (f'user:{user_id}', 'records'), lambda: build_journal(user_id)
+        )
 
-        if not records:
+        if not text:
             await callback.message.edit_text(
                 "📋 **Мой журнал**\n\n"
                 "📝 У вас пока нет записей в журнале.\n"
@@ -707,57 +726,8 @@ async def callback_show_journal(callback: CallbackQuery):
             await callback.answer()
             return
 
-        # Формируем красивый текст журнала
-        text = "📋 **Мой журнал**\n"
-        text += "─" * 25 + "\n\n"
-
-        for i, record in enumerate(records, 1):
-            timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
-            formatted_date = timestamp.strftime('%d.%m.%Y')
-            formatted_time = timestamp.strftime('%H:%M')
-
-            if record['action'] == 'не в части':
-                action_emoji = "🚶"
-                action_text = "**убыл**"
-                status_color = "🔴"
-            else:
-                action_emoji = "🏠"
-                action_text = "**прибыл**"
-                status_color = "🟢"
-
-            text += f"{status_color} {i}. {action_emoji} {action_text}\n"
-            text += f"📍 {record['location']}\n"
-            text += f"📅 {formatted_date} в {formatted_time}\n"
-
-            if i < len(records):
-                text += "─" * 20 + "\n\n"
-
-        # Показываем текущий статус (берем последнюю запись)
-        latest_records = db.get_user_records(user_id, limit=1)  # Получаем последнюю запись
-        if latest_records:
-            last_record = latest_records[0]  # Берем первую (самую новую)
-            if last_record['action'] == 'не в части':
-                current_status = "🔴 **Не в части**"
-                status_desc = "Отсутствует"
-            else:
-                current_status = "🟢 **В части**"
-                status_desc = "Присутствует"
-
-            last_time = datetime.fromisoformat(last_record['timestamp'].replace('Z', '+00:00'))
-            time_ago = (datetime.now() - last_time.replace(tzinfo=None)).total_seconds()
-
-            if time_ago < 3600:  # Меньше часа
-                time_text = f"{int(time_ago / 60)} мин. назад"
-            elif time_ago < 86400:  # Меньше дня
-                time_text = f"{int(time_ago / 3600)} ч. назад"
-            else:
-                time_text = f"{int(time_ago / 86400)} дн. назад"
-
-            text += f"\n━━━━━━━━━━━━━━━\n"
-            text += f"📊 **Текущий статус:** {current_status}\n"
-            text += f"🏷️ **Описание:** {status_desc}\n"
-            text += f"📍 **Локация:** {last_record['location']}\n"
-            text += f"⏱️ **Обновлено:** {time_text}"
+        # Текущий статус - из контекста обновления, «обновлено N назад» на момент показа
+        text += format_journal_status(user_ctx)
 
         # Кнопка возврата в главное меню
         keyboard = [[InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu")]]
@@ -781,12 +751,12 @@ async def show_user_journal_page(callback: CallbackQuery, user_id: int, page: in
         offset = (page - 1) * per_page
 
         # Получаем общее количество записей
-        all_records = db.get_user_records(user_id, 1000)  # Получаем все для подсчета
+        all_records = await db.get_user_records(user_id, 1000)  # Получаем все для подсчета
         total_records = len(all_records)
         total_pages = (total_records + per_page - 1) // per_page if total_records > 0 else 1
 
         # Получаем записи для текущей страницы
-        records = db.get_user_records(user_id, per_page)
+        records = await db.get_user_records(user_id, per_page)
         if offset > 0:
             # Для простоты берем нужные записи из общего списка
             records = all_records[offset:offset + per_page]
@@ -798,7 +768,7 @@ async def show_user_journal_page(callback: CallbackQuery, user_id: int, page: in
             text = f"📋 Ваш журнал (стр. {page}/{total_pages}):\n\n"
             for i, record in enumerate(records, 1):
                 try:
-                    timestamp = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
+                    timestamp = datetime.fromtimestamp(record['timestamp'])
                     formatted_time = timestamp.strftime('%d.%m %H:%M')
 
                     if record['action'] == "не в части":
@@ -872,7 +842,7 @@ async def callback_pagination_info(callback: CallbackQuery):
 
 # Обработчик неизвестных сообщений
 @router.message()
-async def handle_unknown_message(message: Message):
+async def handle_unknown_message(message: Message, user_ctx: UserContext):
     """Обработка неизвестных сообщений"""
     try:
         user_id = message.from_user.id
@@ -880,7 +850,7 @@ async def handle_unknown_message(message: Message):
         
 
         # Проверяем, зарегистрирован ли пользователь
-        user = db.get_user(user_id)
+        user = user_ctx.user
         if not user:
             await message.answer(
                 "❌ Вы не зарегистрированы в системе!\n"
@@ -894,15 +864,16 @@ async def handle_unknown_message(message: Message):
     except Exception as e:
         logging.error(f"Ошибка в handle_unknown_message от пользователя {user_id}: {e}")
 
-async def send_admin_notification(bot, user_id: int, action: str, location: str):
+async def send_admin_notification(bot, user_id: int, action: str, location: str, full_name: str = None):
     """Отправляет уведомление главному админу о действиях пользователя."""
     try:
-        user = db.get_user(user_id)
-        if not user:
-            logging.warning(f"Не удалось найти пользователя с ID {user_id} для уведомления админа.")
-            return
+        if full_name is None:
+            user = await db.get_user(user_id)
+            if not user:
+                logging.warning(f"Не удалось найти пользователя с ID {user_id} для уведомления админа.")
+                return
+            full_name = user['full_name']
 
-        full_name = user['full_name']
         timestamp = datetime.now().strftime('%d.%m.%Y %H:%M')
 
         if action == "в части":
@@ -917,21 +888,20 @@ async def send_admin_notification(bot, user_id: int, action: str, location: str)
         logging.error(f"Ошибка при отправке уведомления админу: {e}")
 
 @router.callback_query(F.data == "action_arrived")
-async def callback_arrived(callback: CallbackQuery, state: FSMContext):
+async def callback_arrived(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Обработка кнопки 'Прибыл' - сразу записываем в часть без выбора локации"""
     user_id = callback.from_user.id
 
     # Проверяем, зарегистрирован ли пользователь
-    user = db.get_user(user_id)
+    user = user_ctx.user
     if not user:
         await callback.answer("❌ Сначала отправьте /start для регистрации", show_alert=True)
         return
 
     # Проверяем последнее действие
-    last_records = db.get_user_records(user_id, 1)
-    if last_records and last_records[0]['action'] == "прибыл":
+    if user_ctx.action == "прибыл":
         await state.set_state(UserStates.showing_duplicate_action_warning)
-        last_time = datetime.fromisoformat(last_records[0]['timestamp'].replace('Z', '+00:00')).strftime('%d.%m.%Y в %H:%M')
+        last_time = datetime.fromtimestamp(user_ctx.since).strftime('%d.%m.%Y в %H:%M')
 
         keyboard = [
             [InlineKeyboardButton(text="🔙 Понятно, вернуться в меню", callback_data="main_menu")]
@@ -952,7 +922,7 @@ async def callback_arrived(callback: CallbackQuery, state: FSMContext):
         return
 
     # Сразу записываем прибытие в часть
-    if db.add_record(user_id, "прибыл", "В части"):
+    if await db.add_record(user_id, "прибыл", "В части"):
         # Очищаем состояние
         await state.clear()
 
@@ -3,11 +3,15 @@ import logging
 import os
 import sqlite3
 import signal
+import time
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from handlers import user, admin, stats, notifications
+from handlers.middlewares import UserProfileMiddleware, UpdateSchedulerMiddleware
 from services.db_service import DatabaseService
-from config import BOT_TOKEN, MAIN_ADMIN_ID, DB_NAME
+from services.registry import get_db, get_async_db, get_update_scheduler, close_all
+from config import (BOT_TOKEN, MAIN_ADMIN_ID, DB_NAME, REPLICA_DIR, REPLICA_APPLY,
+                    UPDATE_CONCURRENCY, UPDATE_QUEUE_LIMIT, UPDATE_USER_QUEUE_LIMIT)
 from datetime import datetime
 import sys
 from keep_alive import keep_alive
@@ -76,7 +80,7 @@ def check_database():
             print_colored(f"  ⚠️  Файл БД будет создан: {DB_NAME}", Colors.WARNING)
 
         # Проверяем подключение к БД
-        db = DatabaseService()
+        db = get_db()
         print_colored("  ✅ Подключение к БД: OK", Colors.OKGREEN)
 
         # Проверяем таблицы
@@ -211,6 +215,46 @@ def setup_logging():
     logging.getLogger('apscheduler').setLevel(logging.ERROR)
     logging.getLogger('root').setLevel(logging.ERROR)
 
+# Фоновые задачи держатся здесь до завершения: на задачу без ссылки цикл
+# событий не ссылается, и сборщик мусора может уничтожить ее посреди работы
+background_tasks = set()
+
+def _log_task_result(task: asyncio.Task):
+    """Записать в лог ошибку завершившейся фоновой задачи"""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logging.error(f"Ошибка фоновой задачи {task.get_name()}: {error}")
+
+def start_background_task(coro, name: str) -> asyncio.Task:
+    """Запустить фоновую задачу, сохранив ссылку на нее"""
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    task.add_done_callback(_log_task_result)
+    return task
+
+async def stop_background_tasks():
+    """Остановить фоновые задачи до закрытия базы"""
+    tasks = list(background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Отмена не прерывает шаг, уже выполняющийся в пуле потоков (VACUUM,
+    # снимок, захват WAL) - дожидаемся его, прежде чем закрывать соединения
+    await asyncio.get_running_loop().shutdown_default_executor()
+
+async def cleanup_in_background(db: DatabaseService, days: int):
+    """Фоновая очистка старых записей с архивированием"""
+    try:
+        stats = await db.retention.run_async(days)
+        if stats['deleted']:
+            logging.info(f"Очищено старых записей: {stats['deleted']}, архивы: {stats['archives']}")
+    except Exception as e:
+        logging.error(f"Ошибка фоновой очистки: {e}")
+
+
 async def main():
     """Основная функция запуска бота"""
 
@@ -255,9 +299,11 @@ async def main():
         # Настраиваем логирование для подавления INFO сообщений
         logging.getLogger("root").setLevel(logging.WARNING)
 
-        # Инициализируем БД только один раз
-        db = DatabaseService()
-        print("  ✅ Подключение к БД: OK")
+        # Инициализируем БД только один раз: обработчики и мониторинг
+        # используют этот же экземпляр через services.registry
+        start = time.perf_counter()
+        db = get_db()
+        print(f"  ✅ Подключение к БД: OK ({(time.perf_counter() - start) * 1000:.1f} мс)")
         print("  ✅ Все таблицы проверены: OK")
     except Exception as e:
         print(f"  ❌ Ошибка БД: {e}")
@@ -301,6 +347,16 @@ async def main():
     # Регистрация обработчиков  
     print("🔗 РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ:")
     try:
+        # Ограниченный параллелизм, порядок внутри пользователя, сброс при перегрузке
+        dp.update.outer_middleware(UpdateSchedulerMiddleware(
+            get_update_scheduler(UPDATE_CONCURRENCY, UPDATE_QUEUE_LIMIT, UPDATE_USER_QUEUE_LIMIT)
+        ))
+
+        # Профиль, права и статус пользователя - один запрос на обновление
+        profile_middleware = UserProfileMiddleware(get_async_db())
+        dp.message.outer_middleware(profile_middleware)
+        dp.callback_query.outer_middleware(profile_middleware)
+
         dp.include_router(user.router)
         dp.include_router(admin.router)
         dp.include_router(stats.router)
@@ -334,13 +390,22 @@ async def main():
     # Автоматическая очистка
     print("🧹 АВТООЧИСТКА:")
     try:
-        # Простая очистка без внешних модулей
-        cleaned_count = db.cleanup_old_records(days=90)
-        print(f"  ✅ Очищено старых записей: {cleaned_count}")
-
-        # Оптимизация БД
-        db.optimize_database()
-        print("  ✅ База данных оптимизирована")
+        # Очистка идет пакетами в фоне и не задерживает запуск бота
+        start_background_task(cleanup_in_background(db, days=90), "cleanup")
+        print("  ✅ Очистка старых записей запущена в фоне")
+
+        # VACUUM/ANALYZE больше не задерживают запуск: обслуживание идет в фоне
+        start_background_task(db.maintenance.run_forever(), "maintenance")
+        print("  ✅ Фоновое обслуживание БД запущено")
+
+        # Снимки через backup API и архив WAL для восстановления на момент
+        start_background_task(db.backups.run_forever(), "backups")
+        print("  ✅ Резервное копирование запущено")
+
+        # Доставка WAL в реплику в другом каталоге
+        if REPLICA_DIR and db.enable_replication(REPLICA_DIR, apply=REPLICA_APPLY):
+            start_background_task(db.replication.run_forever(), "replication")
+            print(f"  ✅ Репликация в {REPLICA_DIR} запущена")
     except Exception as e:
         print(f"  ⚠️  Предупреждение очистки: {e}")
     print()
@@ -369,6 +434,8 @@ async def main():
     async def on_shutdown():
         logging.info("Остановка бота...")
         await bot.session.close()
+        await stop_background_tasks()
+        close_all()
         logging.info("Бот остановлен")
 
     # Регистрируем обработчик сигналов
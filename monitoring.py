@@ -6,12 +6,12 @@ import time
 import os
 from datetime import datetime, timedelta
 from typing import Dict, Any
-from services.db_service import DatabaseService
+from services.registry import get_db, get_render_cache, get_update_scheduler
+from services.replication import LAG_WARNING_SECONDS
 
 class SystemMonitor:
     def __init__(self):
         self.start_time = datetime.now()
-        self.db = DatabaseService()
         self.metrics = {
             'total_requests': 0,
             'successful_requests': 0,
@@ -21,9 +21,25 @@ class SystemMonitor:
             'memory_usage': 0,
             'cpu_usage': 0,
             'active_users': 0,
-            'database_size': 0
+            'database_size': 0,
+            'replication_lag': None,
+            'replication_pending': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'cache_evictions': 0,
+            'cache_hit_rate': 0.0,
+            'cache_external_changes': 0,
+            'render_screens': {},
+            'updates_active': 0,
+            'updates_queued': 0,
+            'updates_shed': 0
         }
         
+    @property
+    def db(self):
+        """Общий DatabaseService - открывается при первом обращении, а не при импорте"""
+        return get_db()
+
     def get_uptime(self) -> str:
         """Получить время работы системы"""
         uptime = datetime.now() - self.start_time
@@ -55,7 +71,13 @@ class SystemMonitor:
             
             # Статистика пользователей
             users_count = len(self.db.get_all_users())
-            records_count = len(self.db.get_all_records(days=1))
+            records_count = self.db.get_period_stats(days=1)['total']
+
+            # Реплика: отставание от основной базы (если репликация настроена)
+            replication = self.db.get_replication_status()
+
+            # Кэш чтения DatabaseService
+            cache = self.db.cache.get_stats()
             
             self.metrics.update({
                 'uptime': self.get_uptime(),
@@ -65,7 +87,33 @@ class SystemMonitor:
                 'process_memory': process.memory_info().rss / (1024 * 1024),  # MB
                 'database_size': round(db_size, 2),
                 'total_users': users_count,
-                'records_today': records_count
+                'records_today': records_count,
+                'replication_enabled': bool(replication),
+                'replication_lag': replication.get('lag_seconds'),
+                'replication_pending': replication.get('pending', 0),
+                'replication_needs_seed': replication.get('needs_seed') is not None,
+                'cache_hits': cache['hits'],
+                'cache_misses': cache['misses'],
+                'cache_evictions': cache['evictions'],
+                'cache_hit_rate': cache['hit_rate'],
+                'cache_external_changes': cache['external_changes'],
+                'cache_size': cache['size'],
+                # Кэш экранов: попадания и время сборки по экранам
+                'render_screens': get_render_cache().get_stats()
+            })
+
+            # Очередь обновлений бота: глубина, ожидание, отклоненные
+            updates = get_update_scheduler().get_stats()
+            self.metrics.update({
+                'updates_active': updates['active'],
+                'updates_queued': updates['queued'],
+                'updates_queued_peak': updates['queued_peak'],
+                'updates_queue_limit': updates['queue_limit'],
+                'updates_processed': updates['processed'],
+                'updates_shed': updates['shed'],
+                'updates_last_shed_seconds': updates['last_shed_seconds'],
+                'updates_wait_ms_avg': updates['wait_ms_avg'],
+                'updates_wait_ms_max': updates['wait_ms_max']
             })
             
             return self.metrics
@@ -105,6 +153,19 @@ class SystemMonitor:
         
         if metrics['database_size'] > 100:  # Больше 100 MB
             health_issues.append("Большой размер базы данных")
+
+        if metrics.get('replication_enabled'):
+            lag = metrics.get('replication_lag')
+            if lag is None or lag > LAG_WARNING_SECONDS:
+                health_issues.append("Реплика базы отстает")
+            if metrics.get('replication_needs_seed'):
+                health_issues.append("Реплика ждет новой заливки")
+
+        if metrics.get('updates_queued', 0) > metrics.get('updates_queue_limit', 0) // 2:
+            health_issues.append("Очередь обновлений бота заполнена больше чем наполовину")
+        last_shed = metrics.get('updates_last_shed_seconds')
+        if last_shed is not None and last_shed < 300:
+            health_issues.append("Бот отклонял обновления из-за перегрузки")
         
         # Проверяем последние ошибки
         if self.metrics['last_error']:
@@ -124,17 +185,18 @@ class SystemMonitor:
     async def cleanup_if_needed(self):
         """Автоматическая очистка при необходимости"""
         try:
-            metrics = self.get_system_metrics()
+            metrics = await asyncio.to_thread(self.get_system_metrics)
             
             # Если база данных слишком большая, очищаем старые записи
             if metrics['database_size'] > 50:  # Больше 50 MB
-                deleted = self.db.cleanup_old_records(days=90)
+                stats = await self.db.retention.run_async(90)
+                deleted = stats['deleted']
                 logging.info(f"Автоочистка: удалено {deleted} старых записей")
-            
-            # Если память заканчивается, оптимизируем базу
+
+            # VACUUM при нехватке памяти только усугублял ее - обслуживание
+            # базы выполняет MaintenanceService в окна простоя
             if metrics['memory_usage'] > 80:
-                self.db.optimize_database()
-                logging.info("Выполнена оптимизация базы данных")
+                logging.warning(f"Высокое использование памяти: {metrics['memory_usage']:.1f}%")
                 
         except Exception as e:
             self.log_error(f"Ошибка автоочистки: {e}")
@@ -210,7 +272,8 @@ async def periodic_health_check():
     """Периодическая проверка здоровья системы"""
     while True:
         try:
-            health = monitor.get_health_status()
+            # Замер CPU (1 с) и чтения базы - вне цикла событий
+            health = await asyncio.to_thread(monitor.get_health_status)
             
             if health['status'] == 'critical':
                 advanced_logger.log_system_event(
@@ -246,7 +309,22 @@ def get_system_status() -> str:
     status_text += f"🖥️ **CPU:** {metrics['cpu_usage']:.1f}%\n"
     status_text += f"🗃️ **База данных:** {metrics['database_size']} MB\n"
     status_text += f"👥 **Всего пользователей:** {metrics['total_users']}\n"
-    status_text += f"📊 **Записей сегодня:** {metrics['records_today']}\n\n"
+    status_text += f"📊 **Записей сегодня:** {metrics['records_today']}\n"
+    if metrics.get('replication_enabled'):
+        lag = metrics.get('replication_lag')
+        lag_text = f"{lag:.0f} с" if lag is not None else "нет данных"
+        status_text += f"🔁 **Реплика:** отставание {lag_text}, в очереди {metrics['replication_pending']}\n"
+    status_text += (f"🧠 **Кэш БД:** попаданий {metrics['cache_hit_rate']:.0f}% "
+                    f"({metrics['cache_hits']}/{metrics['cache_hits'] + metrics['cache_misses']}), "
+                    f"вытеснено {metrics['cache_evictions']}\n")
+    for screen, render in metrics.get('render_screens', {}).items():
+        status_text += (f"🖼️ **Экран {screen}:** из кэша {render['hit_rate']:.0f}%, "
+                        f"сборка {render['render_ms_avg']:.1f} мс (макс. {render['render_ms_max']:.1f}), "
+                        f"отброшено {render['discarded']}\n")
+    status_text += (f"📨 **Обновления:** в работе {metrics['updates_active']}, в очереди {metrics['updates_queued']} "
+                    f"(пик {metrics.get('updates_queued_peak', 0)}), ожидание {metrics.get('updates_wait_ms_avg', 0.0):.0f} мс "
+                    f"(макс. {metrics.get('updates_wait_ms_max', 0.0):.0f}), отклонено {metrics['updates_shed']}\n")
+    status_text += "\n"
     
     status_text += f"📈 **Статистика запросов:**\n"
     status_text += f"• Всего: {metrics['total_requests']}\n"
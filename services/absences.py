@@ -0,0 +1,87 @@
+import sqlite3
+from typing import Optional
+
+from services.locations import Action
+
+# Интервалы отсутствия: одна строка absences на непрерывное отсутствие бойца -
+# от отметки "не в части" до следующей отметки "в части" (ended_at IS NULL,
+# пока боец не вернулся). Повторная отметка "не в части" без возвращения
+# не открывает новый интервал, а меняет location_id на последнюю локацию.
+#
+# Таблица ведется add_record в той же транзакции (apply_record), для
+# существующей истории - rebuild_absences.
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def apply_record(conn: sqlite3.Connection, user_id: int, action: int,
+                 location_id: int, timestamp: int) -> Optional[int]:
+    """Учесть новую запись (внутри транзакции писателя).
+
+    Возвращает id открытого или закрытого интервала, None - интервал не менялся.
+    """
+    row = conn.execute(
+        'SELECT id FROM absences WHERE user_id = ? AND ended_at IS NULL', (user_id,)
+    ).fetchone()
+
+    if action == Action.ABSENT:
+        if row:
+            conn.execute('UPDATE absences SET location_id = ? WHERE id = ?', (location_id, row[0]))
+            return row[0]
+        return conn.execute(
+            'INSERT INTO absences (user_id, location_id, started_at) VALUES (?, ?, ?)',
+            (user_id, location_id, timestamp)
+        ).lastrowid
+
+    if row:
+        conn.execute('UPDATE absences SET ended_at = ? WHERE id = ?', (timestamp, row[0]))
+        return row[0]
+    return None
+
+
+def rebuild_absences(conn: sqlite3.Connection) -> int:
+    """Пересобрать absences по истории записей (внутри транзакции писателя).
+
+    Один проход по покрывающему индексу (user_id, timestamp) - память не
+    зависит от размера истории. Возвращает количество интервалов.
+    """
+    conn.execute('DELETE FROM absences')
+    insert = 'INSERT INTO absences (user_id, location_id, started_at, ended_at) VALUES (?, ?, ?, ?)'
+
+    count = 0
+    batch = []
+    current_user = None
+    open_absence = None
+    rows = conn.execute('''
+        SELECT user_id, action, location_id, timestamp
+        FROM records
+        ORDER BY user_id, timestamp, id
+    ''')
+    for user_id, action, location_id, timestamp in rows:
+        if user_id != current_user:
+            if open_absence:
+                batch.append(open_absence)
+            current_user = user_id
+            open_absence = None
+
+        if action == Action.ABSENT:
+            if open_absence:
+                open_absence[1] = location_id
+            else:
+                open_absence = [user_id, location_id, timestamp, None]
+        elif open_absence:
+            open_absence[3] = timestamp
+            batch.append(open_absence)
+            open_absence = None
+
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            conn.executemany(insert, batch)
+            count += len(batch)
+            batch = []
+
+    if open_absence:
+        batch.append(open_absence)
+    if batch:
+        conn.executemany(insert, batch)
+        count += len(batch)
+    return count
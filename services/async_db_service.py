@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable
+
+from services.connection_manager import DEFAULT_READERS
+from services.db_service import DatabaseService, RECORDS_CHUNK_SIZE
+
+
+class AsyncDatabaseService:
+    """Асинхронный фасад над DatabaseService для обработчиков aiogram.
+
+    Каждый вызов выполняется в отдельном пуле потоков, поэтому SQLite
+    никогда не работает в потоке цикла событий. API совпадает с
+    DatabaseService: любой публичный метод доступен как корутина,
+    например ``await db.add_record(...)`` или ``await db.get_current_status()``.
+    """
+
+    def __init__(self, db: Optional[DatabaseService] = None, max_workers: Optional[int] = None,
+                 db_factory: Optional[Callable[[], DatabaseService]] = None):
+        # db_factory откладывает открытие базы до первого запроса
+        self._db = db
+        self._db_factory = db_factory or DatabaseService
+        # Один поток на каждое соединение читателя и один на писателя
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or DEFAULT_READERS + 1,
+            thread_name_prefix="db"
+        )
+
+    @property
+    def db(self) -> DatabaseService:
+        if self._db is None:
+            self._db = self._db_factory()
+        return self._db
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить произвольную синхронную функцию в пуле потоков БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def add_record(self, user_id: int, action: str, location: str):
+        """Добавить запись через очередь записи, не занимая поток пула"""
+        return await asyncio.wrap_future(self.db.submit_record(user_id, action, location))
+
+    async def add_user(self, user_id: int, username: str, full_name: str) -> bool:
+        """Добавить пользователя через очередь записи, не занимая поток пула"""
+        return await asyncio.wrap_future(self.db.submit_user(user_id, username, full_name))
+
+    async def cleanup_old_records(self, days: int = 180, progress=None) -> int:
+        """Очистка старых записей пакетами; progress(stats) - после каждого пакета"""
+        try:
+            stats = await self.db.retention.run_async(days, progress, executor=self.executor)
+            return stats['deleted']
+        except Exception as e:
+            logging.error(f"Ошибка очистки записей: {e}")
+            return 0
+
+    async def iter_records(self, days: int = 30, chunk_size: Optional[int] = None):
+        """Асинхронный аналог DatabaseService.iter_records: порции читаются в пуле потоков"""
+        since = int(time.time()) - days * 86400
+        chunk_size = chunk_size or RECORDS_CHUNK_SIZE
+        after = None
+        while True:
+            chunk = await self.run(self.db.get_records_chunk, since, after, chunk_size)
+            for record in chunk:
+                yield record
+            if len(chunk) < chunk_size:
+                return
+            after = (chunk[-1].timestamp, chunk[-1].id)
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        # Кэшируем обертку, чтобы __getattr__ не вызывался повторно
+        self.__dict__[name] = method
+        return method
+
+    def close(self):
+        """Остановить пул потоков и закрыть соединения"""
+        self.executor.shutdown(wait=True)
+        self.db.close()
@@ -0,0 +1,246 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from services.wal import WalArchiver, apply_segment, list_segments
+
+# Настройки резервного копирования по умолчанию
+BACKUP_DIR = 'backups'
+# Страниц за один шаг backup API (по 4 КБ) и пауза между шагами, в которую
+# блокировка писателя свободна
+SNAPSHOT_STEP_PAGES = 256
+SNAPSHOT_STEP_PAUSE = 0.01
+SNAPSHOT_INTERVAL_SECONDS = 24 * 3600
+KEEP_SNAPSHOTS = 7
+WAL_CAPTURE_INTERVAL_SECONDS = 60
+
+SNAPSHOT_RE = re.compile(r'^snapshot_(\d{8}_\d{6})_(\d{10})\.db\.gz$')
+
+
+class BackupService:
+    """Горячие снимки базы и восстановление на момент времени.
+
+    Снимок делается через backup API на соединении писателя шагами по
+    SNAPSHOT_STEP_PAGES страниц; между шагами блокировка писателя отпускается,
+    а изменения, зафиксированные писателем, backup API сам переносит в копию.
+    Снимок сжимается в ``backups/snapshot_<время>_<сегмент WAL>.db.gz``,
+    хранятся последние KEEP_SNAPSHOTS.
+
+    Между снимками кадры WAL копируются в ``backups/wal`` (см. WalArchiver),
+    поэтому базу можно восстановить на любой захват после самого старого
+    снимка. Сегменты старше самого старого снимка удаляются вместе с ним.
+    """
+
+    def __init__(self, db, directory: str = BACKUP_DIR,
+                 step_pages: int = SNAPSHOT_STEP_PAGES,
+                 pause: float = SNAPSHOT_STEP_PAUSE,
+                 keep: int = KEEP_SNAPSHOTS):
+        self.db = db
+        self.directory = directory
+        self.step_pages = max(1, step_pages)
+        self.pause = pause
+        self.keep = max(1, keep)
+        self.wal = WalArchiver(db, os.path.join(directory, 'wal'))
+        self._lock = threading.Lock()
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+
+    def snapshot(self, reason: str = 'manual') -> Dict[str, Any]:
+        """Сделать сжатый снимок базы. Возвращает путь, размеры и длительность"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = os.path.join(self.directory, '.snapshot.db.tmp')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            started = time.perf_counter()
+            progress = {'steps': 0, 'pages': 0}
+
+            def on_step(status, remaining, total):
+                progress['steps'] += 1
+                progress['pages'] = total
+                if remaining:
+                    self.db.connections.yield_writer(self.pause)
+
+            target = sqlite3.connect(tmp_path)
+            try:
+                with self.db.connections.raw_writer() as conn:
+                    conn.backup(target, pages=self.step_pages, progress=on_step)
+                    # Хвост WAL захватывается под той же блокировкой: снимок
+                    # содержит все сегменты до wal_seq, восстановление
+                    # применяет только следующие
+                    if self.wal.enabled:
+                        self.wal.capture(conn)
+                        self.wal.gap = False
+                    wal_seq = self.wal.last_seq()
+                    # Время снимка - момент окончания копирования
+                    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                target.close()
+                copied = time.perf_counter()
+
+                path = os.path.join(self.directory, f'snapshot_{stamp}_{wal_seq:010d}.db.gz')
+                db_size = os.path.getsize(tmp_path)
+                with open(tmp_path, 'rb') as src, gzip.open(path + '.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(path + '.tmp', path)
+            finally:
+                target.close()
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            result = {
+                'path': path,
+                'reason': reason,
+                'created_at': time.time(),
+                'wal_seq': wal_seq,
+                'pages': progress['pages'],
+                'steps': progress['steps'],
+                'db_size': db_size,
+                'size': os.path.getsize(path),
+                'copy_seconds': round(copied - started, 3),
+                'duration': round(time.perf_counter() - started, 3)
+            }
+            self.last_snapshot = result
+            logging.info(
+                f"Снимок БД ({reason}): {os.path.basename(path)}, {result['size'] / 1024:.0f} КБ "
+                f"за {result['duration']} с ({result['steps']} шагов)"
+            )
+            return result
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Снимки от старых к новым"""
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for name in os.listdir(self.directory):
+            match = SNAPSHOT_RE.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.directory, name)
+            snapshots.append({
+                'path': path,
+                'created_at': datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').timestamp(),
+                'wal_seq': int(match.group(2)),
+                'size': os.path.getsize(path)
+            })
+        return sorted(snapshots, key=lambda item: (item['created_at'], item['wal_seq']))
+
+    def rotate(self) -> Dict[str, int]:
+        """Оставить последние keep снимков и сегменты WAL, нужные самому старому из них"""
+        snapshots = self.list_snapshots()
+        removed = 0
+        for snapshot in snapshots[:-self.keep]:
+            try:
+                os.remove(snapshot['path'])
+                removed += 1
+            except OSError as e:
+                logging.error(f"Ошибка удаления снимка {snapshot['path']}: {e}")
+        kept = snapshots[-self.keep:]
+        segments = self.wal.prune(kept[0]['wal_seq']) if kept else 0
+        return {'snapshots': removed, 'segments': segments}
+
+    def restore(self, target_path: str, moment: Optional[float] = None) -> Dict[str, Any]:
+        """Восстановить базу в новый файл target_path.
+
+        moment - время (unix), на которое нужна база; None - последний захват.
+        Используется последний снимок не позже moment и сегменты WAL после
+        него, захваченные не позже moment. Рабочая база не меняется.
+        """
+        if os.path.exists(target_path):
+            raise FileExistsError(f"Файл {target_path} уже существует")
+
+        snapshots = [s for s in self.list_snapshots() if moment is None or s['created_at'] <= moment]
+        if not snapshots:
+            raise ValueError("Нет снимка на этот момент")
+        snapshot = snapshots[-1]
+
+        started = time.perf_counter()
+        with gzip.open(snapshot['path'], 'rb') as src, open(target_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+
+        applied = transactions = 0
+        restored_to = snapshot['created_at']
+        expected = snapshot['wal_seq'] + 1
+        for seq, captured_at, path, gap in list_segments(self.wal.directory):
+            if seq <= snapshot['wal_seq']:
+                continue
+            if moment is not None and captured_at > moment:
+                break
+            if seq != expected or gap:
+                # Дальше журнал непрерывно не восстановить - останавливаемся
+                logging.warning(f"⚠️ Восстановление остановлено перед сегментом {seq}: пропуск в архиве WAL")
+                break
+            transactions += apply_segment(path, target_path)
+            applied += 1
+            expected += 1
+            restored_to = captured_at
+
+        conn = sqlite3.connect(target_path)
+        try:
+            integrity = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            conn.close()
+
+        return {
+            'path': target_path,
+            'snapshot': snapshot['path'],
+            'segments': applied,
+            'transactions': transactions,
+            'restored_to': restored_to,
+            'integrity': integrity,
+            'duration': round(time.perf_counter() - started, 3)
+        }
+
+    def run_due(self) -> List[str]:
+        """Захват WAL и снимок по расписанию. Возвращает имена выполненных задач"""
+        done = []
+        if self.wal.enabled:
+            self.wal.capture()
+            done.append('wal_capture')
+
+        snapshots = self.list_snapshots()
+        if (not snapshots or self.wal.gap
+                or time.time() - snapshots[-1]['created_at'] >= SNAPSHOT_INTERVAL_SECONDS):
+            self.snapshot('schedule')
+            self.rotate()
+            done.append('snapshot')
+        return done
+
+    async def run_forever(self, interval: float = WAL_CAPTURE_INTERVAL_SECONDS, executor=None):
+        """Цикл резервного копирования для фоновой задачи asyncio: включает архив WAL"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(executor, self.wal.enable)
+        except Exception as e:
+            logging.error(f"Ошибка включения архива WAL: {e}")
+        while True:
+            try:
+                done = await loop.run_in_executor(executor, self.run_due)
+                if 'snapshot' in done:
+                    logging.info("Резервное копирование БД: снимок по расписанию")
+            except Exception as e:
+                logging.error(f"Ошибка цикла резервного копирования: {e}")
+            await asyncio.sleep(interval)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Сводка для админ-панели и мониторинга"""
+        snapshots = self.list_snapshots()
+        segments = list_segments(self.wal.directory)
+        return {
+            'snapshots': len(snapshots),
+            'snapshots_size': sum(s['size'] for s in snapshots),
+            'latest': snapshots[-1] if snapshots else None,
+            'oldest': snapshots[0] if snapshots else None,
+            'wal_enabled': self.wal.enabled,
+            'wal_segments': len(segments),
+            'wal_size': sum(os.path.getsize(path) for _, _, path, _ in segments),
+            'wal_last_capture': self.wal.stats['last_capture'],
+            'wal_gap': self.wal.gap,
+            'last_snapshot': self.last_snapshot
+        }
@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+# Кэш чтения перед DatabaseService. Записи живут не дольше TTL, их не больше
+# max_entries (вытесняются давно не читанные), а методы записи сбрасывают их
+# по тегам: add_record - 'status' и 'user:<id>', add_admin/remove_admin -
+# 'admins' и т. д. (см. DatabaseService). Сброс идет после фиксации
+# транзакции, а значение, загруженное до сброса его тегов, в кэш уже не
+# попадает. Поколения ведутся по тегам: поток отметок (сброс 'status' и
+# 'user:<id>') не мешает сохранять загрузки с тегами 'admins' или другого бойца.
+#
+# Значения отдаются как есть, без копирования - вызывающий их не изменяет.
+#
+# Изменения из других процессов тегами не сбросить: для них кэш не чаще раза
+# в check_interval вызывает check() (DatabaseService - PRAGMA data_version) и
+# сбрасывается целиком, только если базу действительно изменил кто-то другой.
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_CHECK_INTERVAL_SECONDS = 1.0
+
+
+class TaggedCache:
+    """Потокобезопасный кэш с TTL, LRU-вытеснением и сбросом по тегам"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS,
+                 check: Optional[Callable[[], bool]] = None,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # check() -> True, если данные изменились в обход методов записи
+        self.check = check
+        self.check_interval = check_interval
+        self._checked_at = float('-inf')
+        self._check_lock = threading.Lock()
+        # ключ -> (значение, срок годности, теги); порядок - от давно читанных к недавним
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float, Tuple[str, ...]]]' = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        # Поколения тегов растут при сбросе тега, эпоха - при clear():
+        # загрузка, начатая до сброса своих тегов, не сохраняется
+        self._tag_generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'external_changes': 0
+        }
+
+    def _remove(self, key: Hashable):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def check_due(self) -> bool:
+        """Следующий lookup вызовет check() (обращение к базе)"""
+        return self.check is not None and time.monotonic() - self._checked_at >= self.check_interval
+
+    def _snapshot(self, tags: Tuple[str, ...]) -> Tuple[int, Tuple[int, ...]]:
+        """Поколения тегов на текущий момент (под self._lock)"""
+        return self._epoch, tuple(self._tag_generations.get(tag, 0) for tag in tags)
+
+    def lookup(self, key: Hashable, tags: Iterable[str] = ()) -> Tuple[bool, Any, Any]:
+        """(найдено, значение, поколение). Поколение и те же теги передаются
+        в store: значение, загруженное до сброса этих тегов, не сохранится"""
+        if self.check_due():
+            self._check_external()
+
+        tags = tuple(tags)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return True, entry[0], self._snapshot(tags)
+                self._remove(key)
+                self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return False, None, self._snapshot(tags)
+
+    def store(self, key: Hashable, value: Any, tags: Iterable[str] = (),
+              ttl: Optional[float] = None, generation: Any = None) -> bool:
+        """Сохранить значение; False - после lookup были сброшены его теги"""
+        tags = tuple(tags)
+        with self._lock:
+            if generation is not None and generation != self._snapshot(tags):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (value, expires_at, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+            return True
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    tags: Iterable[str] = (), ttl: Optional[float] = None) -> Any:
+        """Значение из кэша или loader(); исключение loader не кэшируется"""
+        tags = tuple(tags)
+        found, value, generation = self.lookup(key, tags)
+        if found:
+            return value
+        value = loader()
+        self.store(key, value, tags, ttl, generation)
+        return value
+
+    def _check_external(self):
+        """Сбросить кэш, если check() сообщает о внешнем изменении (проверяет один поток)"""
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            if self.check():
+                self.clear()
+                with self._lock:
+                    self.stats['external_changes'] += 1
+        finally:
+            self._check_lock.release()
+
+    def invalidate(self, *tags: str) -> int:
+        """Сбросить записи с любым из тегов. Возвращает число сброшенных"""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Сбросить весь кэш (массовые изменения: очистка базы, пересчеты)"""
+        with self._lock:
+            self._epoch += 1
+            self._tag_generations.clear()
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        return stats
+
+
+class RenderCache:
+    """Готовые тексты экранов бота в кэше DatabaseService.
+
+    Ключ - (экран, пользователь), теги - данные, из которых собран текст,
+    поэтому экран сбрасывают те же события записи (add_record - 'status' и
+    'user:<id>') и внешние изменения по data_version, что и сами данные.
+    Собранный текст отбрасывается, только если во время сборки сбросили
+    его собственные теги (поколения по тегам в TaggedCache) - такие сборки
+    считаются в discarded. Время сборки учитывается по экранам.
+    """
+
+    def __init__(self, db):
+        # db - AsyncDatabaseService: проверка data_version идет в его пуле потоков,
+        # остальные попадания отдаются прямо из памяти
+        self.db = db
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    async def render(self, screen: str, user_id: Optional[int], tags: Iterable[str],
+                     build: Callable[[], Awaitable[str]]) -> str:
+        """Текст экрана из кэша или собранный build()"""
+        cache = self.db.db.cache
+        key = ('screen', screen, user_id)
+        tags = tuple(tags)
+        stats = self.stats.setdefault(
+            screen, {'hits': 0, 'renders': 0, 'discarded': 0, 'render_ms': 0.0, 'render_ms_max': 0.0}
+        )
+
+        if cache.check_due():
+            # check() читает data_version - не в цикле событий
+            found, text, generation = await self.db.run(cache.lookup, key, tags)
+        else:
+            found, text, generation = cache.lookup(key, tags)
+        if found:
+            stats['hits'] += 1
+            return text
+
+        started = time.perf_counter()
+        text = await build()
+        elapsed = (time.perf_counter() - started) * 1000
+        stats['renders'] += 1
+        stats['render_ms'] += elapsed
+        stats['render_ms_max'] = max(stats['render_ms_max'], elapsed)
+        if not cache.store(key, text, tags, generation=generation):
+            stats['discarded'] += 1
+        return text
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """По экранам: попадания, сборки, отброшенные сборки и время сборки (среднее и максимум, мс)"""
+        result = {}
+        # Вызывается и из потока мониторинга - обходим копию
+        for screen, stats in list(self.stats.items()):
+            stats = dict(stats)
+            requests = stats['hits'] + stats['renders']
+            result[screen] = {
+                'hits': stats['hits'],
+                'renders': stats['renders'],
+                'discarded': stats['discarded'],
+                'hit_rate': round(stats['hits'] / requests * 100, 1) if requests else 0.0,
+                'render_ms_avg': round(stats['render_ms'] / stats['renders'], 2) if stats['renders'] else 0.0,
+                'render_ms_max': round(stats['render_ms_max'], 2)
+            }
+        return result
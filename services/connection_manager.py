@@ -0,0 +1,265 @@
+import os
+import sqlite3
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+from typing import Dict, Any, Optional
+
+# Настройки соединений по умолчанию
+DEFAULT_READERS = 4
+DEFAULT_CACHE_SIZE_KB = 8192          # 8 МБ страничного кэша на соединение
+DEFAULT_MMAP_SIZE = 64 * 1024 * 1024  # 64 МБ memory-mapped I/O
+DEFAULT_CACHED_STATEMENTS = 256       # Кэш подготовленных выражений на соединение
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+
+
+class ConnectionManager:
+    """Долгоживущие соединения SQLite: один писатель и небольшой пул читателей.
+
+    Все соединения открываются в режиме WAL с synchronous=NORMAL, поэтому
+    читатели не блокируют писателя, а коммит не требует fsync на каждую запись.
+    Подготовленные выражения переиспользуются через кэш sqlite3 каждого
+    соединения (cached_statements), поэтому SQL-тексты запросов должны быть
+    неизменными строками.
+    """
+
+    def __init__(self, db_path: str, readers: int = DEFAULT_READERS,
+                 cache_size_kb: int = DEFAULT_CACHE_SIZE_KB,
+                 mmap_size: int = DEFAULT_MMAP_SIZE,
+                 cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+                 busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+                 readonly: bool = False):
+        self.db_path = db_path
+        self.max_readers = max(1, readers)
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+        # Только чтение (реплика): файл не переводится в WAL и не меняется
+        self.readonly = readonly
+
+        # База в памяти видна только одному соединению, поэтому читатели
+        # используют соединение писателя
+        self.shared_memory = db_path == ":memory:"
+
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._readers_created = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self._trace_callback = None
+
+        self.stats = {
+            'connections_opened': 0,
+            'writer_transactions': 0,
+            'reader_checkouts': 0,
+            'reader_waits': 0
+        }
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        """Открыть и настроить новое соединение"""
+        database, uri = self.db_path, False
+        if self.readonly:
+            readonly = True
+            database, uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro", True
+        conn = sqlite3.connect(
+            database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.cached_statements,
+            uri=uri
+        )
+        conn.row_factory = sqlite3.Row
+
+        if not readonly:
+            # Действует только для новой базы (до создания файла); существующую
+            # один раз переводит в этот режим MaintenanceService через VACUUM
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if not self.shared_memory and not self.readonly:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        # Страницы реплики переписываются на месте (services/replication.py):
+        # без mmap кэш соединения сбрасывается по счетчику изменений файла
+        if not self.readonly:
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        if readonly:
+            conn.execute("PRAGMA query_only=1")
+        if self._trace_callback is not None:
+            conn.set_trace_callback(self._trace_callback)
+
+        self.stats['connections_opened'] += 1
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Менеджер соединений закрыт")
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """Транзакция на соединении писателя (BEGIN IMMEDIATE ... COMMIT)
+
+        Вложенные вызовы из того же потока выполняются внутри внешней транзакции.
+        """
+        with self._writer_lock:
+            conn = self._get_writer()
+            if conn.in_transaction:
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            else:
+                if conn.in_transaction:
+                    conn.execute("COMMIT")
+                self.stats['writer_transactions'] += 1
+
+    @contextmanager
+    def raw_writer(self):
+        """Соединение писателя без открытой транзакции (VACUUM, PRAGMA и т.п.)"""
+        with self._writer_lock:
+            yield self._get_writer()
+
+    def yield_writer(self, pause: float):
+        """Отпустить блокировку писателя на pause секунд внутри raw_writer.
+
+        Для пошаговых операций на соединении писателя (снимок через backup API):
+        между шагами успевают пройти транзакции из очереди записи.
+        """
+        self._writer_lock.release()
+        try:
+            time.sleep(pause)
+        finally:
+            self._writer_lock.acquire()
+
+    def data_version(self) -> Optional[int]:
+        """PRAGMA data_version соединения писателя.
+
+        Собственные коммиты соединения значение не меняют, поэтому рост -
+        это фиксация другого соединения: другого процесса (бот, веб-панель,
+        db_tools) или, для реплики, применения WAL. None - писатель занят,
+        проверку стоит повторить позже.
+        """
+        if not self._writer_lock.acquire(blocking=False):
+            return None
+        try:
+            conn = self._get_writer()
+            # Внутри открытой транзакции значение не обновляется
+            if conn.in_transaction:
+                return None
+            return conn.execute('PRAGMA data_version').fetchone()[0]
+        finally:
+            self._writer_lock.release()
+
+    @contextmanager
+    def reader(self):
+        """Соединение из пула читателей"""
+        if self.shared_memory:
+            with self._writer_lock:
+                yield self._get_writer()
+            return
+
+        conn = self._checkout_reader()
+        try:
+            yield conn
+        finally:
+            self._checkin_reader(conn)
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Менеджер соединений закрыт")
+
+        self.stats['reader_checkouts'] += 1
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._readers_created < self.max_readers:
+                self._readers_created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect(readonly=True)
+            except Exception:
+                with self._pool_lock:
+                    self._readers_created -= 1
+                raise
+
+        # Все читатели заняты - ждем освободившееся соединение
+        self.stats['reader_waits'] += 1
+        return self._readers.get(timeout=self.busy_timeout_ms / 1000)
+
+    def _checkin_reader(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Соединение читателя сброшено: {e}")
+            with self._pool_lock:
+                self._readers_created -= 1
+            conn.close()
+            return
+
+        if self._closed:
+            conn.close()
+        else:
+            self._readers.put(conn)
+
+    def set_trace_callback(self, callback):
+        """Передавать текст каждого выполняемого SQL в callback (None - отключить).
+
+        Действует на открытые и новые соединения; для проверки планов запросов.
+        """
+        self._trace_callback = callback
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.set_trace_callback(callback)
+        idle = []
+        while True:
+            try:
+                idle.append(self._readers.get_nowait())
+            except queue.Empty:
+                break
+        for conn in idle:
+            conn.set_trace_callback(callback)
+            self._readers.put(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика использования соединений"""
+        stats = dict(self.stats)
+        stats['readers_open'] = self._readers_created
+        stats['readers_idle'] = self._readers.qsize()
+        return stats
+
+    def close(self):
+        """Закрыть все соединения"""
+        self._closed = True
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -1,87 +1,249 @@
 import sqlite3
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+from concurrent.futures import Future
+from typing import List, Dict, Optional, Any, Union, Iterable, Iterator
+import csv
 import os
+import re
+import time
+
+from services.connection_manager import ConnectionManager, DEFAULT_READERS
+from services.write_queue import WriteQueue
+from services.migrations import SCHEMA_VERSION, get_schema_version, migrate
+from services.retention import RetentionEngine
+from services.maintenance import MaintenanceService
+from services.backup import BackupService
+from services.cache import TaggedCache
+from services.replication import ReplicationService
+from services.rows import Record, User, UserContext, RECORD_COLUMNS, USER_COLUMNS
+from services.locations import ACTION_CODES, ACTION_NAME_SQL, get_location_id
+from services import absences, rollups
 
 # Проверяем наличие необходимых библиотек
 try:
-    import pandas as pd
     import openpyxl
     EXPORT_AVAILABLE = True
 except ImportError as e:
     logging.error(f"❌ Ошибка импорта библиотек для экспорта: {e}")
-    logging.error("Установите зависимости: pip install pandas openpyxl")
+    logging.error("Установите зависимости: pip install openpyxl")
     EXPORT_AVAILABLE = False
-    pd = None
+
+# Повтор той же отметки в пределах окна считается двойным нажатием
+DUPLICATE_WINDOW_SECONDS = 3
+
+# Сколько записей читается за один запрос в iter_records
+RECORDS_CHUNK_SIZE = 1000
+
+# Общее количество для пагинации приблизительное: пересчитывается не чаще раза в TTL
+COUNT_CACHE_TTL_SECONDS = 60
+
+
+def encode_cursor(direction: str, anchor_id: int) -> str:
+    """Курсор пагинации: 'n'/'p' (вперед/назад) + id опорной строки в base36"""
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    value, encoded = anchor_id, ""
+    while True:
+        value, rem = divmod(value, 36)
+        encoded = digits[rem] + encoded
+        if value == 0:
+            break
+    return direction + encoded
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """Разобрать курсор; для пустого или поврежденного курсора - None (первая страница)"""
+    if not cursor or cursor[0] not in ('n', 'p'):
+        return None
+    try:
+        return cursor[0], int(cursor[1:], 36)
+    except ValueError:
+        return None
 
 class DatabaseService:
-    def __init__(self, db_path: str = "military_tracker.db"):
+    def __init__(self, db_path: str = "military_tracker.db", readers: int = DEFAULT_READERS,
+                 readonly: bool = False):
         self.db_path = db_path
+        # readonly - реплика (services/replication.py): схема не мигрируется, запись недоступна
+        self.readonly = readonly
+        self.connections = ConnectionManager(db_path, readers=readers, readonly=readonly)
+        # Отметки и регистрации идут через очередь с групповой фиксацией
+        self.write_queue = WriteQueue(self.connections)
+        self._count_cache = {}
+        # Пользователи, админы и текущий статус читаются почти в каждом
+        # обработчике: кэш с TTL/LRU, методы записи сбрасывают его по тегам,
+        # а запись другими процессами замечается по PRAGMA data_version
+        self._data_version = None
+        self.cache = TaggedCache(check=self._external_write)
+        # Очистка старых записей пакетами с архивированием
+        self.retention = RetentionEngine(self)
+        # VACUUM, ANALYZE и checkpoint выполняются в фоне по расписанию
+        self.maintenance = MaintenanceService(self)
+        # Снимки через backup API и архив WAL (включается фоновой задачей)
+        self.backups = BackupService(self)
+        # Доставка WAL в реплику (enable_replication)
+        self.replication = None
         self.init_db()
 
-    def init_db(self):
-        """Инициализация базы данных"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY,
-                        username TEXT NOT NULL,
-                        full_name TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_admin BOOLEAN DEFAULT FALSE
-                    )
-                ''')
+    def close(self):
+        """Закрыть все соединения с базой данных"""
+        self.write_queue.close()
+        if self.replication is not None:
+            # Хвост журнала захватывается и доставляется в реплику
+            try:
+                self.replication.run_once()
+            except Exception as e:
+                logging.error(f"Ошибка репликации при закрытии: {e}")
+        elif self.backups.wal.enabled:
+            # Последнее соединение удалит WAL - хвост журнала нужен архиву
+            try:
+                self.backups.wal.capture()
+            except Exception as e:
+                logging.error(f"Ошибка захвата WAL при закрытии: {e}")
+        self.connections.close()
+
+    def _external_write(self) -> bool:
+        """Зафиксировал ли базу кто-то кроме этого сервиса с прошлой проверки"""
+        if self.connections.shared_memory:
+            return False
+        try:
+            version = self.connections.data_version()
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка чтения data_version: {e}")
+            return False
+        if version is None:
+            return False
+        changed = self._data_version is not None and version != self._data_version
+        self._data_version = version
+        return changed
 
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS records (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        action TEXT NOT NULL,
-                        location TEXT NOT NULL,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                ''')
+    def _submit_write(self, func, args: tuple, error_message: str, tags: tuple = ()) -> Future:
+        """Поставить операцию в очередь записи; ошибка превращается в результат False.
 
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS admins (
-                        user_id INTEGER PRIMARY KEY,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                ''')
+        tags - теги кэша, которые сбрасываются после фиксации транзакции
+        """
+        result = Future()
 
-                # Создаем индексы для улучшения производительности
-                conn.execute('CREATE INDEX IF NOT EXISTS idx_records_user_id ON records (user_id)')
-                conn.execute('CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records (timestamp)')
+        def on_done(future: Future):
+            if tags:
+                self.cache.invalidate(*tags)
+            try:
+                result.set_result(future.result())
+            except Exception as e:
+                logging.error(f"{error_message}: {e}")
+                result.set_result(False)
 
-                # Миграция: добавляем отсутствующую колонку added_at если её нет
-                try:
-                    conn.execute('ALTER TABLE admins ADD COLUMN added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
-                    pass  # Колонка успешно добавлена
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" not in str(e).lower():
-                        logging.warning(f"⚠️ Ошибка добавления колонки added_at: {e}")
+        try:
+            self.write_queue.submit(func, *args).add_done_callback(on_done)
+        except Exception as e:
+            logging.error(f"{error_message}: {e}")
+            result.set_result(False)
+        return result
 
-                # Ensure main admin is added
-                self.ensure_main_admin(conn)
+    @staticmethod
+    def _completed(value) -> Future:
+        future = Future()
+        future.set_result(value)
+        return future
 
-                conn.commit()
+    def init_db(self):
+        """Инициализация базы данных и применение миграций схемы.
+
+        Если версия схемы уже актуальна, DDL не выполняется и блокировка
+        записи не берется - достаточно одного чтения PRAGMA user_version.
+        """
+        try:
+            with self.connections.reader() as conn:
+                version = get_schema_version(conn)
+                up_to_date = version == SCHEMA_VERSION
+
+            if self.readonly:
+                if not up_to_date:
+                    logging.warning(f"⚠️ Версия схемы реплики {version}, ожидается {SCHEMA_VERSION}")
+                return
+
+            if not up_to_date:
+                with self.connections.writer() as conn:
+                    # Новая или старая (до миграций) база - сначала базовая схема,
+                    # дальше схему меняют только миграции из services/migrations.py
+                    if get_schema_version(conn) == 0:
+                        self._create_base_schema(conn)
+                    migrate(conn)
+
+            self.ensure_main_admin()
         except Exception as e:
             logging.error(f"Ошибка инициализации БД: {e}")
 
-    def ensure_main_admin(self, conn: sqlite3.Connection):
+    def _create_base_schema(self, conn: sqlite3.Connection):
+        """Базовая схема (версия 0) - в том виде, в котором ее создавали ранние версии"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_admin BOOLEAN DEFAULT FALSE
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                location TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Текущий статус каждого пользователя - последняя запись из records.
+        # Обновляется в той же транзакции, что и add_record
+        user_status_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_status'"
+        ).fetchone()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_status (
+                user_id INTEGER PRIMARY KEY,
+                action TEXT NOT NULL,
+                location TEXT NOT NULL,
+                since TIMESTAMP NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS admins (
+                user_id INTEGER PRIMARY KEY,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Создаем индексы для улучшения производительности
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_records_user_id ON records (user_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records (timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_records_user_timestamp ON records (user_id, timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_users_full_name ON users (full_name)')
+
+        # Существующая база без user_status - заполняем по истории
+        # (в базовой схеме action и location - текст прямо в records)
+        if not user_status_exists:
+            self._rebuild_user_status(conn, source='records')
+
+    def ensure_main_admin(self):
         """Гарантирует, что главный админ добавлен в таблицу"""
         try:
             from config import MAIN_ADMIN_ID
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, CURRENT_TIMESTAMP)',
-                (MAIN_ADMIN_ID,)
-            )
-            pass  # Главный админ добавлен
+            with self.connections.reader() as conn:
+                if conn.execute('SELECT 1 FROM admins WHERE user_id = ?', (MAIN_ADMIN_ID,)).fetchone():
+                    return
+            with self.connections.writer() as conn:
+                conn.execute(
+                    'INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, CURRENT_TIMESTAMP)',
+                    (MAIN_ADMIN_ID,)
+                )
+            self.cache.invalidate('admins')
         except ImportError:
             logging.warning("⚠️ config.py не найден, главный админ не добавлен")
         except Exception as e:
@@ -89,154 +251,359 @@ class DatabaseService:
 
     def add_user(self, user_id: int, username: str, full_name: str) -> bool:
         """Добавить пользователя"""
-        try:
-            # Валидация входных данных
-            if not isinstance(user_id, int) or user_id <= 0:
-                logging.error(f"Некорректный user_id: {user_id}")
-                return False
-
-            if not username or len(username.strip()) == 0:
-                logging.error("Пустое имя пользователя")
-                return False
-
-            if not full_name or len(full_name.strip()) < 3 or len(full_name.strip()) > 50:
-                logging.error(f"Некорректное ФИО: {full_name}")
-                return False
-
-            username = username.strip()[:50]  # Ограничиваем длину
-            full_name = full_name.strip()
-
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    'INSERT OR REPLACE INTO users (id, username, full_name) VALUES (?, ?, ?)',
-                    (user_id, username, full_name)
-                )
-                conn.commit()
-                return True
-        except Exception as e:
-            logging.error(f"Ошибка добавления пользователя: {e}")
-            return False
+        return self.submit_user(user_id, username, full_name).result()
+
+    def submit_user(self, user_id: int, username: str, full_name: str) -> Future:
+        """Поставить добавление пользователя в очередь записи (Future с результатом add_user)"""
+        # Валидация входных данных
+        if not isinstance(user_id, int) or user_id <= 0:
+            logging.error(f"Некорректный user_id: {user_id}")
+            return self._completed(False)
+
+        if not username or len(username.strip()) == 0:
+            logging.error("Пустое имя пользователя")
+            return self._completed(False)
+
+        if not full_name or len(full_name.strip()) < 3 or len(full_name.strip()) > 50:
+            logging.error(f"Некорректное ФИО: {full_name}")
+            return self._completed(False)
+
+        username = username.strip()[:50]  # Ограничиваем длину
+        full_name = full_name.strip()
+
+        return self._submit_write(
+            self._add_user_tx, (user_id, username, full_name), "Ошибка добавления пользователя",
+            tags=('users', f'user:{user_id}')
+        )
+
+    def _add_user_tx(self, conn: sqlite3.Connection, user_id: int, username: str, full_name: str) -> bool:
+        # UPSERT, а не INSERT OR REPLACE: REPLACE удаляет строку без триггеров
+        # удаления (индекс поиска разошелся бы с таблицей) и сбрасывает created_at
+        conn.execute(
+            'INSERT INTO users (id, username, full_name) VALUES (?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET username = excluded.username, full_name = excluded.full_name',
+            (user_id, username, full_name)
+        )
+        return True
 
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Получить пользователя"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+        """Получить пользователя (кэш, тег user:<id>)"""
+        def load():
+            with self.connections.reader() as conn:
                 cursor = conn.execute(
                     'SELECT * FROM users WHERE id = ?',
                     (user_id,)
                 )
                 row = cursor.fetchone()
                 return dict(row) if row else None
+
+        try:
+            return self.cache.get_or_load(('user', user_id), load, tags=(f'user:{user_id}',))
         except Exception as e:
             logging.error(f"Ошибка получения пользователя: {e}")
             return None
 
-    def add_record(self, user_id: int, action: str, location: str) -> bool:
-        """Добавить запись"""
-        try:
-            # Валидация входных данных
-            if not isinstance(user_id, int) or user_id <= 0:
-                logging.error(f"Некорректный user_id: {user_id}")
-                return False
-
-            if not action or action.strip() not in ['в части', 'не в части']:
-                logging.error(f"Некорректное действие: {action}")
-                return False
-
-            if not location or len(location.strip()) < 1 or len(location.strip()) > 100:
-                logging.error(f"Некорректная локация: {location}")
-                return False
-
-            # Проверяем, существует ли пользователь
-            if not self.get_user(user_id):
-                logging.error(f"Пользователь {user_id} не найден")
-                return False
-
-            action = action.strip()
-            location = location.strip()
-
-            # Мягкая защита от дублирования записей
-            last_records = self.get_user_records(user_id, 1)
-            if last_records:
-                last_record = last_records[0]  # Первая запись (самая новая)
-                last_action = last_record['action']
-                last_timestamp = datetime.fromisoformat(last_record['timestamp'].replace('Z', '+00:00'))
+    def get_user_context(self, user_id: int) -> UserContext:
+        """Профиль, права админа и текущий статус одним запросом
+        (кэш, теги user:<id>, admins и records)"""
+        def load():
+            with self.connections.reader() as conn:
+                row = conn.execute('''
+                    SELECT u.id, u.username, u.full_name, u.created_at, u.is_admin,
+                           adm.user_id IS NOT NULL AS admin, s.action, s.location, s.since
+                    FROM (SELECT ? AS id) q
+                    LEFT JOIN users u ON u.id = q.id
+                    LEFT JOIN admins adm ON adm.user_id = q.id
+                    LEFT JOIN user_status s ON s.user_id = q.id
+                ''', (user_id,)).fetchone()
+            user = None
+            if row['id'] is not None:
+                user = {key: row[key] for key in ('id', 'username', 'full_name', 'created_at', 'is_admin')}
+            return UserContext(user_id, user, bool(row['admin']), row['action'], row['location'], row['since'])
 
-                # Проверяем, было ли такое же действие в последние 3 секунды (уменьшили время)
-                time_diff = (datetime.now() - last_timestamp.replace(tzinfo=None)).total_seconds()
-
-                # Блокируем только явные дубли в течение 3 секунд
-                if last_action == action and last_record['location'] == location and time_diff < 3:
-                    logging.warning(f"Быстрое дублирование записи заблокировано для пользователя {user_id} (разница: {time_diff:.1f}с)")
-                    return False
-
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    'INSERT INTO records (user_id, action, location) VALUES (?, ?, ?)',
-                    (user_id, action, location)
-                )
-                conn.commit()
-                return True
+        try:
+            return self.cache.get_or_load(
+                ('user_context', user_id), load, tags=(f'user:{user_id}', 'admins', 'records')
+            )
         except Exception as e:
-            logging.error(f"Ошибка добавления записи: {e}")
+            logging.error(f"Ошибка получения контекста пользователя: {e}")
+            return UserContext(user_id, None, False)
+
+    def add_record(self, user_id: int, action: str, location: str) -> Union[Dict[str, Any], bool]:
+        """Добавить запись
+
+        Возвращает созданную запись (с full_name и предыдущим статусом
+        previous_action/previous_location) или False, если запись не добавлена.
+        """
+        return self.submit_record(user_id, action, location).result()
+
+    def submit_record(self, user_id: int, action: str, location: str) -> Future:
+        """Поставить запись в очередь записи (Future с результатом add_record)"""
+        # Валидация входных данных
+        if not isinstance(user_id, int) or user_id <= 0:
+            logging.error(f"Некорректный user_id: {user_id}")
+            return self._completed(False)
+
+        if not action or action.strip() not in ['в части', 'не в части']:
+            logging.error(f"Некорректное действие: {action}")
+            return self._completed(False)
+
+        if not location or len(location.strip()) < 1 or len(location.strip()) > 100:
+            logging.error(f"Некорректная локация: {location}")
+            return self._completed(False)
+
+        return self._submit_write(
+            self._add_record_tx, (user_id, action.strip(), location.strip()), "Ошибка добавления записи",
+            tags=('status', f'user:{user_id}')
+        )
+
+    def _add_record_tx(self, conn: sqlite3.Connection, user_id: int, action: str,
+                       location: str) -> Union[Dict[str, Any], bool]:
+        # Проверка пользователя, защита от дублей и вставка выполняются
+        # в одной транзакции писателя, поэтому двойное нажатие не проходит
+        current = conn.execute('''
+            SELECT u.full_name, s.action, s.location,
+                   (julianday('now') - 2440587.5) * 86400 - s.since AS seconds_since
+            FROM users u
+            LEFT JOIN user_status s ON s.user_id = u.id
+            WHERE u.id = ?
+        ''', (user_id,)).fetchone()
+
+        if not current:
+            logging.error(f"Пользователь {user_id} не найден")
+            return False
+
+        # Блокируем только явные дубли в течение DUPLICATE_WINDOW_SECONDS
+        if (current['action'] == action and current['location'] == location
+                and current['seconds_since'] < DUPLICATE_WINDOW_SECONDS):
+            logging.warning(f"Быстрое дублирование записи заблокировано для пользователя {user_id} (разница: {current['seconds_since']:.1f}с)")
             return False
 
-    def get_user_records(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Получить записи пользователя"""
+        location_id = get_location_id(conn, location)
+        cursor = conn.execute(
+            'INSERT INTO records (user_id, action, location_id) VALUES (?, ?, ?)',
+            (user_id, ACTION_CODES[action], location_id)
+        )
+        record = dict(conn.execute(
+            'SELECT id, user_id, action, location, timestamp, day FROM records_named WHERE id = ?',
+            (cursor.lastrowid,)
+        ).fetchone())
+        conn.execute(
+            'INSERT OR REPLACE INTO user_status (user_id, action, location, since) VALUES (?, ?, ?, ?)',
+            (user_id, action, location, record['timestamp'])
+        )
+        absences.apply_record(conn, user_id, ACTION_CODES[action], location_id, record['timestamp'])
+        rollups.apply_record(conn, user_id, ACTION_CODES[action], location_id, record['timestamp'], record['day'])
+
+        record['full_name'] = current['full_name']
+        record['previous_action'] = current['action']
+        record['previous_location'] = current['location']
+        return record
+
+    @staticmethod
+    def _fetch_rows(conn: sqlite3.Connection, row_type, query: str, params=()) -> list:
+        """Выполнить запрос и вернуть строки типа row_type (Record, User)"""
+        cursor = conn.cursor()
+        cursor.row_factory = row_type.from_row
+        return cursor.execute(query, params).fetchall()
+
+    def get_user_records(self, user_id: int, limit: int = 10) -> List[Record]:
+        """Получить записи пользователя (кэш, теги user:<id> и records)"""
+        def load():
+            with self.connections.reader() as conn:
+                return self._fetch_rows(conn, Record, f'''
+                    SELECT {RECORD_COLUMNS}
+                    FROM records_named r
+                    LEFT JOIN users u ON r.user_id = u.id
+                    WHERE r.user_id = ?
+                    ORDER BY r.timestamp DESC, r.id DESC
+                    LIMIT ?
+                ''', (user_id, limit))
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute(
-                    'SELECT * FROM records WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
-                    (user_id, limit)
-                )
-                return [dict(row) for row in cursor.fetchall()]
+            return self.cache.get_or_load(
+                ('user_records', user_id, limit), load, tags=(f'user:{user_id}', 'records')
+            )
         except Exception as e:
             logging.error(f"Ошибка получения записей пользователя: {e}")
             return []
 
-    def get_all_records(self, days: int = 7, limit: int = 100) -> List[Dict[str, Any]]:
-        """Получить все записи за период"""
+    def get_all_records(self, days: int = 7, limit: int = 100) -> List[Record]:
+        """Получить все записи за период (последние limit). Для всего периода - iter_records"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                since_date = datetime.now() - timedelta(days=days)
-                cursor = conn.execute('''
-                    SELECT r.*, u.full_name 
-                    FROM records r
+            with self.connections.reader() as conn:
+                since = int(time.time()) - days * 86400
+                return self._fetch_rows(conn, Record, f'''
+                    SELECT {RECORD_COLUMNS}
+                    FROM records_named r
                     JOIN users u ON r.user_id = u.id
                     WHERE r.timestamp > ?
-                    ORDER BY r.timestamp DESC
+                    ORDER BY r.timestamp DESC, r.id DESC
                     LIMIT ?
-                ''', (since_date, limit))
-                return [dict(row) for row in cursor.fetchall()]
+                ''', (since, limit))
         except Exception as e:
             logging.error(f"Ошибка получения всех записей: {e}")
             return []
 
-    def get_records_paginated(self, page: int = 1, per_page: int = 10, days: int = 7, 
-                            user_filter: str = None, location_filter: str = None) -> Dict[str, Any]:
-        """Получить записи с пагинацией и фильтрами"""
+    def count_records(self, days: int = 7) -> int:
+        """Количество записей за период"""
+        try:
+            with self.connections.reader() as conn:
+                since = int(time.time()) - days * 86400
+                return conn.execute('SELECT COUNT(*) FROM records WHERE timestamp > ?', (since,)).fetchone()[0]
+        except Exception as e:
+            logging.error(f"Ошибка подсчета записей: {e}")
+            return 0
+
+    def get_top_locations(self, days: int = 30, limit: Optional[int] = 10) -> List[tuple]:
+        """Самые частые локации убытия за период: [(локация, количество), ...].
+
+        limit=None - все локации.
+        """
+        try:
+            with self.connections.reader() as conn:
+                since = int(time.time()) - days * 86400
+                # Группировка по целому location_id, названия - только для итоговых строк
+                rows = conn.execute('''
+                    SELECT l.name, t.count
+                    FROM (
+                        SELECT location_id, COUNT(*) AS count
+                        FROM records
+                        WHERE timestamp > ? AND action = ?
+                        GROUP BY location_id
+                        ORDER BY count DESC
+                        LIMIT ?
+                    ) t
+                    JOIN locations l ON l.id = t.location_id
+                    ORDER BY t.count DESC, l.name
+                ''', (since, ACTION_CODES['не в части'], -1 if limit is None else limit)).fetchall()
+                return [(row['name'], row['count']) for row in rows]
+        except Exception as e:
+            logging.error(f"Ошибка статистики по локациям: {e}")
+            return []
+
+    def get_records_chunk(self, since: int, after: Optional[tuple] = None,
+                          limit: int = RECORDS_CHUNK_SIZE) -> List[Record]:
+        """Очередная порция записей после since в хронологическом порядке.
+
+        after - (timestamp, id) последней записи предыдущей порции.
+        """
+        # Для следующих порций условие только по (timestamp, id): с отдельным
+        # timestamp > since SQLite начинал бы обход индекса с since каждый раз
+        if after:
+            condition, params = '(r.timestamp, r.id) > (?, ?)', (after[0], after[1], limit)
+        else:
+            condition, params = 'r.timestamp > ?', (since, limit)
+        with self.connections.reader() as conn:
+            return self._fetch_rows(conn, Record, f'''
+                SELECT {RECORD_COLUMNS}
+                FROM records_named r
+                JOIN users u ON r.user_id = u.id
+                WHERE {condition}
+                ORDER BY r.timestamp, r.id
+                LIMIT ?
+            ''', params)
+
+    def iter_records(self, days: int = 30, chunk_size: int = RECORDS_CHUNK_SIZE) -> Iterator[Record]:
+        """Все записи за период от старых к новым, порциями по chunk_size.
+
+        В памяти одновременно только одна порция, соединение между порциями
+        возвращается в пул.
+        """
+        since = int(time.time()) - days * 86400
+        after = None
+        while True:
+            chunk = self.get_records_chunk(since, after, chunk_size)
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            after = (chunk[-1].timestamp, chunk[-1].id)
+
+    def _cached_count(self, conn: sqlite3.Connection, query: str, params: list) -> int:
+        """COUNT(*) с кэшированием на COUNT_CACHE_TTL_SECONDS"""
+        key = (query, tuple(params))
+        cached = self._count_cache.get(key)
+        now = time.monotonic()
+        if cached and cached[1] > now:
+            return cached[0]
+
+        total = conn.execute(query, params).fetchone()[0]
+        if len(self._count_cache) > 256:
+            self._count_cache.clear()
+        self._count_cache[key] = (total, now + COUNT_CACHE_TTL_SECONDS)
+        return total
+
+    def invalidate_count_cache(self):
+        """Сбросить кэш количества (после массового удаления)"""
+        self._count_cache.clear()
+
+    def _keyset_page(self, conn: sqlite3.Connection, query: str, params: list, key: str,
+                     anchor_query: str, cursor: Optional[str], per_page: int,
+                     id_column: str = 'id') -> Dict[str, Any]:
+        """Страница по ключу (key, id): без OFFSET, стоимость не зависит от глубины
+
+        query - SELECT с условием WHERE и без ORDER BY; anchor_query возвращает
+        (key, id) опорной строки по ее id. Первая колонка key упорядочена по
+        убыванию, если key начинается с '-'.
+        """
+        descending = key.startswith('-')
+        key = key.lstrip('-')
+        decoded = decode_cursor(cursor)
+        backward = decoded is not None and decoded[0] == 'p'
+
+        # Для "назад" идем в обратном порядке и затем разворачиваем страницу
+        forward_desc = descending != backward
+        order = 'DESC' if forward_desc else 'ASC'
+        sql = query
+        page_params = list(params)
+        if decoded:
+            sql += f' AND ({key}, {id_column}) {"<" if forward_desc else ">"} ({anchor_query})'
+            page_params.append(decoded[1])
+        sql += f' ORDER BY {key} {order}, {id_column} {order} LIMIT ?'
+        page_params.append(per_page + 1)
+
+        rows = [dict(row) for row in conn.execute(sql, page_params).fetchall()]
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backward:
+            rows.reverse()
+
+        has_next = has_more if not backward else decoded is not None
+        has_prev = has_more if backward else decoded is not None
+        return {
+            'rows': rows,
+            'has_next': bool(rows) and has_next,
+            'has_prev': bool(rows) and has_prev,
+            'next_cursor': encode_cursor('n', rows[-1]['id']) if rows and has_next else None,
+            'prev_cursor': encode_cursor('p', rows[0]['id']) if rows and has_prev else None
+        }
+
+    def get_records_paginated(self, cursor: str = None, per_page: int = 10, days: int = 7,
+                              user_filter: str = None, location_filter: str = None) -> Dict[str, Any]:
+        """Получить записи с пагинацией по курсору и фильтрами
+
+        cursor - значение next_cursor/prev_cursor предыдущей страницы (None - первая страница).
+        Курсоры короткие и помещаются в callback_data Telegram.
+        """
         try:
-            offset = (page - 1) * per_page
-            since_date = datetime.now() - timedelta(days=days)
+            # Граница периода с точностью до минуты, чтобы кэш количества срабатывал
+            since = int(time.time()) // 60 * 60 - days * 86400
 
             # Базовый запрос
-            base_query = '''
-                SELECT r.*, u.full_name 
-                FROM records r
+            base_query = f'''
+                SELECT {RECORD_COLUMNS}
+                FROM records_named r
                 JOIN users u ON r.user_id = u.id
                 WHERE r.timestamp > ?
             '''
             count_query = '''
                 SELECT COUNT(*) as total
-                FROM records r
+                FROM records_named r
                 JOIN users u ON r.user_id = u.id
                 WHERE r.timestamp > ?
             '''
 
-            params = [since_date]
+            params = [since]
 
             # Добавляем фильтры
             if user_filter:
@@ -249,35 +616,31 @@ class DatabaseService:
                 count_query += ' AND r.location LIKE ?'
                 params.append(f'%{location_filter}%')
 
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-
-                # Получаем общее количество
-                total_cursor = conn.execute(count_query, params)
-                total_records = total_cursor.fetchone()['total']
-
-                # Получаем записи для текущей страницы
-                base_query += ' ORDER BY r.timestamp DESC LIMIT ? OFFSET ?'
-                cursor = conn.execute(base_query, params + [per_page, offset])
-                records = [dict(row) for row in cursor.fetchall()]
-
-                total_pages = (total_records + per_page - 1) // per_page
+            with self.connections.reader() as conn:
+                page = self._keyset_page(
+                    conn, base_query, params, '-r.timestamp',
+                    'SELECT timestamp, id FROM records WHERE id = ?', cursor, per_page,
+                    id_column='r.id'
+                )
+                total_records = self._cached_count(conn, count_query, params)
 
-                return {
-                    'records': records,
-                    'current_page': page,
-                    'total_pages': total_pages,
-                    'total_records': total_records,
-                    'per_page': per_page,
-                    'has_prev': page > 1,
-                    'has_next': page < total_pages
-                }
+            return {
+                'records': page['rows'],
+                'next_cursor': page['next_cursor'],
+                'prev_cursor': page['prev_cursor'],
+                'total_pages': (total_records + per_page - 1) // per_page,
+                'total_records': total_records,
+                'per_page': per_page,
+                'has_prev': page['has_prev'],
+                'has_next': page['has_next']
+            }
 
         except Exception as e:
             logging.error(f"Ошибка получения записей с пагинацией: {e}")
             return {
                 'records': [],
-                'current_page': 1,
+                'next_cursor': None,
+                'prev_cursor': None,
                 'total_pages': 0,
                 'total_records': 0,
                 'per_page': per_page,
@@ -285,49 +648,42 @@ class DatabaseService:
                 'has_next': False
             }
 
-    def get_users_paginated(self, page: int = 1, per_page: int = 20, search: str = None) -> Dict[str, Any]:
-        """Получить пользователей с пагинацией"""
+    def get_users_paginated(self, cursor: str = None, per_page: int = 20, search: str = None) -> Dict[str, Any]:
+        """Получить пользователей с пагинацией по курсору (сортировка по ФИО)"""
         try:
-            offset = (page - 1) * per_page
-
-            base_query = 'SELECT * FROM users'
+            base_query = 'SELECT * FROM users WHERE 1 = 1'
             count_query = 'SELECT COUNT(*) as total FROM users'
             params = []
 
             if search:
-                base_query += ' WHERE full_name LIKE ? OR username LIKE ?'
+                base_query += ' AND (full_name LIKE ? OR username LIKE ?)'
                 count_query += ' WHERE full_name LIKE ? OR username LIKE ?'
                 params = [f'%{search}%', f'%{search}%']
 
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-
-                # Получаем общее количество
-                total_cursor = conn.execute(count_query, params)
-                total_users = total_cursor.fetchone()['total']
-
-                # Получаем пользователей для текущей страницы
-                base_query += ' ORDER BY full_name LIMIT ? OFFSET ?'
-                cursor = conn.execute(base_query, params + [per_page, offset])
-                users = [dict(row) for row in cursor.fetchall()]
-
-                total_pages = (total_users + per_page - 1) // per_page
+            with self.connections.reader() as conn:
+                page = self._keyset_page(
+                    conn, base_query, params, 'full_name',
+                    'SELECT full_name, id FROM users WHERE id = ?', cursor, per_page
+                )
+                total_users = self._cached_count(conn, count_query, params)
 
-                return {
-                    'users': users,
-                    'current_page': page,
-                    'total_pages': total_pages,
-                    'total_users': total_users,
-                    'per_page': per_page,
-                    'has_prev': page > 1,
-                    'has_next': page < total_pages
-                }
+            return {
+                'users': page['rows'],
+                'next_cursor': page['next_cursor'],
+                'prev_cursor': page['prev_cursor'],
+                'total_pages': (total_users + per_page - 1) // per_page,
+                'total_users': total_users,
+                'per_page': per_page,
+                'has_prev': page['has_prev'],
+                'has_next': page['has_next']
+            }
 
         except Exception as e:
             logging.error(f"Ошибка получения пользователей с пагинацией: {e}")
             return {
                 'users': [],
-                'current_page': 1,
+                'next_cursor': None,
+                'prev_cursor': None,
                 'total_pages': 0,
                 'total_users': 0,
                 'per_page': per_page,
@@ -335,80 +691,318 @@ class DatabaseService:
                 'has_next': False
             }
 
+    @staticmethod
+    def _status_summary(rows) -> Dict[str, Any]:
+        """Сводка по строкам (full_name, action, location) с группировкой по локациям"""
+        absent_users = []
+        present_users = []
+
+        # Группировка по локациям
+        location_groups = {}
+
+        for row in rows:
+            # Проверяем статус: "не в части" = отсутствует, "в части" = присутствует
+            if row['action'] == 'не в части':
+                location = row['location']
+                absent_users.append({
+                    'name': row['full_name'],
+                    'location': location
+                })
+
+                # Группируем отсутствующих по локациям
+                if location not in location_groups:
+                    location_groups[location] = {'count': 0, 'names': []}
+                location_groups[location]['count'] += 1
+                location_groups[location]['names'].append(row['full_name'])
+
+            else:
+                # Если последнее действие "в части" или записей нет - считаем в части
+                present_users.append({
+                    'name': row['full_name'],
+                    'location': 'В части'
+                })
+
+                # Группируем присутствующих
+                if 'В части' not in location_groups:
+                    location_groups['В части'] = {'count': 0, 'names': []}
+                location_groups['В части']['count'] += 1
+                location_groups['В части']['names'].append(row['full_name'])
+
+        return {
+            'total': len(rows),
+            'present': len(present_users),
+            'absent': len(absent_users),
+            'absent_list': absent_users,
+            'present_list': present_users,
+            'location_groups': location_groups
+        }
+
     def get_current_status(self) -> Dict[str, Any]:
-        """Получить текущий статус всех пользователей с группировкой по локациям"""
+        """Получить текущий статус всех пользователей с группировкой по локациям
+        (кэш, теги status и users)"""
+        def load():
+            with self.connections.reader() as conn:
+                # Текущие статусы хранятся в user_status, история не читается
+                rows = conn.execute('''
+                    SELECT u.full_name, s.action, s.location
+                    FROM users u
+                    LEFT JOIN user_status s ON s.user_id = u.id
+                    ORDER BY u.id
+                ''').fetchall()
+                return self._status_summary(rows)
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            return self.cache.get_or_load('current_status', load, tags=('status', 'users'))
+        except Exception as e:
+            logging.error(f"Ошибка получения статуса: {e}")
+            return {'total': 0, 'present': 0, 'absent': 0, 'absent_list': []}
 
-                # Получаем всех пользователей
-                users_cursor = conn.execute('SELECT id, full_name FROM users')
-                all_users = users_cursor.fetchall()
+    def get_status_at(self, ts: int) -> Dict[str, Any]:
+        """Статус всех пользователей на момент ts (секунды Unix) - в том же виде,
+        что и get_current_status.
+
+        Для каждого бойца берется последняя запись не позже ts: один поиск по
+        покрывающему индексу (user_id, timestamp) на бойца, поэтому время не
+        зависит от глубины истории. Бойцы, зарегистрированные позже ts, не
+        учитываются, если у них нет записей до ts. history_from - самая ранняя запись в базе: если ts раньше,
+        часть истории уже ушла в архив и картина неполная.
+        """
+        ts = int(ts)
+        try:
+            with self.connections.reader() as conn:
+                # Таблицы напрямую, а не records_named: представление справа
+                # в LEFT JOIN материализуется целиком
+                rows = conn.execute(f'''
+                    SELECT u.full_name, {ACTION_NAME_SQL.format('r.action')} AS action, l.name AS location
+                    FROM users u
+                    LEFT JOIN records r ON r.id = (
+                        SELECT id FROM records
+                        WHERE user_id = u.id AND timestamp <= ?1
+                        ORDER BY timestamp DESC, id DESC
+                        LIMIT 1
+                    )
+                    LEFT JOIN locations l ON l.id = r.location_id
+                    WHERE r.id IS NOT NULL OR u.created_at IS NULL
+                       OR u.created_at <= datetime(?1, 'unixepoch')
+                    ORDER BY u.id
+                ''', (ts,)).fetchall()
+                history_from = conn.execute('SELECT MIN(timestamp) FROM records').fetchone()[0]
+
+            status = self._status_summary(rows)
+            status['at'] = ts
+            status['history_from'] = history_from
+            return status
+        except Exception as e:
+            logging.error(f"Ошибка получения статуса на момент {ts}: {e}")
+            return {'total': 0, 'present': 0, 'absent': 0, 'absent_list': [], 'at': ts}
+
+    def _rebuild_user_status(self, conn: sqlite3.Connection, source: str = 'records_named') -> int:
+        """Пересчитать user_status по истории записей (внутри транзакции писателя)"""
+        conn.execute('DELETE FROM user_status')
+        cursor = conn.execute(f'''
+            INSERT INTO user_status (user_id, action, location, since)
+            SELECT r.user_id, r.action, r.location, r.timestamp
+            FROM users u
+            JOIN {source} r ON r.id = (
+                SELECT id FROM records
+                WHERE user_id = u.id
+                ORDER BY timestamp DESC, id DESC
+                LIMIT 1
+            )
+        ''')
+        return cursor.rowcount
 
-                # Получаем последние действия каждого пользователя
-                absent_users = []
-                present_users = []
+    def rebuild_user_status(self) -> int:
+        """Пересчитать таблицу текущих статусов по истории записей"""
+        try:
+            with self.connections.writer() as conn:
+                count = self._rebuild_user_status(conn)
+            self.cache.clear()
+            logging.info(f"Таблица user_status пересчитана: {count} пользователей")
+            return count
+        except Exception as e:
+            logging.error(f"Ошибка пересчета user_status: {e}")
+            return 0
 
-                # Группировка по локациям
-                location_groups = {}
+    def rebuild_absences(self) -> int:
+        """Пересобрать интервалы отсутствия по истории записей"""
+        try:
+            with self.connections.writer() as conn:
+                count = absences.rebuild_absences(conn)
+                logging.info(f"Интервалы отсутствия пересобраны: {count}")
+                return count
+        except Exception as e:
+            logging.error(f"Ошибка пересборки интервалов отсутствия: {e}")
+            return 0
 
-                for user in all_users:
-                    last_record_cursor = conn.execute('''
-                        SELECT action, location FROM records 
-                        WHERE user_id = ? 
-                        ORDER BY timestamp DESC 
-                        LIMIT 1
-                    ''', (user['id'],))
-                    last_record = last_record_cursor.fetchone()
-
-                    # Проверяем статус: "не в части" = отсутствует, "в части" = присутствует
-                    if last_record and last_record['action'] == 'не в части':
-                        location = last_record['location']
-                        absent_users.append({
-                            'name': user['full_name'],
-                            'location': location
-                        })
-
-                        # Группируем отсутствующих по локациям
-                        if location not in location_groups:
-                            location_groups[location] = {'count': 0, 'names': []}
-                        location_groups[location]['count'] += 1
-                        location_groups[location]['names'].append(user['full_name'])
+    def rebuild_rollups(self) -> Dict[str, int]:
+        """Пересобрать сводки по дням и часам по истории записей"""
+        try:
+            with self.connections.writer() as conn:
+                counts = rollups.rebuild_rollups(conn)
+                logging.info(f"Сводки пересобраны: {counts}")
+                return counts
+        except Exception as e:
+            logging.error(f"Ошибка пересборки сводок: {e}")
+            return {'daily': 0, 'hourly': 0}
+
+    @staticmethod
+    def _first_day(days: int) -> str:
+        """Первый местный день периода: days=1 - сегодня, days=7 - последние 7 дней"""
+        return (datetime.now() - timedelta(days=max(1, days) - 1)).strftime('%Y-%m-%d')
+
+    def get_period_stats(self, days: int = 7) -> Dict[str, Any]:
+        """Счетчики за последние days календарных дней (включая сегодня) по stats_daily.
+
+        {'total', 'departures', 'arrivals',
+         'users': [(ФИО, записей), ...] - все бойцы с записями, по убыванию,
+         'locations': [(локация, убытий), ...] - по убыванию}
+        """
+        stats = {'total': 0, 'departures': 0, 'arrivals': 0, 'users': [], 'locations': []}
+        try:
+            first_day = self._first_day(days)
+            with self.connections.reader() as conn:
+                for row in conn.execute('''
+                    SELECT action, SUM(count) AS count FROM stats_daily
+                    WHERE day >= ? GROUP BY action
+                ''', (first_day,)):
+                    key = 'departures' if row['action'] == ACTION_CODES['не в части'] else 'arrivals'
+                    stats[key] += row['count']
+                stats['total'] = stats['departures'] + stats['arrivals']
+
+                stats['users'] = [(row['full_name'], row['count']) for row in conn.execute('''
+                    SELECT u.full_name, t.count
+                    FROM (
+                        SELECT user_id, SUM(count) AS count FROM stats_daily
+                        WHERE day >= ? GROUP BY user_id
+                    ) t
+                    JOIN users u ON u.id = t.user_id
+                    ORDER BY t.count DESC, u.full_name
+                ''', (first_day,))]
+
+                stats['locations'] = [(row['name'], row['count']) for row in conn.execute('''
+                    SELECT l.name, t.count
+                    FROM (
+                        SELECT location_id, SUM(count) AS count FROM stats_daily
+                        WHERE day >= ? AND action = ? GROUP BY location_id
+                    ) t
+                    JOIN locations l ON l.id = t.location_id
+                    ORDER BY t.count DESC, l.name
+                ''', (first_day, ACTION_CODES['не в части']))]
+        except Exception as e:
+            logging.error(f"Ошибка чтения сводки за период: {e}")
+        return stats
 
-                    else:
-                        # Если последнее действие "в части" или записей нет - считаем в части
-                        present_users.append({
-                            'name': user['full_name'],
-                            'location': 'В части'
-                        })
-
-                        # Группируем присутствующих
-                        if 'В части' not in location_groups:
-                            location_groups['В части'] = {'count': 0, 'names': []}
-                        location_groups['В части']['count'] += 1
-                        location_groups['В части']['names'].append(user['full_name'])
-
-                return {
-                    'total': len(all_users),
-                    'present': len(present_users),
-                    'absent': len(absent_users),
-                    'absent_list': absent_users,
-                    'present_list': present_users,
-                    'location_groups': location_groups
-                }
+    def get_time_distribution(self, days: int = 30) -> Dict[str, Dict[int, int]]:
+        """Записи по часам и дням недели за период по stats_hourly.
+
+        {'hours': {час: записей}, 'weekdays': {0 (пн) .. 6 (вс): записей}}
+        """
+        result = {'hours': {}, 'weekdays': {}}
+        try:
+            with self.connections.reader() as conn:
+                rows = conn.execute('''
+                    SELECT day, hour, SUM(count) AS count FROM stats_hourly
+                    WHERE day >= ? GROUP BY day, hour
+                ''', (self._first_day(days),)).fetchall()
+            for row in rows:
+                weekday = datetime.strptime(row['day'], '%Y-%m-%d').weekday()
+                result['hours'][row['hour']] = result['hours'].get(row['hour'], 0) + row['count']
+                result['weekdays'][weekday] = result['weekdays'].get(weekday, 0) + row['count']
         except Exception as e:
-            logging.error(f"Ошибка получения статуса: {e}")
-            return {'total': 0, 'present': 0, 'absent': 0, 'absent_list': []}
+            logging.error(f"Ошибка чтения сводки по часам: {e}")
+        return result
 
-    def is_admin(self, user_id: int) -> bool:
-        """Проверить права администратора"""
+    def get_absence_totals(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Время вне части по бойцам за период (интервалы обрезаются границами периода).
+
+        [{'user_id', 'full_name', 'absences', 'departures', 'total_seconds', 'max_seconds'}, ...]
+        по убыванию total_seconds. absences - интервалы, пересекающие период,
+        departures - только начавшиеся в нем (убытия за период).
+        """
+        try:
+            now = int(time.time())
+            since = now - days * 86400
+            with self.connections.reader() as conn:
+                # Открытые интервалы длятся до текущего момента. UNION ALL вместо
+                # OR - оба условия идут по индексу, а не полным проходом
+                rows = conn.execute('''
+                    SELECT a.user_id, u.full_name, COUNT(*) AS absences,
+                           SUM(a.started_at >= ?2) AS departures,
+                           SUM(COALESCE(a.ended_at, ?1) - MAX(a.started_at, ?2)) AS total_seconds,
+                           MAX(COALESCE(a.ended_at, ?1) - MAX(a.started_at, ?2)) AS max_seconds
+                    FROM (
+                        SELECT user_id, started_at, ended_at FROM absences WHERE ended_at > ?2
+                        UNION ALL
+                        SELECT user_id, started_at, ended_at FROM absences WHERE ended_at IS NULL
+                    ) a
+                    JOIN users u ON u.id = a.user_id
+                    GROUP BY a.user_id
+                    ORDER BY total_seconds DESC
+                ''', (now, since)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            logging.error(f"Ошибка расчета времени отсутствия: {e}")
+            return []
+
+    def get_location_durations(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Завершенные за период отсутствия по локациям:
+        [{'location', 'absences', 'avg_seconds', 'max_seconds'}, ...]"""
+        try:
+            since = int(time.time()) - days * 86400
+            with self.connections.reader() as conn:
+                rows = conn.execute('''
+                    SELECT l.name AS location, t.absences, t.avg_seconds, t.max_seconds
+                    FROM (
+                        SELECT location_id, COUNT(*) AS absences,
+                               AVG(ended_at - started_at) AS avg_seconds,
+                               MAX(ended_at - started_at) AS max_seconds
+                        FROM absences
+                        WHERE ended_at > ?
+                        GROUP BY location_id
+                    ) t
+                    JOIN locations l ON l.id = t.location_id
+                    ORDER BY t.absences DESC
+                ''', (since,)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            logging.error(f"Ошибка расчета длительности по локациям: {e}")
+            return []
+
+    def get_long_absences(self, min_hours: float = 24) -> List[Dict[str, Any]]:
+        """Бойцы, которые сейчас вне части дольше min_hours:
+        [{'user_id', 'full_name', 'location', 'started_at', 'hours'}, ...]"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            now = int(time.time())
+            with self.connections.reader() as conn:
+                rows = conn.execute('''
+                    SELECT a.user_id, u.full_name, l.name AS location, a.started_at
+                    FROM absences a
+                    JOIN users u ON u.id = a.user_id
+                    JOIN locations l ON l.id = a.location_id
+                    WHERE a.ended_at IS NULL AND a.started_at <= ?
+                    ORDER BY a.started_at
+                ''', (now - int(min_hours * 3600),)).fetchall()
+            return [
+                {**dict(row), 'hours': (now - row['started_at']) / 3600}
+                for row in rows
+            ]
+        except Exception as e:
+            logging.error(f"Ошибка поиска длительных отсутствий: {e}")
+            return []
+
+    def is_admin(self, user_id: int) -> bool:
+        """Проверить права администратора (кэш, тег admins)"""
+        def load():
+            with self.connections.reader() as conn:
                 cursor = conn.execute(
                     'SELECT 1 FROM admins WHERE user_id = ?',
                     (user_id,)
                 )
                 return cursor.fetchone() is not None
+
+        try:
+            return self.cache.get_or_load(('is_admin', user_id), load, tags=('admins',))
         except Exception as e:
             logging.error(f"Ошибка проверки прав админа: {e}")
             return False
@@ -416,22 +1010,21 @@ class DatabaseService:
     def add_admin(self, user_id: int) -> bool:
         """Добавить администратора"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.writer() as conn:
                 conn.execute(
                     'INSERT OR IGNORE INTO admins (user_id) VALUES (?)',
                     (user_id,)
                 )
-                conn.commit()
-                return True
+            self.cache.invalidate('admins')
+            return True
         except Exception as e:
             logging.error(f"Ошибка добавления админа: {e}")
             return False
 
     def get_all_admins(self) -> List[Dict[str, Any]]:
-        """Получить всех админов"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+        """Получить всех админов (кэш, теги admins и users)"""
+        def load():
+            with self.connections.reader() as conn:
                 cursor = conn.execute('''
                     SELECT u.id, u.username, u.full_name, a.added_at
                     FROM admins a
@@ -439,392 +1032,269 @@ class DatabaseService:
                     ORDER BY u.full_name
                 ''')
                 return [dict(row) for row in cursor.fetchall()]
+
+        try:
+            return self.cache.get_or_load('all_admins', load, tags=('admins', 'users'))
         except Exception as e:
             logging.error(f"Ошибка получения админов: {e}")
             # Fallback запрос без added_at если колонки нет
             try:
-                cursor = conn.execute('''
-                    SELECT u.id, u.username, u.full_name
-                    FROM admins a
-                    JOIN users u ON a.user_id = u.id
-                    ORDER BY u.full_name
-                ''')
-                return [dict(row) for row in cursor.fetchall()]
+                with self.connections.reader() as conn:
+                    cursor = conn.execute('''
+                        SELECT u.id, u.username, u.full_name
+                        FROM admins a
+                        JOIN users u ON a.user_id = u.id
+                        ORDER BY u.full_name
+                    ''')
+                    return [dict(row) for row in cursor.fetchall()]
             except Exception as e2:
                 logging.error(f"Ошибка fallback запроса админов: {e2}")
                 return []
 
-    def get_all_users(self) -> List[Dict[str, Any]]:
-        """Получить всех пользователей"""
+    def get_all_users(self) -> List[User]:
+        """Получить всех пользователей (кэш, тег users)"""
+        def load():
+            with self.connections.reader() as conn:
+                return self._fetch_rows(conn, User, f'SELECT {USER_COLUMNS} FROM users ORDER BY full_name')
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute('SELECT * FROM users ORDER BY full_name')
-                return [dict(row) for row in cursor.fetchall()]
+            return self.cache.get_or_load('all_users', load, tags=('users',))
         except Exception as e:
             logging.error(f"Ошибка получения пользователей: {e}")
             return []
 
-    def export_to_excel(self, days: int = 30) -> Optional[str]:
-        """Экспорт данных в Excel"""
-        if not EXPORT_AVAILABLE:
-            logging.error("❌ Библиотеки для экспорта недоступны")
+    @staticmethod
+    def _fts_query(query: str) -> Optional[str]:
+        """Запрос пользователя -> выражение FTS5: все слова как префиксы (И)"""
+        words = re.findall(r'\w+', query.replace('ё', 'е').replace('Ё', 'Е'))
+        if not words:
             return None
+        return ' '.join('"' + word.replace('"', '""') + '"*' for word in words[:8])
 
-        try:
-            records = self.get_all_records(days=days, limit=10000)
-            if not records:
-                logging.warning("Нет записей для экспорта")
-                return None
-
-            return self.export_records_to_excel(records, f"за последние {days} дней")
-        except Exception as e:
-            logging.error(f"Ошибка экспорта в Excel: {e}")
-            return None
-
-    def export_records_to_excel(self, records: List[Dict[str, Any]], period_desc: str = "") -> Optional[str]:
-        """Экспорт списка записей в Excel с форматированием"""
-        if not EXPORT_AVAILABLE:
-            logging.error("❌ Библиотеки для экспорта недоступны")
-            return None
+    def search(self, query: str, limit: int = 20, days: Optional[int] = None) -> Dict[str, Any]:
+        """Поиск бойцов по ФИО и записей по ФИО или локации
 
+        Бойцы упорядочены по релевантности (bm25), записи - от новых к старым.
+        days ограничивает период записей.
+        """
         try:
-            if not records:
-                logging.warning("Нет записей для экспорта")
-                return None
-
-            # Создаем DataFrame
-            df = pd.DataFrame(records)
-
-            # Форматируем данные - сортируем по времени (хронологический порядок)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp', ascending=True)
-
-            # Преобразуем действия для корректного отображения
-            df['action'] = df['action'].replace({
-                'в части': 'прибыл', 
-                'не в части': 'убыл'
-            })
-
-            # Переименовываем колонки
-            df = df.rename(columns={
-                'full_name': 'ФИО',
-                'action': 'Действие', 
-                'location': 'Локация',
-                'timestamp': 'Дата_Время'
-            })
-
-            # Убираем эмодзи из локаций
-            df['Локация'] = df['Локация'].str.replace(r'[^\w\s\-\.\,\(\)]', '', regex=True).str.strip()
-
-            # Создаем отдельные столбцы для даты и времени
-            df['Дата'] = df['Дата_Время'].dt.strftime('%d.%m.%Y')
-            df['Время'] = df['Дата_Время'].dt.strftime('%H:%M:%S')
-
-            # Выбираем нужные колонки в правильном порядке
-            df = df[['ФИО', 'Действие', 'Локация', 'Дата', 'Время']]
-
-            # Создаем уникальное имя файла
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"military_records_{timestamp}.xlsx"
-
-            logging.info(f"Создаем Excel файл: {filename}")
-
-            # Создаем Excel файл с улучшенным форматированием
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Записи', index=False)
-                logging.info("DataFrame записан в Excel")
-
-                # Получаем рабочий лист
-                worksheet = writer.sheets['Записи']
-
-                try:
-                    from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-
-                    # Определяем стили
-                    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-                    header_font = Font(color="FFFFFF", bold=True, size=12)
-
-                    arrived_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Светло-зеленый
-                    departed_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # Светло-красный
-
-                    border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
+            match = self._fts_query(query or '')
+            if not match:
+                return {'users': [], 'records': []}
+
+            since = int(time.time()) - days * 86400 if days else 0
+            with self.connections.reader() as conn:
+                fts_ready = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'locations_fts'"
+                ).fetchone()
+                if not fts_ready:
+                    return self._search_like(conn, query.strip(), limit, since)
+
+                users = [dict(row) for row in conn.execute('''
+                    SELECT u.* FROM users_fts f
+                    JOIN users u ON u.id = f.rowid
+                    WHERE users_fts MATCH ?
+                    ORDER BY bm25(users_fts), u.full_name
+                    LIMIT ?
+                ''', (match, limit)).fetchall()]
+
+                # id записей растут со временем, поэтому период переводим в диапазон id
+                first_id = conn.execute(
+                    'SELECT id FROM records WHERE timestamp > ? ORDER BY timestamp, id LIMIT 1',
+                    (since,)
+                ).fetchone()
+                if not first_id:
+                    return {'users': users, 'records': []}
+
+                # Записи: последние совпадения по локации и последние записи
+                # найденных бойцов, каждая часть ограничена limit
+                records = self._fetch_rows(conn, Record, f'''
+                    WITH matched_locations AS (
+                        SELECT rowid AS location_id FROM locations_fts
+                        WHERE locations_fts MATCH ?1
+                    ),
+                    by_location AS (
+                        SELECT r1.id FROM records r1
+                        WHERE r1.location_id IN (SELECT location_id FROM matched_locations)
+                          AND r1.id >= ?2
+                        ORDER BY r1.id DESC LIMIT ?4
+                    ),
+                    matched_users AS (
+                        SELECT rowid AS user_id FROM users_fts
+                        WHERE users_fts MATCH ?1
+                        ORDER BY rank LIMIT ?4
+                    ),
+                    by_user AS (
+                        SELECT r2.id FROM matched_users m
+                        JOIN records r2 ON r2.user_id = m.user_id
+                        WHERE r2.id >= ?2
+                        ORDER BY r2.id DESC LIMIT ?4
                     )
-
-                    # Форматируем заголовки
-                    for cell in worksheet[1]:
-                        cell.fill = header_fill
-                        cell.font = header_font
-                        try:
-                            cell.alignment = Alignment(horizontal='center', vertical='center')
-                        except Exception as style_e:
-                            logging.warning(f"Не удалось применить выравнивание: {style_e}")
-                        cell.border = border
-
-                    # Форматируем данные с цветовой заливкой
-                    for row_num, row in enumerate(worksheet.iter_rows(min_row=2), start=2):
-                        try:
-                            action_cell = row[1]  # Колонка "Действие"
-
-                            # Применяем цветовую заливку в зависимости от действия
-                            if action_cell.value == "прибыл":
-                                for cell in row:
-                                    cell.fill = arrived_fill
-                                    cell.border = border
-                            elif action_cell.value == "убыл":
-                                for cell in row:
-                                    cell.fill = departed_fill
-                                    cell.border = border
-                            else:
-                                for cell in row:
-                                    cell.border = border
-                        except Exception as row_e:
-                            logging.warning(f"Ошибка форматирования строки {row_num}: {row_e}")
-
-                    # Автоматически подгоняем ширину колонок
-                    column_widths = {
-                        'A': 20,  # ФИО - минимум 20
-                        'B': 12,  # Действие - минимум 12
-                        'C': 15,  # Локация - минимум 15
-                        'D': 12,  # Дата - фиксированная ширина
-                        'E': 10   # Время - фиксированная ширина
-                    }
-
-                    # Определяем максимальную ширину для каждой колонки
-                    for row in worksheet.iter_rows():
-                        for cell in row:
-                            column_letter = cell.column_letter
-                            if column_letter in column_widths:
-                                try:
-                                    cell_length = len(str(cell.value)) if cell.value else 0
-                                    if cell_length > column_widths[column_letter]:
-                                        column_widths[column_letter] = min(cell_length + 3, 50)  # Ограничиваем максимум
-                                except Exception:
-                                    pass
-
-                    # Устанавливаем ширину колонок
-                    for col_letter, width in column_widths.items():
-                        worksheet.column_dimensions[col_letter].width = width
-
-                    # Устанавливаем высоту строк
-                    for row in worksheet.iter_rows():
-                        worksheet.row_dimensions[row[0].row].height = 20
-
-                    logging.info("Форматирование Excel файла завершено")
-
-                except ImportError as import_e:
-                    logging.warning(f"Опции стиля недоступны: {import_e}")
-                except Exception as format_e:
-                    logging.warning(f"Ошибка форматирования Excel: {format_e}")
-
-            logging.info(f"Excel файл создан успешно: {filename}")
-            return filename
-
+                    SELECT {RECORD_COLUMNS}
+                    FROM (SELECT id FROM by_location UNION SELECT id FROM by_user) ids
+                    JOIN records_named r ON r.id = ids.id
+                    JOIN users u ON u.id = r.user_id
+                    WHERE r.timestamp > ?3
+                    ORDER BY r.timestamp DESC, r.id DESC
+                    LIMIT ?4
+                ''', (match, first_id[0], since, limit))
+
+                return {'users': users, 'records': records}
         except Exception as e:
-            logging.error(f"Ошибка создания Excel файла: {e}")
-            import traceback
-            logging.error(f"Трассировка: {traceback.format_exc()}")
-            return None
-
-    def export_to_csv(self, days: int = 30) -> str:
-        """Экспорт записей в CSV файл"""
+            logging.error(f"Ошибка поиска: {e}")
+            return {'users': [], 'records': []}
+
+    def _search_like(self, conn: sqlite3.Connection, query: str, limit: int, since: int) -> Dict[str, Any]:
+        """Поиск подстрокой - если SQLite собран без FTS5"""
+        pattern = f'%{query}%'
+        users = [dict(row) for row in conn.execute(
+            'SELECT * FROM users WHERE full_name LIKE ? ORDER BY full_name LIMIT ?',
+            (pattern, limit)
+        ).fetchall()]
+        records = self._fetch_rows(conn, Record, f'''
+            SELECT {RECORD_COLUMNS} FROM records_named r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.timestamp > ? AND (u.full_name LIKE ? OR r.location LIKE ?)
+            ORDER BY r.timestamp DESC, r.id DESC
+            LIMIT ?
+        ''', (since, pattern, pattern, limit))
+        return {'users': users, 'records': records}
+
+    def export_to_excel(self, days: int = 30, period_desc: Optional[str] = None) -> Optional[str]:
+        """Экспорт данных за период в Excel (записи читаются порциями)"""
         try:
-            import pandas as pd
-            from datetime import datetime, timedelta
-
-            # Получаем записи за период
-            records = self.get_all_records(days=days, limit=10000)
-
-            if not records:
-                return None
-
-            # Создаем DataFrame
-            df = pd.DataFrame(records)
+            return self.export_records_to_excel(
+                self.iter_records(days=days), period_desc or f"за последние {days} дней"
+            )
+        except Exception as e:
+            logging.error(f"Ошибка экспорта в Excel: {e}")
+            return None
 
-            # Форматируем временные метки
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['date'] = df['timestamp'].dt.strftime('%d.%m.%Y')
-            df['time'] = df['timestamp'].dt.strftime('%H:%M:%S')
+    @staticmethod
+    def _export_row(record) -> list:
+        """Строка экспорта: Дата, Время, ФИО, Действие, Локация"""
+        moment = datetime.fromtimestamp(record['timestamp'])
+        return [
+            moment.strftime('%d.%m.%Y'), moment.strftime('%H:%M:%S'),
+            record['full_name'], record['action'], record['location']
+        ]
 
-            # Переупорядочиваем колонки
-            df = df[['date', 'time', 'full_name', 'action', 'location']]
-            df.columns = ['Дата', 'Время', 'ФИО', 'Действие', 'Локация']
+    EXPORT_HEADER = ['Дата', 'Время', 'ФИО', 'Действие', 'Локация']
 
-            # Создаем имя файла
+    def export_to_csv(self, days: int = 30) -> Optional[str]:
+        """Экспорт записей в CSV файл (записи читаются порциями)"""
+        try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"export_{timestamp}.csv"
 
-            # Сохраняем файл
-            df.to_csv(filename, index=False, encoding='utf-8-sig')
+            count = 0
+            with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.EXPORT_HEADER)
+                for record in self.iter_records(days=days):
+                    writer.writerow(self._export_row(record))
+                    count += 1
 
+            if not count:
+                os.remove(filename)
+                return None
             return filename
 
         except Exception as e:
             logging.error(f"Ошибка экспорта CSV: {e}")
             return None
 
-    def export_records_to_excel(self, records: list, period_desc: str) -> str:
-        """Экспорт записей в Excel файл"""
-        try:
-            import pandas as pd
-            from datetime import datetime
+    def export_records_to_excel(self, records: Iterable, period_desc: str = "") -> Optional[str]:
+        """Экспорт записей в Excel файл.
 
-            if not records:
-                return None
+        records - список или итератор (например, iter_records): книга пишется
+        в потоковом режиме openpyxl, строки не накапливаются в памяти.
+        """
+        if not EXPORT_AVAILABLE:
+            logging.error("❌ Библиотеки для экспорта недоступны")
+            return None
+
+        filename = None
+        try:
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet('Записи')
+            sheet.append(self.EXPORT_HEADER)
 
-            # Создаем DataFrame
-            df = pd.DataFrame(records)
+            count = 0
+            for record in records:
+                sheet.append(self._export_row(record))
+                count += 1
 
-            # Форматируем временные метки
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['date'] = df['timestamp'].dt.strftime('%d.%m.%Y')
-            df['time'] = df['timestamp'].dt.strftime('%H:%M:%S')
+            if not count:
+                logging.warning("Нет записей для экспорта")
+                return None
 
-            # Переупорядочиваем колонки
-            df = df[['date', 'time', 'full_name', 'action', 'location']]
-            df.columns = ['Дата', 'Время', 'ФИО', 'Действие', 'Локация']
+            # Информационный лист
+            info = workbook.create_sheet('Информация')
+            info.append(['Параметр', 'Значение'])
+            info.append(['Период', period_desc])
+            info.append(['Дата создания', datetime.now().strftime('%d.%m.%Y %H:%M:%S')])
+            info.append(['Всего записей', count])
 
-            # Создаем имя файла
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"export_excel_{timestamp}.xlsx"
-
-            # Сохраняем в Excel
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Записи', index=False)
-
-                # Добавляем информационный лист
-                info_df = pd.DataFrame({
-                    'Параметр': ['Период', 'Дата создания', 'Всего записей'],
-                    'Значение': [period_desc, datetime.now().strftime('%d.%m.%Y %H:%M:%S'), len(records)]
-                })
-                info_df.to_excel(writer, sheet_name='Информация', index=False)
-
+            workbook.save(filename)
             return filename
 
         except Exception as e:
             logging.error(f"Ошибка экспорта Excel: {e}")
+            if filename and os.path.exists(filename):
+                os.remove(filename)
             return None
 
-    def get_records_today(self) -> list:
-        """Получить записи за сегодня"""
-        try:
-            from datetime import datetime, timedelta
-
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            tomorrow = today + timedelta(days=1)
-
-            cursor = self.conn.execute("""
-                SELECT * FROM records 
-                WHERE timestamp >= ? AND timestamp < ?
-                ORDER BY timestamp DESC
-            """, (today.isoformat(), tomorrow.isoformat()))
-
-            records = []
-            for row in cursor.fetchall():
-                records.append({
-                    'id': row[0],
-                    'user_id': row[1],
-                    'full_name': row[2],
-                    'action': row[3],
-                    'location': row[4],
-                    'timestamp': row[5]
-                })
-
-            return records
-
-        except Exception as e:
-            logging.error(f"Ошибка получения записей за сегодня: {e}")
-            return []
-
-    def get_records_yesterday(self) -> list:
-        """Получить записи за вчера"""
-        try:
-            from datetime import datetime, timedelta
-
-            yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
-            today = yesterday + timedelta(days=1)
-
-            cursor = self.conn.execute("""
-                SELECT * FROM records 
-                WHERE timestamp >= ? AND timestamp < ?
-                ORDER BY timestamp DESC
-            """, (yesterday.isoformat(), today.isoformat()))
-
-            records = []
-            for row in cursor.fetchall():
-                records.append({
-                    'id': row[0],
-                    'user_id': row[1],
-                    'full_name': row[2],
-                    'action': row[3],
-                    'location': row[4],
-                    'timestamp': row[5]
-                })
-
-            return records
-
-        except Exception as e:
-            logging.error(f"Ошибка получения записей за вчера: {e}")
-            return []
-
-    def get_records_by_date(self, date_str: str) -> List[Dict[str, Any]]:
+    def get_records_by_date(self, date_str: str) -> List[Record]:
         """Получить записи за конкретную дату"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                # Используем LIKE для более надежного поиска по дате
-                cursor = conn.execute('''
-                    SELECT r.*, u.full_name 
-                    FROM records r
+            with self.connections.reader() as conn:
+                # day - местная дата записи в формате YYYY-MM-DD (индекс idx_records_day)
+                records = self._fetch_rows(conn, Record, f'''
+                    SELECT {RECORD_COLUMNS}
+                    FROM records_named r
                     JOIN users u ON r.user_id = u.id
-                    WHERE DATE(r.timestamp) = ? OR r.timestamp LIKE ?
-                    ORDER BY r.timestamp ASC
-                ''', (date_str, f"{date_str}%"))
-                records = [dict(row) for row in cursor.fetchall()]
+                    WHERE r.day = ?
+                    ORDER BY r.timestamp ASC, r.id ASC
+                ''', (date_str,))
                 logging.info(f"Найдено записей за {date_str}: {len(records)}")
                 return records
         except Exception as e:
             logging.error(f"Ошибка получения записей по дате {date_str}: {e}")
             return []
 
-    def get_records_today(self) -> List[Dict[str, Any]]:
+    def get_records_today(self) -> List[Record]:
         """Получить записи за сегодня"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self.connections.reader() as conn:
                 today = datetime.now().date()
-                cursor = conn.execute('''
-                    SELECT r.*, u.full_name 
-                    FROM records r
+                records = self._fetch_rows(conn, Record, f'''
+                    SELECT {RECORD_COLUMNS}
+                    FROM records_named r
                     JOIN users u ON r.user_id = u.id
-                    WHERE DATE(r.timestamp) = ?
-                    ORDER BY r.timestamp ASC
-                ''', (str(today),))
-                records = [dict(row) for row in cursor.fetchall()]
+                    WHERE r.day = ?
+                    ORDER BY r.timestamp ASC, r.id ASC
+                ''', (today.isoformat(),))
                 logging.info(f"Найдено записей за сегодня ({today}): {len(records)}")
                 return records
         except Exception as e:
             logging.error(f"Ошибка получения записей за сегодня: {e}")
             return []
 
-    def get_records_yesterday(self) -> List[Dict[str, Any]]:
+    def get_records_yesterday(self) -> List[Record]:
         """Получить записи за вчера"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self.connections.reader() as conn:
                 yesterday = (datetime.now() - timedelta(days=1)).date()
-                cursor = conn.execute('''
-                    SELECT r.*, u.full_name 
-                    FROM records r
+                records = self._fetch_rows(conn, Record, f'''
+                    SELECT {RECORD_COLUMNS}
+                    FROM records_named r
                     JOIN users u ON r.user_id = u.id
-                    WHERE DATE(r.timestamp) = ?
-                    ORDER BY r.timestamp ASC
-                ''', (str(yesterday),))
-                records = [dict(row) for row in cursor.fetchall()]
+                    WHERE r.day = ?
+                    ORDER BY r.timestamp ASC, r.id ASC
+                ''', (yesterday.isoformat(),))
                 logging.info(f"Найдено записей за вчера ({yesterday}): {len(records)}")
                 return records
         except Exception as e:
@@ -832,29 +1302,67 @@ class DatabaseService:
             return []
 
     def cleanup_old_records(self, days: int = 180) -> int:
-        """Очистка старых записей"""
+        """Очистка старых записей с архивированием (см. RetentionEngine)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cutoff_date = datetime.now() - timedelta(days=days)
-                cursor = conn.execute(
-                    'DELETE FROM records WHERE timestamp < ?',
-                    (cutoff_date,)
-                )
-                deleted_count = cursor.rowcount
-                conn.commit()
-                return deleted_count
+            return self.retention.run(days)['deleted']
         except Exception as e:
             logging.error(f"Ошибка очистки записей: {e}")
             return 0
 
+    def backup_now(self, reason: str = 'manual') -> Optional[Dict[str, Any]]:
+        """Сделать снимок базы сейчас (см. BackupService). При ошибке - None"""
+        try:
+            result = self.backups.snapshot(reason)
+            self.backups.rotate()
+            return result
+        except Exception as e:
+            logging.error(f"Ошибка резервного копирования: {e}")
+            return None
+
+    def get_backup_status(self) -> Dict[str, Any]:
+        """Снимки, архив WAL и последний снимок этого процесса"""
+        try:
+            return self.backups.get_status()
+        except Exception as e:
+            logging.error(f"Ошибка чтения состояния резервных копий: {e}")
+            return {}
+
+    def enable_replication(self, replica_dir: str, apply: bool = True) -> Optional[ReplicationService]:
+        """Доставлять WAL в каталог реплики (см. ReplicationService). Цикл запускает вызывающий"""
+        if self.connections.shared_memory or self.readonly:
+            logging.warning("⚠️ Репликация недоступна для этой базы")
+            return None
+        self.replication = ReplicationService(self, replica_dir, apply=apply)
+        return self.replication
+
+    def get_replication_status(self) -> Dict[str, Any]:
+        """Состояние реплики и отставание; пустой словарь, если репликация не настроена"""
+        if self.replication is None:
+            return {}
+        try:
+            return self.replication.get_status()
+        except Exception as e:
+            logging.error(f"Ошибка чтения состояния реплики: {e}")
+            return {}
+
+    def _snapshot_before(self, operation: str):
+        """Снимок перед необратимой очисткой - восстановить можно будет из backups/"""
+        if not self.connections.shared_memory:
+            self.backup_now(f'before_{operation}')
+
     def clear_all_records(self) -> int:
         """Удалить все записи из системы"""
+        self._snapshot_before('clear_all_records')
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.writer() as conn:
                 cursor = conn.execute("DELETE FROM records")
                 deleted_count = cursor.rowcount
-                conn.commit()
-                return deleted_count
+                conn.execute("DELETE FROM user_status")
+                conn.execute("DELETE FROM absences")
+                conn.execute("DELETE FROM stats_daily")
+                conn.execute("DELETE FROM stats_hourly")
+            self.cache.clear()
+            return deleted_count
         except Exception as e:
             logging.error(f"Ошибка при очистке всех записей: {e}")
             return 0
@@ -865,8 +1373,9 @@ class DatabaseService:
 
     def clear_all_data(self) -> int:
         """Полная очистка всех данных системы"""
+        self._snapshot_before('clear_all_data')
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.writer() as conn:
                 # Подсчитываем общее количество записей перед удалением
                 total_records = 0
 
@@ -885,15 +1394,19 @@ class DatabaseService:
 
                 # Удаляем все данные из всех таблиц
                 conn.execute("DELETE FROM records")
+                conn.execute("DELETE FROM user_status")
+                conn.execute("DELETE FROM absences")
+                conn.execute("DELETE FROM stats_daily")
+                conn.execute("DELETE FROM stats_hourly")
                 conn.execute("DELETE FROM users")
                 conn.execute("DELETE FROM admins")
 
                 # Сбрасываем автоинкремент
                 conn.execute("DELETE FROM sqlite_sequence WHERE name IN ('records', 'users', 'admins')")
 
-                conn.commit()
-                logging.info(f"База данных полностью очищена. Удалено записей: {total_records}")
-                return total_records
+            self.cache.clear()
+            logging.info(f"База данных полностью очищена. Удалено записей: {total_records}")
+            return total_records
 
         except Exception as e:
             logging.error(f"Ошибка при полной очистке БД: {e}")
@@ -901,39 +1414,43 @@ class DatabaseService:
 
     def full_database_reset(self):
         """Полная очистка базы данных"""
+        self._snapshot_before('full_database_reset')
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.writer() as conn:
                 # Удаляем все данные из всех таблиц
                 conn.execute("DELETE FROM records")
+                conn.execute("DELETE FROM user_status")
+                conn.execute("DELETE FROM absences")
+                conn.execute("DELETE FROM stats_daily")
+                conn.execute("DELETE FROM stats_hourly")
                 conn.execute("DELETE FROM users")
                 conn.execute("DELETE FROM admins")
 
                 # Сбрасываем автоинкремент
                 conn.execute("DELETE FROM sqlite_sequence WHERE name IN ('records', 'users', 'admins')")
 
-                conn.commit()
-                logging.info("База данных полностью очищена")
+            self.cache.clear()
+            logging.info("База данных полностью очищена")
 
         except Exception as e:
             logging.error(f"Ошибка при полной очистке БД: {e}")
             raise
 
-    def optimize_database(self):
-        """Оптимизация базы данных"""
+    def optimize_database(self) -> dict:
+        """Оптимизация базы данных без полного VACUUM (см. MaintenanceService)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("VACUUM")
-                conn.execute("ANALYZE")
-                conn.commit()
-                logging.info("База данных оптимизирована")
+            result = self.maintenance.run_all()
+            logging.info("База данных оптимизирована")
+            return result
         except Exception as e:
             logging.error(f"Ошибка при оптимизации БД: {e}")
+            return {}
 
     def get_database_stats(self) -> dict:
         """Получить статистику базы данных"""
         try:
             stats = {}
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.reader() as conn:
                 # Количество записей в таблицах
                 stats['users'] = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
                 stats['records'] = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
@@ -952,7 +1469,7 @@ class DatabaseService:
                     cursor = conn.execute("SELECT MAX(timestamp) FROM records")
                     last_activity = cursor.fetchone()[0]
                     if last_activity:
-                        last_time = datetime.fromisoformat(last_activity.replace('Z', '+00:00'))
+                        last_time = datetime.fromtimestamp(last_activity)
                         stats['last_activity'] = last_time.strftime('%d.%m.%Y %H:%M')
                     else:
                         stats['last_activity'] = "Нет активности"
@@ -974,10 +1491,10 @@ class DatabaseService:
     def remove_admin(self, user_id: int) -> bool:
         """Удалить администратора"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.writer() as conn:
                 cursor = conn.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
-                conn.commit()
-                return cursor.rowcount > 0
+            self.cache.invalidate('admins')
+            return cursor.rowcount > 0
         except Exception as e:
             logging.error(f"Ошибка при удалении администратора: {e}")
             return False
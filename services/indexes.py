@@ -0,0 +1,96 @@
+import re
+import sqlite3
+import logging
+from typing import Dict, List
+
+# Управляемый набор индексов. Индексы создаются только отсюда (sync_indexes
+# из миграции), лишние индексы на этих таблицах удаляются, а индексы с
+# изменившимся определением пересоздаются. Изменили набор - добавьте
+# миграцию, которая вызывает sync_indexes.
+#
+# Планы горячих запросов проверяет python -m services.query_plans.
+
+INDEXES: Dict[str, str] = {
+    # Последняя запись бойца и его журнал: покрывающий индекс, id явно в ключе,
+    # поэтому ORDER BY timestamp DESC, id DESC - обратный проход без сортировки
+    'idx_records_user_timestamp': 'records (user_id, timestamp, id, action, location_id, day)',
+    # Журнал за период, экспорт, подсчет записей
+    'idx_records_timestamp': 'records (timestamp)',
+    # Записи за день (сегодня, вчера, выбранная дата)
+    'idx_records_day': 'records (day)',
+    # Поиск по справочнику локаций
+    'idx_records_location': 'records (location_id)',
+    # ТОП локаций убытия: покрывающий индекс, группировка идет по порядку индекса
+    'idx_records_action_location': 'records (action, location_id, timestamp)',
+    # Интервалы отсутствия: по бойцу, пересечение с периодом, открытые интервалы
+    'idx_absences_user': 'absences (user_id, started_at)',
+    'idx_absences_ended': 'absences (ended_at, user_id, started_at, location_id)',
+    'idx_absences_open': 'absences (user_id, started_at) WHERE ended_at IS NULL',
+    'idx_users_full_name': 'users (full_name)',
+    'idx_maintenance_runs_task': 'maintenance_runs (task, started_at)',
+}
+
+
+def _table(definition: str) -> str:
+    return definition.split(' ', 1)[0]
+
+
+def _normalize(sql: str) -> str:
+    return re.sub(r'\s+', ' ', sql or '').strip().lower()
+
+
+def index_ddl(name: str) -> str:
+    """CREATE INDEX для индекса из набора"""
+    return f'CREATE INDEX {name} ON {INDEXES[name]}'
+
+
+def sync_indexes(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Привести индексы к набору INDEXES (внутри транзакции писателя).
+
+    Возвращает списки созданных, пересозданных и удаленных индексов.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    managed_tables = {_table(definition) for definition in INDEXES.values()}
+    existing = {
+        row[0]: (row[1], row[2]) for row in conn.execute(
+            "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+    }
+    result = {'created': [], 'recreated': [], 'dropped': []}
+
+    for name, (table, sql) in existing.items():
+        if table in managed_tables and name not in INDEXES:
+            conn.execute(f'DROP INDEX {name}')
+            result['dropped'].append(name)
+
+    for name in INDEXES:
+        # Таблицу создаст более поздняя миграция - она же вызовет sync_indexes
+        if _table(INDEXES[name]) not in tables:
+            continue
+        ddl = index_ddl(name)
+        if name in existing:
+            if _normalize(existing[name][1]) == _normalize(ddl):
+                continue
+            conn.execute(f'DROP INDEX {name}')
+            result['recreated'].append(name)
+        else:
+            result['created'].append(name)
+        conn.execute(ddl)
+
+    for action, names in result.items():
+        if names:
+            logging.info(f"Индексы ({action}): {', '.join(names)}")
+    return result
+
+
+def missing_indexes(conn: sqlite3.Connection) -> List[str]:
+    """Индексы набора, которых нет в базе или которые отличаются от определения"""
+    existing = {
+        row[0]: row[1] for row in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+    }
+    return [
+        name for name in INDEXES
+        if _normalize(existing.get(name)) != _normalize(index_ddl(name))
+    ]
@@ -0,0 +1,44 @@
+import sqlite3
+from enum import IntEnum
+
+# Справочник локаций и коды действий.
+# В records хранятся только целые числа: action - код Action,
+# location_id - ссылка на locations. Текстовые значения для чтения
+# дает представление records_named (см. migration_004 в services/migrations.py).
+
+
+class Action(IntEnum):
+    """Код действия в records.action"""
+    PRESENT = 1
+    ABSENT = 2
+
+
+ACTION_NAMES = {Action.PRESENT: 'в части', Action.ABSENT: 'не в части'}
+ACTION_CODES = {name: code for code, name in ACTION_NAMES.items()}
+
+# SQL-выражение для декодирования кода действия в текст
+ACTION_NAME_SQL = "CASE {} WHEN 1 THEN 'в части' WHEN 2 THEN 'не в части' END"
+
+# Локация прибывших в часть - первая в справочнике
+PRESENT_LOCATION = 'Часть'
+
+
+def configured_locations() -> list:
+    """Локации из config.LOCATIONS (пустой список, если конфигурация недоступна)"""
+    try:
+        from config import LOCATIONS
+        return list(LOCATIONS)
+    except Exception:
+        return []
+
+
+def get_location_id(conn: sqlite3.Connection, name: str) -> int:
+    """id локации по названию; новая (свободный ввод) добавляется в справочник.
+
+    Вызывается внутри транзакции писателя. Кэша нет намеренно: при откате
+    операции новая строка справочника откатывается вместе с ней.
+    """
+    row = conn.execute('SELECT id FROM locations WHERE name = ?', (name,)).fetchone()
+    if row:
+        return row[0]
+    return conn.execute('INSERT INTO locations (name) VALUES (?)', (name,)).lastrowid
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Настройки обслуживания по умолчанию
+MAINTENANCE_INTERVAL_SECONDS = 600
+# Обслуживание начинается, только если записей не было столько секунд
+IDLE_SECONDS = 30
+# Страниц за один шаг incremental_vacuum (по 4 КБ) и шагов за один запуск
+INCREMENTAL_VACUUM_PAGES = 256
+MAX_VACUUM_STEPS = 40
+OPTIMIZE_INTERVAL_SECONDS = 3 * 3600
+# Местные часы, в которые выполняются тяжелые задачи (раз в сутки)
+OFF_PEAK_HOURS = (3, 4)
+RUNS_RETENTION_DAYS = 90
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class MaintenanceService:
+    """Фоновое обслуживание базы вместо VACUUM при запуске.
+
+    - incremental_vacuum - возвращает свободные страницы небольшими шагами,
+      только пока очередь записи простаивает;
+    - PRAGMA optimize - обновляет статистику только там, где она устарела;
+    - wal_checkpoint(TRUNCATE) и однократный перевод старой базы в режим
+      auto_vacuum=INCREMENTAL (полный VACUUM) - в ночное окно OFF_PEAK_HOURS.
+
+    Каждый запуск задачи с длительностью записывается в maintenance_runs.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._last_optimize = time.monotonic()
+        self._last_off_peak_day = None
+
+    def _record(self, task: str, started_at: float, duration_ms: float, success: bool, details: Any):
+        try:
+            with self.db.connections.writer() as conn:
+                conn.execute('''
+                    INSERT INTO maintenance_runs (task, started_at, duration_ms, success, details)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (task, int(started_at), round(duration_ms, 2), int(success),
+                      json.dumps(details, ensure_ascii=False)))
+        except Exception as e:
+            logging.error(f"Ошибка записи журнала обслуживания: {e}")
+
+    def _timed(self, task: str, func, *args):
+        """Выполнить задачу, замерить и записать в журнал. При ошибке - None"""
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            logging.error(f"Ошибка обслуживания ({task}): {e}")
+            self._record(task, started_at, (time.perf_counter() - started) * 1000, False, str(e))
+            return None
+        self._record(task, started_at, (time.perf_counter() - started) * 1000, True, result)
+        return result
+
+    def is_idle(self) -> bool:
+        """Очередь записи пуста и простаивает не меньше IDLE_SECONDS"""
+        queue = self.db.write_queue
+        return queue.get_stats()['pending'] == 0 and time.monotonic() - queue.last_activity >= IDLE_SECONDS
+
+    def _pragma(self, name: str) -> int:
+        with self.db.connections.reader() as conn:
+            return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def _incremental_vacuum(self, max_steps: Optional[int], check_idle: bool) -> Dict[str, int]:
+        if self._pragma('auto_vacuum') != AUTO_VACUUM_INCREMENTAL:
+            return {'freed_pages': 0, 'free_pages': self._pragma('freelist_count')}
+
+        freed = steps = 0
+        while max_steps is None or steps < max_steps:
+            before = self._pragma('freelist_count')
+            if before == 0 or (check_idle and steps and not self.is_idle()):
+                break
+            with self.db.connections.raw_writer() as conn:
+                # executescript выполняет PRAGMA до конца: execute освобождает одну страницу
+                conn.executescript(f'PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})')
+            freed += before - self._pragma('freelist_count')
+            steps += 1
+        return {'freed_pages': freed, 'free_pages': self._pragma('freelist_count')}
+
+    def incremental_vacuum(self, max_steps: Optional[int] = MAX_VACUUM_STEPS,
+                           check_idle: bool = True) -> Optional[Dict[str, int]]:
+        """Вернуть свободные страницы файлу; max_steps=None - все страницы"""
+        return self._timed('incremental_vacuum', self._incremental_vacuum, max_steps, check_idle)
+
+    def _optimize(self) -> Dict[str, Any]:
+        with self.db.connections.raw_writer() as conn:
+            conn.execute('PRAGMA optimize')
+        self._last_optimize = time.monotonic()
+        return {}
+
+    def optimize(self):
+        """PRAGMA optimize - ANALYZE только для таблиц с устаревшей статистикой"""
+        return self._timed('optimize', self._optimize)
+
+    def _checkpoint(self) -> Dict[str, Any]:
+        if self.db.backups.wal.enabled:
+            # Checkpoint в обход архива потерял бы кадры для восстановления
+            return self.db.backups.wal.capture()
+        with self.db.connections.raw_writer() as conn:
+            busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        return {'busy': busy, 'wal_pages': log_pages, 'checkpointed': checkpointed}
+
+    def checkpoint(self) -> Optional[Dict[str, int]]:
+        """Перенести WAL в основной файл и обрезать журнал"""
+        return self._timed('wal_checkpoint', self._checkpoint)
+
+    def _convert_to_incremental(self) -> Dict[str, Any]:
+        with self.db.connections.raw_writer() as conn:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        return {'auto_vacuum': mode}
+
+    def convert_to_incremental(self) -> Optional[Dict[str, Any]]:
+        """Однократно перевести базу в auto_vacuum=INCREMENTAL (полный VACUUM)"""
+        if self._pragma('auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+            return None
+        return self._timed('convert_auto_vacuum', self._convert_to_incremental)
+
+    def _prune_runs(self) -> Dict[str, int]:
+        cutoff = int(time.time()) - RUNS_RETENTION_DAYS * 86400
+        with self.db.connections.writer() as conn:
+            deleted = conn.execute('DELETE FROM maintenance_runs WHERE started_at < ?', (cutoff,)).rowcount
+        return {'deleted': deleted}
+
+    def run_due(self) -> List[str]:
+        """Выполнить задачи, срок которых подошел. Возвращает их имена"""
+        if not self.is_idle():
+            return []
+
+        done = []
+        if self._pragma('freelist_count'):
+            self.incremental_vacuum()
+            done.append('incremental_vacuum')
+
+        if time.monotonic() - self._last_optimize >= OPTIMIZE_INTERVAL_SECONDS:
+            self.optimize()
+            done.append('optimize')
+
+        now = datetime.now()
+        if now.hour in OFF_PEAK_HOURS and self._last_off_peak_day != now.date():
+            self._last_off_peak_day = now.date()
+            self.checkpoint()
+            done.append('wal_checkpoint')
+            if self.convert_to_incremental() is not None:
+                done.append('convert_auto_vacuum')
+            self._timed('prune_maintenance_runs', self._prune_runs)
+        return done
+
+    def run_all(self) -> Dict[str, Any]:
+        """Ручное обслуживание: все свободные страницы, optimize и checkpoint"""
+        return {
+            'incremental_vacuum': self.incremental_vacuum(max_steps=None, check_idle=False),
+            'optimize': self.optimize() is not None,
+            'wal_checkpoint': self.checkpoint()
+        }
+
+    async def run_forever(self, interval: float = MAINTENANCE_INTERVAL_SECONDS, executor=None):
+        """Цикл обслуживания для фоновой задачи asyncio"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                done = await loop.run_in_executor(executor, self.run_due)
+                if done:
+                    logging.info(f"Обслуживание БД: {', '.join(done)}")
+            except Exception as e:
+                logging.error(f"Ошибка цикла обслуживания БД: {e}")
+
+    def get_recent_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Последние запуски обслуживания"""
+        try:
+            with self.db.connections.reader() as conn:
+                rows = conn.execute('''
+                    SELECT task, started_at, duration_ms, success, details
+                    FROM maintenance_runs
+                    ORDER BY id DESC
+                    LIMIT ?
+                ''', (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logging.error(f"Ошибка чтения журнала обслуживания: {e}")
+            return []
@@ -0,0 +1,329 @@
+import sqlite3
+import logging
+from typing import List
+
+from services.locations import (
+    Action, ACTION_NAME_SQL, PRESENT_LOCATION, configured_locations
+)
+from services.indexes import sync_indexes
+from services.absences import rebuild_absences
+from services.rollups import rebuild_rollups
+
+# Миграции схемы. Номер применённой миграции хранится в PRAGMA user_version,
+# каждая миграция выполняется один раз внутри транзакции писателя.
+# Новые миграции добавляются в конец списка MIGRATIONS.
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы (PRAGMA user_version)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def column_names(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Список колонок таблицы"""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, definition: str) -> bool:
+    """Добавить колонку, если ее еще нет. Возвращает True, если колонка добавлена"""
+    if column in column_names(conn, table):
+        return False
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+
+def migration_001_epoch_timestamps(conn: sqlite3.Connection):
+    """Время записей - целое число секунд Unix, плюс индексированный местный день"""
+    # Колонка added_at появилась в admins позже самой таблицы
+    add_column_if_missing(conn, 'admins', 'added_at', 'TIMESTAMP')
+
+    # Представление и триггер из прежнего database_improvements.sql (если его
+    # выполняли) читают текстовое время и после миграции давали бы неверные
+    # результаты (их заменяет user_status)
+    conn.execute('DROP VIEW IF EXISTS current_user_status')
+    conn.execute('DROP TRIGGER IF EXISTS update_daily_stats')
+
+    conn.execute('''
+        CREATE TABLE records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            location TEXT NOT NULL,
+            timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            day TEXT NOT NULL DEFAULT (date('now', 'localtime')),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # Старое время - CURRENT_TIMESTAMP, то есть текст в UTC
+    conn.execute('''
+        INSERT INTO records_new (id, user_id, action, location, timestamp, day)
+        SELECT id, user_id, action, location, epoch, date(epoch, 'unixepoch', 'localtime')
+        FROM (
+            SELECT id, user_id, action, location,
+                   COALESCE(CAST(strftime('%s', timestamp) AS INTEGER),
+                            CAST(strftime('%s', 'now') AS INTEGER)) AS epoch
+            FROM records
+        )
+    ''')
+    conn.execute('DROP TABLE records')
+    conn.execute('ALTER TABLE records_new RENAME TO records')
+
+    conn.execute('CREATE INDEX idx_records_user_id ON records (user_id)')
+    conn.execute('CREATE INDEX idx_records_timestamp ON records (timestamp)')
+    conn.execute('CREATE INDEX idx_records_user_timestamp ON records (user_id, timestamp)')
+    conn.execute('CREATE INDEX idx_records_day ON records (day)')
+
+    conn.execute('''
+        CREATE TABLE user_status_new (
+            user_id INTEGER PRIMARY KEY,
+            action TEXT NOT NULL,
+            location TEXT NOT NULL,
+            since INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO user_status_new (user_id, action, location, since)
+        SELECT user_id, action, location,
+               COALESCE(CAST(strftime('%s', since) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+        FROM user_status
+    ''')
+    conn.execute('DROP TABLE user_status')
+    conn.execute('ALTER TABLE user_status_new RENAME TO user_status')
+
+
+# Токенизатор unicode61 приводит кириллицу к нижнему регистру, но не считает
+# "ё" вариантом "е" - эту замену делаем сами при индексации и в запросе
+FTS_FOLD_SQL = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """Поддерживает ли сборка SQLite модуль FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def create_fts_index(conn: sqlite3.Connection, table: str, column: str):
+    """Индекс FTS5 {table}_fts по колонке таблицы с триггерами синхронизации"""
+    fts = f'{table}_fts'
+    new_value = FTS_FOLD_SQL.format(f'new.{column}')
+    old_value = FTS_FOLD_SQL.format(f'old.{column}')
+
+    # Индекс без хранения текста (content=''): в него попадает нормализованный
+    # текст, поэтому синхронизация - только триггерами ниже
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE {fts} USING fts5(
+            {column}, content='', tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.id, {new_value});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.id, {old_value});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.id, {old_value});
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.id, {new_value});
+        END
+    ''')
+    conn.execute(
+        f'INSERT INTO {fts} (rowid, {column}) SELECT id, {FTS_FOLD_SQL.format(column)} FROM {table}'
+    )
+
+
+def drop_fts_index(conn: sqlite3.Connection, table: str):
+    """Удалить индекс FTS5 таблицы и его триггеры"""
+    fts = f'{table}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    conn.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def migration_002_fts_search(conn: sqlite3.Connection):
+    """Полнотекстовый поиск FTS5 по ФИО и локациям записей"""
+    if not fts5_available(conn):
+        logging.warning("⚠️ SQLite собран без FTS5 - поиск будет работать через LIKE")
+        return
+
+    for table, column in (('users', 'full_name'), ('records', 'location')):
+        create_fts_index(conn, table, column)
+
+
+def migration_003_maintenance_runs(conn: sqlite3.Connection):
+    """Журнал фонового обслуживания базы (см. services/maintenance.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at INTEGER NOT NULL,
+            duration_ms REAL NOT NULL,
+            success INTEGER NOT NULL,
+            details TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_maintenance_runs_task ON maintenance_runs (task, started_at)')
+
+
+# Действия, означающие убытие: текущее и устаревшее ('убыл') написание.
+# Все остальные ('в части', 'прибыл') - присутствие
+LEGACY_ABSENT_ACTIONS = ('не в части', 'убыл')
+
+
+def migration_004_location_dictionary(conn: sqlite3.Connection):
+    """Справочник локаций и целочисленные коды действий в records"""
+    conn.execute('''
+        CREATE TABLE locations (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    # Сначала "Часть" и локации из конфигурации (маленькие id), затем
+    # встречающиеся в истории - от частых к редким
+    for name in [PRESENT_LOCATION] + configured_locations():
+        conn.execute('INSERT OR IGNORE INTO locations (name) VALUES (?)', (name,))
+    conn.execute('''
+        INSERT OR IGNORE INTO locations (name)
+        SELECT location FROM records GROUP BY location ORDER BY COUNT(*) DESC
+    ''')
+
+    # Поиск по локации теперь идет по справочнику, а не по каждой записи
+    drop_fts_index(conn, 'records')
+
+    conn.execute('''
+        CREATE TABLE records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            action INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            day TEXT NOT NULL DEFAULT (date('now', 'localtime')),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+    ''')
+    absent_actions = ', '.join(f"'{name}'" for name in LEGACY_ABSENT_ACTIONS)
+    conn.execute(f'''
+        INSERT INTO records_new (id, user_id, action, location_id, timestamp, day)
+        SELECT r.id, r.user_id,
+               CASE WHEN r.action IN ({absent_actions}) THEN {int(Action.ABSENT)} ELSE {int(Action.PRESENT)} END,
+               l.id, r.timestamp, r.day
+        FROM records r
+        JOIN locations l ON l.name = r.location
+    ''')
+    conn.execute('DROP TABLE records')
+    conn.execute('ALTER TABLE records_new RENAME TO records')
+
+    conn.execute('CREATE INDEX idx_records_user_id ON records (user_id)')
+    conn.execute('CREATE INDEX idx_records_timestamp ON records (timestamp)')
+    conn.execute('CREATE INDEX idx_records_user_timestamp ON records (user_id, timestamp)')
+    conn.execute('CREATE INDEX idx_records_day ON records (day)')
+    conn.execute('CREATE INDEX idx_records_location ON records (location_id)')
+
+    # user_status хранит текст: устаревшие 'прибыл'/'убыл' приводим к тем же
+    # названиям, что пишет add_record и сравнивают запросы статуса
+    conn.execute(f'''
+        UPDATE user_status
+        SET action = CASE WHEN action IN ({absent_actions}) THEN 'не в части' ELSE 'в части' END
+        WHERE action NOT IN ('в части', 'не в части')
+    ''')
+
+    # Чтение с текстовыми action и location - через представление
+    conn.execute(f'''
+        CREATE VIEW records_named AS
+        SELECT r.id, r.user_id, {ACTION_NAME_SQL.format('r.action')} AS action,
+               l.name AS location, r.timestamp, r.day, r.action AS action_code, r.location_id
+        FROM records r
+        JOIN locations l ON l.id = r.location_id
+    ''')
+
+    if fts5_available(conn):
+        create_fts_index(conn, 'locations', 'name')
+
+
+def migration_005_managed_indexes(conn: sqlite3.Connection):
+    """Покрывающие индексы горячих запросов (набор INDEXES в services/indexes.py)"""
+    sync_indexes(conn)
+
+
+def migration_006_absences(conn: sqlite3.Connection):
+    """Интервалы отсутствия (см. services/absences.py) с заполнением по истории"""
+    conn.execute('''
+        CREATE TABLE absences (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            started_at INTEGER NOT NULL,
+            ended_at INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+    ''')
+    sync_indexes(conn)
+    count = rebuild_absences(conn)
+    logging.info(f"Интервалов отсутствия по истории: {count}")
+
+
+def migration_007_rollups(conn: sqlite3.Connection):
+    """Сводные таблицы по дням и часам (см. services/rollups.py) с заполнением по истории"""
+    conn.execute('''
+        CREATE TABLE stats_daily (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            action INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, user_id, location_id, action)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE stats_hourly (
+            day TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            action INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, hour, action)
+        ) WITHOUT ROWID
+    ''')
+    counts = rebuild_rollups(conn)
+    logging.info(f"Сводки по истории: {counts['daily']} строк по дням, {counts['hourly']} по часам")
+
+
+MIGRATIONS = [
+    (1, "Время записей в секундах Unix и колонка day", migration_001_epoch_timestamps),
+    (2, "Полнотекстовый поиск FTS5", migration_002_fts_search),
+    (3, "Журнал обслуживания базы", migration_003_maintenance_runs),
+    (4, "Справочник локаций и коды действий", migration_004_location_dictionary),
+    (5, "Управляемый набор индексов", migration_005_managed_indexes),
+    (6, "Интервалы отсутствия", migration_006_absences),
+    (7, "Сводки по дням и часам", migration_007_rollups),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применить недостающие миграции. Вызывается внутри транзакции писателя.
+
+    Возвращает количество примененных миграций.
+    """
+    version = get_schema_version(conn)
+    applied = 0
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        logging.info(f"Миграция схемы {number}: {description}")
+        migration(conn)
+        # PRAGMA не принимает параметры; номер - целое число из списка выше
+        conn.execute(f'PRAGMA user_version = {int(number)}')
+        applied += 1
+    return applied
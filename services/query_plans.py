@@ -0,0 +1,183 @@
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from itertools import islice
+from typing import Callable, Dict, List, Tuple
+
+from services.db_service import DatabaseService
+from services.locations import ACTION_CODES, PRESENT_LOCATION, get_location_id
+
+# Проверка планов горячих запросов DatabaseService.
+#
+# Запуск: python -m services.query_plans [-v]
+#
+# На временной базе с тестовыми данными выполняются вызовы из HOT_CALLS,
+# каждый выполненный SQL перехватывается и проверяется через
+# EXPLAIN QUERY PLAN - без статистики и после ANALYZE. Полный проход по
+# records или absences (SCAN) в любом из них - регрессия: код возврата 1.
+
+# Имена, под которыми records и absences встречаются в планах (включая
+# псевдоним внутри представления records_named)
+HOT_ALIASES = {'records', 'r', 'r1', 'r2', 'absences', 'a'}
+SCAN_RE = re.compile(r'^SCAN (\w+)')
+SUBQUERY_RE = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\w+)')
+DML_RE = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+SEED_LOCATIONS = ["🏥 Поликлиника", "⚓ ОБРМП", "🌆 Калининград", "🛒 Магазин", "🍲 Столовая"]
+
+
+def _paginated_pages(db: DatabaseService):
+    first = db.get_records_paginated(per_page=10, location_filter='Поликлиника')
+    db.get_records_paginated(cursor=first['next_cursor'], per_page=10, location_filter='Поликлиника')
+    db.get_records_paginated(cursor=first['next_cursor'], per_page=10, user_filter='Боец0004')
+
+
+def _users_pages(db: DatabaseService):
+    first = db.get_users_paginated(per_page=20)
+    db.get_users_paginated(cursor=first['next_cursor'], per_page=20)
+
+
+HOT_CALLS: List[Tuple[str, Callable[[DatabaseService], object]]] = [
+    ('get_user', lambda db: db.get_user(42)),
+    ('is_admin', lambda db: db.is_admin(42)),
+    ('get_user_context', lambda db: db.get_user_context(42)),
+    ('add_record', lambda db: db.add_record(42, 'не в части', SEED_LOCATIONS[0])),
+    ('get_user_records', lambda db: db.get_user_records(42, 10)),
+    ('get_all_records', lambda db: db.get_all_records(7, 100)),
+    ('count_records', lambda db: db.count_records(30)),
+    ('get_top_locations', lambda db: db.get_top_locations(30)),
+    ('iter_records', lambda db: list(islice(db.iter_records(30, chunk_size=100), 250))),
+    ('get_records_paginated', _paginated_pages),
+    ('get_users_paginated', _users_pages),
+    ('get_current_status', lambda db: db.get_current_status()),
+    ('get_status_at', lambda db: db.get_status_at(int(time.time()) - 3600)),
+    ('search', lambda db: (db.search('Боец00042'), db.search('поликлиника'), db.search('поли', days=7))),
+    ('get_records_today', lambda db: db.get_records_today()),
+    ('get_records_yesterday', lambda db: db.get_records_yesterday()),
+    ('get_absence_totals', lambda db: db.get_absence_totals(30)),
+    ('get_location_durations', lambda db: db.get_location_durations(30)),
+    ('get_long_absences', lambda db: db.get_long_absences(24)),
+    ('get_period_stats', lambda db: db.get_period_stats(7)),
+    ('get_time_distribution', lambda db: db.get_time_distribution(30)),
+    ('rebuild_user_status', lambda db: db.rebuild_user_status()),
+]
+
+
+def seed(db: DatabaseService, users: int, records_per_user: int):
+    """Тестовые пользователи и записи за последние дни"""
+    with db.connections.writer() as conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO users (id, username, full_name) VALUES (?, ?, ?)',
+            [(uid, f"user_{uid}", f"Боец{uid:05d} И.И.") for uid in range(1, users + 1)]
+        )
+        location_ids = [get_location_id(conn, name) for name in SEED_LOCATIONS]
+        present_id = get_location_id(conn, PRESENT_LOCATION)
+        rows = []
+        for uid in range(1, users + 1):
+            for i in range(records_per_user):
+                absent = i % 2 == 0
+                rows.append((
+                    uid,
+                    ACTION_CODES['не в части' if absent else 'в части'],
+                    location_ids[(uid + i) % len(location_ids)] if absent else present_id,
+                    f"-{(records_per_user - i) * 15} minutes"
+                ))
+        conn.executemany(
+            'INSERT INTO records (user_id, action, location_id, timestamp, day) '
+            "VALUES (?1, ?2, ?3, CAST(strftime('%s', 'now', ?4) AS INTEGER), date('now', ?4, 'localtime'))",
+            rows
+        )
+    db.rebuild_user_status()
+    db.rebuild_absences()
+    db.rebuild_rollups()
+
+
+def collect_statements(db: DatabaseService) -> Dict[str, List[str]]:
+    """Выполнить HOT_CALLS и собрать SQL каждого вызова"""
+    statements = {}
+    current = []
+    db.connections.set_trace_callback(lambda sql: current.append(sql))
+    try:
+        for name, call in HOT_CALLS:
+            current.clear()
+            call(db)
+            seen = []
+            for sql in current:
+                if DML_RE.match(sql) and sql not in seen:
+                    seen.append(sql)
+            statements[name] = seen
+    finally:
+        db.connections.set_trace_callback(None)
+    return statements
+
+
+def explain(db: DatabaseService, sql: str) -> List[str]:
+    with db.connections.reader() as conn:
+        return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()]
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Строки плана с полным проходом по records или absences"""
+    # Проход по результату подзапроса (MATERIALIZE a / CO-ROUTINE a) - не по таблице
+    subqueries = {match.group(1) for match in map(SUBQUERY_RE.match, plan) if match}
+    scans = []
+    for detail in plan:
+        match = SCAN_RE.match(detail)
+        if match and match.group(1) in HOT_ALIASES and match.group(1) not in subqueries:
+            scans.append(detail)
+    return scans
+
+
+def check(db: DatabaseService, statements: Dict[str, List[str]], verbose: bool = False) -> List[tuple]:
+    """Проверить планы. Возвращает список регрессий (вызов, SQL, план)"""
+    regressions = []
+    for name, sqls in statements.items():
+        for sql in sqls:
+            plan = explain(db, sql)
+            bad = full_scans(plan)
+            if bad:
+                regressions.append((name, sql, plan))
+            if verbose or bad:
+                mark = '❌' if bad else '✅'
+                print(f"{mark} {name}: {' '.join(sql.split())[:100]}")
+                for detail in plan:
+                    print(f"      {detail}")
+    return regressions
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Проверка планов горячих запросов DatabaseService")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Печатать планы всех запросов")
+    parser.add_argument('--users', type=int, default=500, help="Пользователей в тестовой базе")
+    parser.add_argument('--records', type=int, default=40, help="Записей на пользователя")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = DatabaseService(os.path.join(workdir, 'query_plans.db'))
+        try:
+            seed(db, args.users, args.records)
+            statements = collect_statements(db)
+            total = sum(len(sqls) for sqls in statements.values())
+
+            regressions = []
+            for title, analyze in (("без статистики", False), ("после ANALYZE", True)):
+                if analyze:
+                    with db.connections.raw_writer() as conn:
+                        conn.execute('ANALYZE')
+                print(f"\nПланы запросов ({title}): {total} запросов в {len(statements)} вызовах")
+                found = check(db, statements, args.verbose)
+                regressions.extend(found)
+                print(f"{'❌' if found else '✅'} Полных проходов по records/absences: {len(found)}")
+        finally:
+            db.close()
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
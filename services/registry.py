@@ -0,0 +1,85 @@
+import os
+import threading
+from typing import Optional
+
+from services.db_service import DatabaseService
+from services.async_db_service import AsyncDatabaseService
+from services.cache import RenderCache
+from services.update_queue import UpdateScheduler, DEFAULT_CONCURRENCY, DEFAULT_QUEUE_LIMIT, DEFAULT_USER_QUEUE_LIMIT
+
+# Один DatabaseService на процесс: одна очередь записи, один пул соединений
+# и однократная проверка схемы. Модули получают его через get_db()/get_async_db()
+# вместо создания собственного экземпляра при импорте.
+
+_lock = threading.Lock()
+_db: Optional[DatabaseService] = None
+_async_db: Optional[AsyncDatabaseService] = None
+_replica_db: Optional[DatabaseService] = None
+_render_cache: Optional[RenderCache] = None
+_update_scheduler: Optional[UpdateScheduler] = None
+
+
+def get_db() -> DatabaseService:
+    """Общий DatabaseService; создается при первом вызове"""
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                _db = DatabaseService()
+    return _db
+
+
+def get_async_db() -> AsyncDatabaseService:
+    """Общий асинхронный фасад. База открывается при первом запросе, а не при импорте"""
+    global _async_db
+    if _async_db is None:
+        with _lock:
+            if _async_db is None:
+                _async_db = AsyncDatabaseService(db_factory=get_db)
+    return _async_db
+
+
+def get_render_cache() -> RenderCache:
+    """Общий кэш готовых экранов поверх get_async_db()"""
+    global _render_cache
+    if _render_cache is None:
+        with _lock:
+            if _render_cache is None:
+                _render_cache = RenderCache(get_async_db())
+    return _render_cache
+
+
+def get_update_scheduler(concurrency: int = DEFAULT_CONCURRENCY, queue_limit: int = DEFAULT_QUEUE_LIMIT,
+                         user_queue_limit: int = DEFAULT_USER_QUEUE_LIMIT) -> UpdateScheduler:
+    """Общий планировщик обновлений бота; параметры учитываются при первом вызове"""
+    global _update_scheduler
+    if _update_scheduler is None:
+        with _lock:
+            if _update_scheduler is None:
+                _update_scheduler = UpdateScheduler(concurrency, queue_limit, user_queue_limit)
+    return _update_scheduler
+
+
+def get_replica_db(replica_dir: str, db_name: str = "military_tracker.db") -> DatabaseService:
+    """Общий DatabaseService только для чтения поверх реплики (services/replication.py)"""
+    global _replica_db
+    if _replica_db is None:
+        with _lock:
+            if _replica_db is None:
+                _replica_db = DatabaseService(os.path.join(replica_dir, db_name), readonly=True)
+    return _replica_db
+
+
+def close_all():
+    """Закрыть общий сервис (при остановке бота)"""
+    global _db, _async_db, _replica_db
+    with _lock:
+        if _async_db is not None:
+            _async_db.executor.shutdown(wait=True)
+            _async_db = None
+        if _db is not None:
+            _db.close()
+            _db = None
+        if _replica_db is not None:
+            _replica_db.close()
+            _replica_db = None
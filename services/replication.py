@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from services.backup import SNAPSHOT_RE
+from services.wal import apply_frames, list_segments, read_segment
+
+# Реплика основной базы (теплый резерв) в другом каталоге.
+#
+# Основной процесс (ReplicationService) каждые REPLICATION_INTERVAL_SECONDS
+# захватывает WAL (WalArchiver) и кладет новые сегменты - а для первой
+# заливки или после пропуска в архиве и снимок - в <каталог>/inbox, где
+# inbox/primary.json хранит последний сегмент и время захвата. StandbyReplica
+# применяет входящие файлы к <каталог>/<имя базы>: в том же процессе или в
+# отдельном (python -m services.replication apply <каталог>).
+#
+# Реплика хранится в режиме rollback journal: страницы пишутся на место под
+# EXCLUSIVE-блокировкой SQLite, затем увеличивается счетчик изменений файла,
+# поэтому читатели (DatabaseService(readonly=True)) сбрасывают кэш и видят
+# только целые транзакции. Состояние реплики - <каталог>/replica.json.
+
+INBOX_DIR = 'inbox'
+STATE_FILE = 'replica.json'
+HEARTBEAT_FILE = 'primary.json'
+LOCK_FILE = 'apply.lock'
+REPLICATION_INTERVAL_SECONDS = 5
+# Сколько ждать читателей реплики перед записью страниц
+APPLY_LOCK_TIMEOUT_SECONDS = 30
+# Отставание, после которого мониторинг сообщает о проблеме
+LAG_WARNING_SECONDS = 300
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.error(f"Ошибка чтения {path}: {e}")
+        return {}
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def _copy_atomic(source: str, directory: str) -> str:
+    """Скопировать файл так, чтобы получатель не увидел его недописанным"""
+    target = os.path.join(directory, os.path.basename(source))
+    shutil.copyfile(source, target + '.tmp')
+    os.replace(target + '.tmp', target)
+    return target
+
+
+def _inbox_snapshots(inbox: str) -> List[str]:
+    if not os.path.isdir(inbox):
+        return []
+    return sorted(name for name in os.listdir(inbox) if SNAPSHOT_RE.match(name))
+
+
+class WalShipper:
+    """Доставка снимка и сегментов WAL основной базы во входящие реплики"""
+
+    def __init__(self, backups, replica_dir: str):
+        self.backups = backups
+        self.replica_dir = replica_dir
+        self.inbox = os.path.join(replica_dir, INBOX_DIR)
+        self._shipped: Optional[int] = None
+
+    def _needs_seed(self, state: Dict[str, Any]) -> bool:
+        if _inbox_snapshots(self.inbox):
+            return False
+        return state.get('seeded_at') is None or state.get('needs_seed') is not None
+
+    def ship(self) -> Dict[str, Any]:
+        """Отправить новые сегменты (и снимок, если реплике нужна заливка)"""
+        os.makedirs(self.inbox, exist_ok=True)
+        state = _read_json(os.path.join(self.replica_dir, STATE_FILE))
+        result = {'snapshot': None, 'segments': 0}
+
+        if self._needs_seed(state):
+            # Снимок должен покрывать сегмент, на котором реплика остановилась
+            required = state.get('needs_seed') or 0
+            snapshots = [s for s in self.backups.list_snapshots() if s['wal_seq'] >= required]
+            snapshot = snapshots[-1] if snapshots else self.backups.snapshot('replica')
+            result['snapshot'] = _copy_atomic(snapshot['path'], self.inbox)
+            self._shipped = snapshot['wal_seq']
+        elif self._shipped is None:
+            pending = [seq for seq, _, _, _ in list_segments(self.inbox)]
+            self._shipped = max(pending) if pending else state.get('seq', 0)
+
+        for seq, _, path, _ in list_segments(self.backups.wal.directory):
+            if seq > self._shipped:
+                _copy_atomic(path, self.inbox)
+                self._shipped = seq
+                result['segments'] += 1
+
+        _write_json(os.path.join(self.inbox, HEARTBEAT_FILE), {
+            'seq': self._shipped,
+            'captured_at': self.backups.wal.stats['last_capture'] or time.time(),
+            'shipped_at': time.time()
+        })
+        return result
+
+
+class StandbyReplica:
+    """Применение входящих снимков и сегментов WAL к файлу реплики"""
+
+    def __init__(self, replica_dir: str, db_name: str = 'military_tracker.db'):
+        self.replica_dir = replica_dir
+        self.inbox = os.path.join(replica_dir, INBOX_DIR)
+        self.path = os.path.join(replica_dir, db_name)
+        self.state_path = os.path.join(replica_dir, STATE_FILE)
+
+    def apply(self) -> Dict[str, Any]:
+        """Применить все, что пришло. Второй применяющий процесс пропускает запуск"""
+        os.makedirs(self.inbox, exist_ok=True)
+        with open(os.path.join(self.replica_dir, LOCK_FILE), 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return {'skipped': True}
+            return self._apply()
+
+    def _apply(self) -> Dict[str, Any]:
+        state = _read_json(self.state_path)
+        result = {'seeded': False, 'segments': 0, 'transactions': 0}
+
+        snapshots = _inbox_snapshots(self.inbox)
+        if snapshots:
+            match = SNAPSHOT_RE.match(snapshots[-1])
+            self._seed(os.path.join(self.inbox, snapshots[-1]))
+            state = {
+                'seq': int(match.group(2)),
+                'seeded_at': time.time(),
+                'synced_at': datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').timestamp(),
+                'needs_seed': None
+            }
+            for name in snapshots:
+                os.remove(os.path.join(self.inbox, name))
+            result['seeded'] = True
+            logging.info(f"Реплика заполнена из снимка {snapshots[-1]}")
+
+        if state.get('seeded_at') is None:
+            return result
+
+        ready = []
+        expected = state['seq'] + 1
+        for seq, captured_at, path, gap in list_segments(self.inbox):
+            if seq < expected:
+                # Уже в реплике (пришел до заливки из более нового снимка)
+                os.remove(path)
+                continue
+            if seq != expected or gap:
+                if state.get('needs_seed') is None:
+                    logging.warning(f"⚠️ Реплика остановлена перед сегментом {seq}: нужна новая заливка")
+                state['needs_seed'] = seq
+                break
+            ready.append((seq, captured_at, path))
+            expected += 1
+
+        if ready:
+            result['transactions'] = self._apply_segments([path for _, _, path in ready])
+            result['segments'] = len(ready)
+            state['seq'], state['synced_at'] = ready[-1][0], ready[-1][1]
+            for _, _, path in ready:
+                os.remove(path)
+
+        # Все доставленное применено - реплика совпадает с основной базой
+        # на момент последнего захвата
+        heartbeat = _read_json(os.path.join(self.inbox, HEARTBEAT_FILE))
+        if heartbeat and state['seq'] >= heartbeat.get('seq', 0) and state.get('needs_seed') is None:
+            state['synced_at'] = max(state.get('synced_at') or 0, heartbeat['captured_at'])
+
+        state['applied_at'] = time.time()
+        _write_json(self.state_path, state)
+        return result
+
+    def _seed(self, snapshot_path: str):
+        """Заполнить реплику из снимка через backup API (с блокировками SQLite)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.replica_dir, suffix='.seed')
+        os.close(fd)
+        try:
+            with gzip.open(snapshot_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            source = sqlite3.connect(tmp_path)
+            try:
+                source.execute('PRAGMA journal_mode=DELETE')
+                target = sqlite3.connect(self.path, timeout=APPLY_LOCK_TIMEOUT_SECONDS)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+        finally:
+            os.remove(tmp_path)
+
+    def _apply_segments(self, paths: List[str]) -> int:
+        """Записать страницы сегментов в реплику под EXCLUSIVE-блокировкой"""
+        conn = sqlite3.connect(self.path, timeout=APPLY_LOCK_TIMEOUT_SECONDS, isolation_level=None)
+        try:
+            conn.execute('BEGIN EXCLUSIVE')
+            # Файл закрывается только после COMMIT: закрытие любого дескриптора
+            # снимает POSIX-блокировки процесса, в том числе блокировку SQLite
+            db_file = open(self.path, 'r+b')
+            try:
+                db_file.seek(24)
+                counter = struct.unpack('>I', db_file.read(4))[0]
+                transactions = page_size = 0
+                for path in paths:
+                    applied, page_size = apply_frames(read_segment(path), db_file)
+                    transactions += applied
+                self._finish_header(db_file, counter, page_size)
+                db_file.flush()
+                os.fsync(db_file.fileno())
+                conn.execute('COMMIT')
+            finally:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                db_file.close()
+            return transactions
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _finish_header(db_file, counter: int, page_size: int):
+        """Заголовок реплики после записи страниц основной базы.
+
+        Режим rollback journal вместо WAL (байты 18-19), новый счетчик
+        изменений - по нему читатели сбрасывают кэш - и размер базы в страницах.
+        """
+        db_file.seek(0, os.SEEK_END)
+        pages = db_file.tell() // page_size
+        db_file.seek(0)
+        header = bytearray(db_file.read(100))
+        counter = (counter + 1) & 0xFFFFFFFF
+        header[18] = header[19] = 1
+        header[24:28] = struct.pack('>I', counter)
+        header[28:32] = struct.pack('>I', pages)
+        header[92:96] = struct.pack('>I', counter)
+        db_file.seek(0)
+        db_file.write(header)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Состояние реплики и отставание от основной базы"""
+        state = _read_json(self.state_path)
+        heartbeat = _read_json(os.path.join(self.inbox, HEARTBEAT_FILE))
+        synced_at = state.get('synced_at')
+        seq = state.get('seq')
+        return {
+            'path': self.path,
+            'seeded': state.get('seeded_at') is not None,
+            'seq': seq,
+            'primary_seq': heartbeat.get('seq'),
+            'pending': max(0, heartbeat.get('seq', 0) - (seq or 0)) if heartbeat else 0,
+            'synced_at': synced_at,
+            'applied_at': state.get('applied_at'),
+            'lag_seconds': round(time.time() - synced_at, 1) if synced_at else None,
+            'needs_seed': state.get('needs_seed')
+        }
+
+
+class ReplicationService:
+    """Доставка WAL в каталог реплики из основного процесса.
+
+    apply=True - реплика применяется здесь же; False - отдельным процессом
+    (python -m services.replication apply <каталог>).
+    """
+
+    def __init__(self, db, replica_dir: str, apply: bool = True):
+        self.db = db
+        self.replica_dir = replica_dir
+        self.apply_locally = apply
+        self.shipper = WalShipper(db.backups, replica_dir)
+        self.standby = StandbyReplica(replica_dir, os.path.basename(db.db_path))
+
+    def run_once(self) -> Dict[str, Any]:
+        """Захватить WAL, отправить и (apply=True) применить"""
+        if not self.db.backups.wal.enabled:
+            self.db.backups.wal.enable()
+        self.db.backups.wal.capture()
+        result = {'shipped': self.shipper.ship(), 'applied': None}
+        if self.apply_locally:
+            result['applied'] = self.standby.apply()
+        return result
+
+    async def run_forever(self, interval: float = REPLICATION_INTERVAL_SECONDS, executor=None):
+        """Цикл репликации для фоновой задачи asyncio"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(executor, self.run_once)
+            except Exception as e:
+                logging.error(f"Ошибка репликации: {e}")
+            await asyncio.sleep(interval)
+
+    def get_status(self) -> Dict[str, Any]:
+        return self.standby.get_status()
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Реплика базы: применение доставленного WAL")
+    parser.add_argument('command', choices=['apply', 'status'])
+    parser.add_argument('replica_dir', help="Каталог реплики (REPLICA_DIR основного процесса)")
+    parser.add_argument('--db-name', default='military_tracker.db', help="Имя файла базы")
+    parser.add_argument('--interval', type=float, default=REPLICATION_INTERVAL_SECONDS)
+    parser.add_argument('--once', action='store_true', help="Применить и выйти")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    standby = StandbyReplica(args.replica_dir, args.db_name)
+    if args.command == 'status':
+        print(json.dumps(standby.get_status(), ensure_ascii=False, indent=2))
+        return 0
+
+    while True:
+        try:
+            result = standby.apply()
+            if result.get('seeded') or result.get('segments'):
+                logging.info(f"Применено: {result}, отставание: {standby.get_status()['lag_seconds']} с")
+        except Exception as e:
+            logging.error(f"Ошибка применения реплики: {e}")
+            if args.once:
+                return 1
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,220 @@
+import asyncio
+import gzip
+import inspect
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+
+# Настройки очистки по умолчанию
+ARCHIVE_DIR = 'archive'
+# Не больше 999 параметров в одном DELETE (лимит старых сборок SQLite)
+DEFAULT_BATCH_SIZE = 500
+# Пауза между пакетами: в нее успевают пройти отметки из очереди записи
+DEFAULT_PAUSE_SECONDS = 0.05
+
+
+def _delete_batch_tx(conn: sqlite3.Connection, ids: list) -> int:
+    """Удалить пакет записей (операция очереди записи)"""
+    placeholders = ','.join('?' * len(ids))
+    return conn.execute(f'DELETE FROM records WHERE id IN ({placeholders})', ids).rowcount
+
+
+def _delete_orphan_status_tx(conn: sqlite3.Connection) -> int:
+    """Удалить статусы удаленных пользователей.
+
+    Остальные статусы остаются, даже если последняя отметка ушла в архив:
+    боец, убывший больше срока хранения назад, по-прежнему отсутствует.
+    """
+    return conn.execute(
+        'DELETE FROM user_status WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = user_status.user_id)'
+    ).rowcount
+
+
+def _delete_old_absences_tx(conn: sqlite3.Connection, cutoff: int) -> int:
+    """Удалить интервалы отсутствия, завершившиеся до границы очистки"""
+    return conn.execute('DELETE FROM absences WHERE ended_at < ?', (cutoff,)).rowcount
+
+
+class RetentionEngine:
+    """Очистка старых записей небольшими пакетами с архивированием.
+
+    Каждый пакет сначала копируется в архив за месяц записи
+    (``archive/records_YYYY-MM.db.gz`` - база SQLite, сжатая gzip), и только
+    после фиксации архива удаляется из основной базы через очередь записи.
+    Между пакетами блокировка записи свободна, поэтому отметки бойцов не ждут
+    окончания очистки. Если процесс прервется, повторный запуск продолжит с
+    того же места: уже заархивированные строки не дублируются.
+    """
+
+    def __init__(self, db, archive_dir: str = ARCHIVE_DIR,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 pause: float = DEFAULT_PAUSE_SECONDS):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self._lock = threading.Lock()
+
+    def run(self, days: int, progress: Optional[Callable] = None) -> Dict[str, Any]:
+        """Выполнить очистку синхронно. progress(stats) вызывается после каждого пакета"""
+        for stats in self._batches(days):
+            if progress:
+                progress(stats)
+            if not stats['finished']:
+                time.sleep(self.pause)
+        return stats
+
+    async def run_async(self, days: int, progress: Optional[Callable] = None,
+                        executor=None) -> Dict[str, Any]:
+        """Выполнить очистку, не блокируя цикл событий.
+
+        Каждый пакет выполняется в пуле потоков, progress может быть корутиной.
+        """
+        loop = asyncio.get_running_loop()
+        batches = self._batches(days)
+        try:
+            while True:
+                stats = await loop.run_in_executor(executor, next, batches)
+                if progress:
+                    result = progress(stats)
+                    if inspect.isawaitable(result):
+                        await result
+                if stats['finished']:
+                    return stats
+                await asyncio.sleep(self.pause)
+        finally:
+            batches.close()
+
+    def _batches(self, days: int):
+        """Генератор пакетов очистки: после каждого пакета отдает статистику"""
+        cutoff = int(time.time()) - days * 86400
+        stats = {
+            'cutoff': cutoff,
+            'total': 0,
+            'archived': 0,
+            'deleted': 0,
+            'batches': 0,
+            'archives': [],
+            'finished': False,
+            'skipped': False,
+            'elapsed': 0.0
+        }
+
+        if not self._lock.acquire(blocking=False):
+            logging.warning("Очистка уже выполняется - повторный запуск пропущен")
+            stats['finished'] = stats['skipped'] = True
+            yield stats
+            return
+
+        started = time.monotonic()
+        archives = {}
+        try:
+            with self.db.connections.reader() as conn:
+                stats['total'] = conn.execute(
+                    'SELECT COUNT(*) FROM records WHERE timestamp < ?', (cutoff,)
+                ).fetchone()[0]
+
+            while stats['deleted'] < stats['total']:
+                with self.db.connections.reader() as conn:
+                    rows = conn.execute('''
+                        SELECT r.id, r.user_id, u.full_name, r.action, r.location, r.timestamp, r.day
+                        FROM records_named r
+                        LEFT JOIN users u ON u.id = r.user_id
+                        WHERE r.timestamp < ?
+                        ORDER BY r.timestamp, r.id
+                        LIMIT ?
+                    ''', (cutoff, self.batch_size)).fetchall()
+                if not rows:
+                    break
+
+                stats['archived'] += self._archive_rows(archives, rows)
+                deleted = self.db.write_queue.submit(_delete_batch_tx, [row[0] for row in rows]).result()
+                if not deleted:
+                    # Строки кто-то уже удалил - не зацикливаемся
+                    break
+                self.db.cache.invalidate('records')
+                stats['deleted'] += deleted
+                stats['batches'] += 1
+                stats['elapsed'] = round(time.monotonic() - started, 2)
+                yield stats
+
+            if self.db.write_queue.submit(_delete_orphan_status_tx).result():
+                self.db.cache.invalidate('status')
+            self.db.write_queue.submit(_delete_old_absences_tx, cutoff).result()
+        finally:
+            stats['archives'] = self._close_archives(archives)
+            stats['elapsed'] = round(time.monotonic() - started, 2)
+            self.db.invalidate_count_cache()
+            self._lock.release()
+
+        stats['finished'] = True
+        if stats['deleted']:
+            logging.info(
+                f"Очистка: удалено {stats['deleted']} записей старше {days} дней "
+                f"за {stats['elapsed']} с, архивов: {len(stats['archives'])}"
+            )
+        yield stats
+
+    def _archive_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f'records_{month}.db')
+
+    def _open_archive(self, month: str) -> sqlite3.Connection:
+        """Открыть архив месяца, распаковав его, если он уже был создан"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self._archive_path(month)
+        # Несжатый файл остается только после прерванного запуска - он новее .gz
+        if not os.path.exists(path) and os.path.exists(path + '.gz'):
+            with gzip.open(path + '.gz', 'rb') as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                full_name TEXT,
+                action TEXT NOT NULL,
+                location TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                day TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        return conn
+
+    def _archive_rows(self, archives: dict, rows: list) -> int:
+        """Скопировать пакет в архивы по месяцам. Возвращает число новых строк"""
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row[6][:7], []).append(row)
+
+        added = 0
+        for month, month_rows in by_month.items():
+            conn = archives.get(month)
+            if conn is None:
+                conn = archives[month] = self._open_archive(month)
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?, ?, ?)', month_rows)
+            conn.commit()
+            added += conn.total_changes - before
+        return added
+
+    def _close_archives(self, archives: dict) -> list:
+        """Закрыть и сжать архивы. Возвращает пути к файлам .gz"""
+        paths = []
+        for month, conn in sorted(archives.items()):
+            path = self._archive_path(month)
+            try:
+                conn.close()
+                with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(path + '.gz.tmp', path + '.gz')
+                os.remove(path)
+                paths.append(path + '.gz')
+            except Exception as e:
+                logging.error(f"Ошибка сжатия архива {path}: {e}")
+        return paths
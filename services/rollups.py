@@ -0,0 +1,55 @@
+import sqlite3
+from typing import Dict
+
+# Сводные таблицы для экранов статистики:
+# - stats_daily: количество записей за местный день по бойцу, локации и действию;
+# - stats_hourly: количество записей по часам местного времени и действию
+#   (по бойцу и локации в разрезе часа строк почти столько же, сколько записей).
+#
+# Обновляются add_record в той же транзакции (apply_record), по истории
+# пересобираются rebuild_rollups. Очистка старых записей сводки не трогает:
+# счетчики за дни, ушедшие в архив, остаются.
+
+LOCAL_HOUR_SQL = "CAST(strftime('%H', {}, 'unixepoch', 'localtime') AS INTEGER)"
+
+
+def apply_record(conn: sqlite3.Connection, user_id: int, action: int,
+                 location_id: int, timestamp: int, day: str):
+    """Учесть новую запись в сводках (внутри транзакции писателя)"""
+    conn.execute('''
+        INSERT INTO stats_daily (day, user_id, location_id, action, count)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (day, user_id, location_id, action) DO UPDATE SET count = count + 1
+    ''', (day, user_id, location_id, action))
+    conn.execute(f'''
+        INSERT INTO stats_hourly (day, hour, action, count)
+        VALUES (?1, {LOCAL_HOUR_SQL.format('?2')}, ?3, 1)
+        ON CONFLICT (day, hour, action) DO UPDATE SET count = count + 1
+    ''', (day, timestamp, action))
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Пересобрать сводки по истории (внутри транзакции писателя).
+
+    Пересчитываются только дни, за которые в records еще есть записи;
+    более ранние (уже в архиве) сохраняются. Возвращает количество строк.
+    """
+    first_day = conn.execute('SELECT MIN(day) FROM records').fetchone()[0]
+    if first_day is None:
+        return {'daily': 0, 'hourly': 0}
+
+    conn.execute('DELETE FROM stats_daily WHERE day >= ?', (first_day,))
+    conn.execute('DELETE FROM stats_hourly WHERE day >= ?', (first_day,))
+    daily = conn.execute('''
+        INSERT INTO stats_daily (day, user_id, location_id, action, count)
+        SELECT day, user_id, location_id, action, COUNT(*)
+        FROM records
+        GROUP BY day, user_id, location_id, action
+    ''').rowcount
+    hourly = conn.execute(f'''
+        INSERT INTO stats_hourly (day, hour, action, count)
+        SELECT day, {LOCAL_HOUR_SQL.format('timestamp')} AS hour, action, COUNT(*)
+        FROM records
+        GROUP BY day, hour, action
+    ''').rowcount
+    return {'daily': daily, 'hourly': hourly}
@@ -0,0 +1,106 @@
+import sys
+from typing import Any, Dict, Optional
+
+# Компактные строки результатов для массовых выборок (журнал, экспорт, аналитика).
+# Вместо dict на каждую строку - объект со __slots__, а повторяющиеся строки
+# (ФИО, локация, действие) интернируются и хранятся в памяти один раз.
+# Доступ по ключу (record['full_name']) и .get() сохранены, поэтому код,
+# работавший со словарями, не меняется.
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Row:
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь для JSON и pandas"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class Record(Row):
+    """Запись журнала. Колонки запроса - RECORD_COLUMNS, в том же порядке"""
+    __slots__ = ('id', 'user_id', 'action', 'location', 'timestamp', 'day', 'full_name')
+
+    def __init__(self, id: int, user_id: int, action: str, location: str,
+                 timestamp: int, day: str, full_name: Optional[str] = None):
+        self.id = id
+        self.user_id = user_id
+        self.action = _intern(action)
+        self.location = _intern(location)
+        self.timestamp = timestamp
+        self.day = _intern(day)
+        self.full_name = _intern(full_name)
+
+    @classmethod
+    def from_row(cls, cursor, row: tuple) -> 'Record':
+        """row_factory для курсора"""
+        return cls(*row)
+
+
+class User(Row):
+    """Пользователь. Колонки запроса - USER_COLUMNS, в том же порядке"""
+    __slots__ = ('id', 'username', 'full_name', 'created_at', 'is_admin')
+
+    def __init__(self, id: int, username: str, full_name: str,
+                 created_at: Optional[str] = None, is_admin: Any = False):
+        self.id = id
+        self.username = username
+        self.full_name = _intern(full_name)
+        self.created_at = created_at
+        self.is_admin = is_admin
+
+    @classmethod
+    def from_row(cls, cursor, row: tuple) -> 'User':
+        """row_factory для курсора"""
+        return cls(*row)
+
+
+class UserContext(Row):
+    """Пользователь обновления бота: профиль, права и текущий статус.
+
+    user - словарь как у get_user (None - не зарегистрирован); action,
+    location и since - последняя отметка из user_status (None - отметок нет).
+    """
+    __slots__ = ('user_id', 'user', 'is_admin', 'action', 'location', 'since')
+
+    def __init__(self, user_id: int, user: Optional[Dict[str, Any]], is_admin: bool,
+                 action: Optional[str] = None, location: Optional[str] = None,
+                 since: Optional[int] = None):
+        self.user_id = user_id
+        self.user = user
+        self.is_admin = is_admin
+        self.action = action
+        self.location = location
+        self.since = since
+
+
+# Для запросов вида FROM records r JOIN users u
+RECORD_COLUMNS = 'r.id, r.user_id, r.action, r.location, r.timestamp, r.day, u.full_name'
+USER_COLUMNS = 'id, username, full_name, created_at, is_admin'
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, Optional
+
+# Планировщик обновлений бота. aiogram запускает каждое обновление отдельной
+# задачей без ограничений: медленный экспорт одного админа занимает общие
+# ресурсы, а всплеск обновлений копит задачи в памяти. Здесь:
+#  - обновления разных пользователей идут параллельно, не больше concurrency;
+#  - обновления одного пользователя - строго по очереди (FSM-состояния
+#    UserStates/AdminStates зависят от порядка);
+#  - в ожидании не больше queue_limit обновлений (и user_queue_limit от
+#    одного пользователя), остальные сразу отклоняются.
+# asyncio.Lock и asyncio.Semaphore будят ожидающих в порядке прихода, поэтому
+# очередь пользователя сохраняет порядок получения обновлений.
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_QUEUE_LIMIT = 200
+DEFAULT_USER_QUEUE_LIMIT = 5
+
+
+class _UserQueue:
+    """Очередь одного пользователя: замок и число его обновлений в работе"""
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class UpdateScheduler:
+    """Ограничение параллелизма с порядком внутри пользователя и сбросом нагрузки"""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, queue_limit: int = DEFAULT_QUEUE_LIMIT,
+                 user_queue_limit: int = DEFAULT_USER_QUEUE_LIMIT):
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, queue_limit)
+        self.user_queue_limit = max(1, user_queue_limit)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # Очереди удаляются, когда у пользователя не остается обновлений
+        self._users: Dict[Hashable, _UserQueue] = {}
+        self.active = 0
+        self.queued = 0
+        self._last_shed_at: Optional[float] = None
+        self.stats = {
+            'processed': 0,
+            'shed': 0,
+            'queued_peak': 0,
+            'wait_ms': 0.0,
+            'wait_ms_max': 0.0
+        }
+
+    @asynccontextmanager
+    async def slot(self, key: Optional[Hashable]) -> AsyncIterator[bool]:
+        """Дождаться очереди для обновления пользователя key.
+
+        Отдает True, когда можно обрабатывать, или сразу False, если очередь
+        переполнена и обновление отклонено. key=None - обновление без
+        пользователя: только общий лимит.
+        """
+        user = self._users.get(key) if key is not None else None
+        if self.queued >= self.queue_limit or (user is not None and user.pending >= self.user_queue_limit):
+            self.stats['shed'] += 1
+            self._last_shed_at = time.monotonic()
+            yield False
+            return
+
+        if key is not None and user is None:
+            user = self._users[key] = _UserQueue()
+        if user is not None:
+            user.pending += 1
+        self.queued += 1
+        self.stats['queued_peak'] = max(self.stats['queued_peak'], self.queued)
+        started = time.monotonic()
+        waiting = True
+
+        try:
+            if user is not None:
+                await user.lock.acquire()
+            try:
+                async with self._semaphore:
+                    waiting = False
+                    self.queued -= 1
+                    waited = (time.monotonic() - started) * 1000
+                    self.stats['wait_ms'] += waited
+                    self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], waited)
+                    self.active += 1
+                    try:
+                        yield True
+                    finally:
+                        self.active -= 1
+                        self.stats['processed'] += 1
+            finally:
+                if user is not None:
+                    user.lock.release()
+        finally:
+            # Отмена во время ожидания
+            if waiting:
+                self.queued -= 1
+            if user is not None:
+                user.pending -= 1
+                if not user.pending:
+                    del self._users[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: глубина очереди, ожидание (мс), отклоненные"""
+        stats = dict(self.stats)
+        started = stats['processed'] + self.active
+        stats.update({
+            'active': self.active,
+            'queued': self.queued,
+            'users': len(self._users),
+            'concurrency': self.concurrency,
+            'queue_limit': self.queue_limit,
+            'wait_ms_avg': round(stats['wait_ms'] / started, 2) if started else 0.0,
+            'wait_ms_max': round(stats['wait_ms_max'], 2),
+            'last_shed_seconds': (round(time.monotonic() - self._last_shed_at)
+                                  if self._last_shed_at is not None else None)
+        })
+        del stats['wait_ms']
+        return stats
@@ -0,0 +1,209 @@
+import gzip
+import logging
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# Архив WAL для восстановления на момент времени.
+#
+# Пока архив включен, автоматический checkpoint писателя отключен, и WAL
+# переносится в основной файл только здесь: под блокировкой писателя новые
+# подтвержденные кадры копируются в сегмент wal_<номер>_<время>.gz (заголовок
+# WAL + кадры как есть), после чего выполняется wal_checkpoint(TRUNCATE).
+# Если журнал перезапустился без захвата (checkpoint другим процессом), сегмент
+# помечается _gap: применять его и следующие к более старым снимкам нельзя.
+# Восстановление - снимок плюс все сегменты после него, кадры пишутся на свои
+# страницы по порядку (apply_segment). Точность восстановления - интервал
+# между захватами.
+
+WAL_HEADER_SIZE = 32
+FRAME_HEADER_SIZE = 24
+WAL_MAGIC = (0x377f0682, 0x377f0683)
+SEGMENT_COMPRESSLEVEL = 1
+SEGMENT_RE = re.compile(r'^wal_(\d{10})_(\d+)(_gap)?\.gz$')
+
+
+def segment_name(seq: int, captured_at: int, gap: bool = False) -> str:
+    return f"wal_{seq:010d}_{captured_at}{'_gap' if gap else ''}.gz"
+
+
+def list_segments(directory: str) -> List[Tuple[int, int, str, bool]]:
+    """Сегменты архива по порядку: (номер, время захвата, путь, после пропуска)"""
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in os.listdir(directory):
+        match = SEGMENT_RE.match(name)
+        if match:
+            segments.append((int(match.group(1)), int(match.group(2)),
+                             os.path.join(directory, name), bool(match.group(3))))
+    return sorted(segments)
+
+
+def parse_header(header: bytes) -> Dict[str, int]:
+    """Заголовок WAL: размер страницы и соль текущего поколения журнала"""
+    magic, version, page_size, checkpoint_seq, salt1, salt2 = struct.unpack('>6I', header[:24])
+    if magic not in WAL_MAGIC:
+        raise ValueError("Файл не является журналом WAL")
+    return {'page_size': page_size, 'checkpoint_seq': checkpoint_seq, 'salt': (salt1, salt2)}
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, int, bytes]]:
+    """Кадры сегмента: (номер страницы, размер базы в страницах для коммита или 0, страница)"""
+    page_size = parse_header(data)['page_size']
+    frame_size = FRAME_HEADER_SIZE + page_size
+    for offset in range(WAL_HEADER_SIZE, len(data) - frame_size + 1, frame_size):
+        pgno, commit_size = struct.unpack('>2I', data[offset:offset + 8])
+        yield pgno, commit_size, data[offset + FRAME_HEADER_SIZE:offset + frame_size]
+
+
+def read_segment(path: str) -> bytes:
+    with gzip.open(path, 'rb') as f:
+        return f.read()
+
+
+def apply_frames(data: bytes, db_file) -> Tuple[int, int]:
+    """Записать кадры сегмента в открытый файл базы.
+
+    Возвращает (число транзакций, размер страницы).
+    """
+    page_size = parse_header(data)['page_size']
+    transactions = 0
+    pending = []
+    for pgno, commit_size, page in iter_frames(data):
+        pending.append((pgno, page))
+        if not commit_size:
+            continue
+        # Страницы пишутся только целой транзакцией - по кадру коммита
+        for frame_pgno, frame_page in pending:
+            db_file.seek((frame_pgno - 1) * page_size)
+            db_file.write(frame_page)
+        db_file.truncate(commit_size * page_size)
+        pending = []
+        transactions += 1
+    return transactions, page_size
+
+
+def apply_segment(path: str, target: str) -> int:
+    """Применить кадры сегмента к файлу базы (без WAL). Возвращает число транзакций"""
+    with open(target, 'r+b') as db_file:
+        return apply_frames(read_segment(path), db_file)[0]
+
+
+class WalArchiver:
+    """Захват подтвержденных кадров WAL в сегменты архива"""
+
+    def __init__(self, db, directory: str):
+        self.db = db
+        self.directory = directory
+        self.enabled = False
+        # Позиция в текущем поколении WAL: соль заголовка и число уже
+        # скопированных кадров. После перезапуска процесса неизвестна -
+        # журнал копируется с начала (повторное применение кадров безвредно)
+        self._salt = None
+        self._frame = 0
+        # WAL перезапускался без захвата - нужен новый снимок
+        self.gap = False
+        self._lock = threading.Lock()
+        self.stats = {
+            'captures': 0,
+            'frames': 0,
+            'bytes': 0,
+            'last_capture': None,
+            'last_segment': None
+        }
+
+    @property
+    def wal_path(self) -> str:
+        return self.db.db_path + '-wal'
+
+    def enable(self):
+        """Включить архив: автоматический checkpoint писателя больше не сбросит WAL"""
+        if self.db.connections.shared_memory:
+            logging.warning("⚠️ Архив WAL недоступен для базы в памяти")
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self.db.connections.raw_writer() as conn:
+            conn.execute('PRAGMA wal_autocheckpoint=0')
+        self.enabled = True
+
+    def last_seq(self) -> int:
+        segments = list_segments(self.directory)
+        return segments[-1][0] if segments else 0
+
+    def capture(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+        """Скопировать новые кадры WAL в сегмент и обрезать журнал.
+
+        conn - соединение писателя, если блокировка писателя уже взята
+        (снимок захватывает хвост журнала, не отпуская ее).
+        """
+        if conn is None:
+            with self.db.connections.raw_writer() as conn:
+                return self.capture(conn)
+
+        with self._lock:
+            # PASSIVE возвращает число кадров в журнале - все они подтверждены,
+            # потому что под блокировкой писателя транзакций нет
+            _, frames, _ = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            result = {'frames': 0, 'segment': None, 'busy': 0}
+            gap = False
+
+            if frames > 0 and os.path.exists(self.wal_path):
+                with open(self.wal_path, 'rb') as wal:
+                    header = wal.read(WAL_HEADER_SIZE)
+                    info = parse_header(header)
+                    if info['salt'] != self._salt:
+                        if self._salt is not None and self._frame:
+                            logging.warning("⚠️ WAL перезапущен без захвата - нужен новый снимок")
+                            self.gap = gap = True
+                        self._salt, self._frame = info['salt'], 0
+
+                    frame_size = FRAME_HEADER_SIZE + info['page_size']
+                    wal.seek(WAL_HEADER_SIZE + self._frame * frame_size)
+                    body = wal.read((frames - self._frame) * frame_size)
+
+                if body:
+                    seq = self.last_seq() + 1
+                    captured_at = int(time.time())
+                    path = os.path.join(self.directory, segment_name(seq, captured_at, gap))
+                    # Сжатие идет под блокировкой писателя - быстрый уровень
+                    with gzip.open(path + '.tmp', 'wb', compresslevel=SEGMENT_COMPRESSLEVEL) as f:
+                        f.write(header)
+                        f.write(body)
+                    os.replace(path + '.tmp', path)
+
+                    result.update(frames=len(body) // frame_size, segment=path)
+                    self.stats['captures'] += 1
+                    self.stats['frames'] += result['frames']
+                    self.stats['bytes'] += os.path.getsize(path)
+                    self.stats['last_segment'] = path
+                self._frame = frames
+
+            busy, _, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+            result['busy'] = busy
+            if not busy or checkpointed >= frames:
+                # Все кадры перенесены: следующий коммит может начать новое
+                # поколение журнала, и это не пропуск
+                self._salt, self._frame = None, 0
+            self.stats['last_capture'] = time.time()
+            return result
+
+    def prune(self, before_seq: int) -> int:
+        """Удалить сегменты с номером меньше before_seq. Возвращает их число.
+
+        Сегмент before_seq остается: по последнему сегменту продолжается нумерация.
+        """
+        removed = 0
+        for seq, _, path, _ in list_segments(self.directory):
+            if seq >= before_seq:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logging.error(f"Ошибка удаления сегмента WAL {path}: {e}")
+        return removed
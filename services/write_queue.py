@@ -0,0 +1,157 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any
+
+from services.connection_manager import ConnectionManager
+
+# Настройки групповой фиксации по умолчанию
+DEFAULT_MAX_BATCH = 128
+# Без задержки пакет составляют операции, накопившиеся за время предыдущего
+# коммита: одиночная запись не ждет, а при всплеске пакеты растут сами
+DEFAULT_MAX_DELAY_MS = 0
+
+
+class WriteQueue:
+    """Единственный поток-писатель с групповой фиксацией транзакций.
+
+    Операции, поступившие почти одновременно (например, отметки всего
+    подразделения после построения), собираются в пакет и выполняются в одной
+    транзакции - один коммит вместо коммита на каждую запись. Каждая операция
+    выполняется внутри собственного SAVEPOINT, поэтому ошибка одной операции
+    откатывает только ее, а каждый вызывающий получает свой результат через Future.
+
+    Операция - функция вида ``func(conn, *args)``, выполняемая на соединении писателя.
+    """
+
+    _STOP = object()
+
+    def __init__(self, connections: ConnectionManager,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 max_delay_ms: float = DEFAULT_MAX_DELAY_MS):
+        self.connections = connections
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        # Время последнего пакета (time.monotonic) - по нему ищем окна простоя
+        self.last_activity = time.monotonic()
+
+        self.stats = {
+            'operations': 0,
+            'batches': 0,
+            'failed_operations': 0,
+            'failed_batches': 0,
+            'max_batch_size': 0
+        }
+
+    def submit(self, func, *args) -> Future:
+        """Поставить операцию в очередь и вернуть Future с ее результатом"""
+        if self._closed:
+            raise RuntimeError("Очередь записи закрыта")
+        self._ensure_started()
+
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self, first) -> list:
+        """Добрать в пакет ожидающие операции и пришедшие в течение max_delay"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is self._STOP:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is self._STOP:
+                return
+
+            batch = self._collect_batch(first)
+            stop = batch[-1] is self._STOP
+            if stop:
+                batch.pop()
+
+            if batch:
+                self._execute(batch)
+            if stop:
+                return
+
+    def _execute(self, batch: list):
+        """Выполнить пакет операций в одной транзакции"""
+        results = []
+        try:
+            with self.connections.writer() as conn:
+                for future, func, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT write_op")
+                    try:
+                        result = func(conn, *args)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_op")
+                        conn.execute("RELEASE write_op")
+                        results.append((future, e, False))
+                    else:
+                        conn.execute("RELEASE write_op")
+                        results.append((future, result, True))
+        except Exception as e:
+            # Коммит не удался - ни одна операция пакета не сохранена
+            logging.error(f"Ошибка фиксации пакета записи ({len(batch)} операций): {e}")
+            self.stats['failed_batches'] += 1
+            for future, _, _ in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        self.last_activity = time.monotonic()
+        self.stats['batches'] += 1
+        self.stats['operations'] += len(results)
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(results))
+
+        # Результаты отдаем только после успешного коммита
+        for future, value, ok in results:
+            if ok:
+                future.set_result(value)
+            else:
+                self.stats['failed_operations'] += 1
+                future.set_exception(value)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика групповой фиксации"""
+        stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        stats['idle_seconds'] = round(time.monotonic() - self.last_activity, 1)
+        stats['avg_batch_size'] = round(stats['operations'] / stats['batches'], 2) if stats['batches'] else 0
+        return stats
+
+    def close(self):
+        """Дождаться выполнения поставленных операций и остановить поток"""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
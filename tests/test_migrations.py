@@ -0,0 +1,102 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from services.db_service import DatabaseService
+from services.locations import Action
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Схема базы до миграций: текстовые action/location и время CURRENT_TIMESTAMP
+LEGACY_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT NOT NULL,
+        is_admin BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        action TEXT NOT NULL,
+        location TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        comment TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE admins (
+        user_id INTEGER PRIMARY KEY,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+'''
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Резервные копии и архивы создаются в текущем каталоге
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def action_counts(db):
+    with db.connections.reader() as conn:
+        return dict(conn.execute('SELECT action, COUNT(*) FROM records GROUP BY action').fetchall())
+
+
+def test_legacy_arrival_is_present(workdir):
+    path = str(workdir / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO users (id, full_name) VALUES (1, 'Иванов Иван'), (2, 'Петров Петр')")
+    conn.executemany('INSERT INTO records (user_id, action, location, timestamp) VALUES (?, ?, ?, ?)', [
+        (1, 'убыл', '🏛️ МФЦ', '2025-07-16 08:00:00'),
+        (1, 'прибыл', '🏛️ МФЦ', '2025-07-16 12:00:00'),
+        (2, 'не в части', '🩺 ВВК', '2025-07-16 09:00:00'),
+        (2, 'в части', 'Часть', '2025-07-16 10:00:00'),
+        (2, 'убыл', '🚓 Патруль', '2025-07-16 11:00:00'),
+    ])
+    conn.commit()
+    conn.close()
+
+    db = DatabaseService(path)
+    try:
+        assert action_counts(db) == {int(Action.PRESENT): 2, int(Action.ABSENT): 3}
+
+        with db.connections.reader() as conn:
+            status = dict(conn.execute('SELECT user_id, action FROM user_status').fetchall())
+            open_absences = [row[0] for row in conn.execute(
+                'SELECT user_id FROM absences WHERE ended_at IS NULL ORDER BY user_id'
+            )]
+            departures = conn.execute(
+                'SELECT SUM(count) FROM stats_daily WHERE action = ?', (int(Action.ABSENT),)
+            ).fetchone()[0]
+        assert status == {1: 'в части', 2: 'не в части'}
+        assert open_absences == [2]
+        assert departures == 3
+
+        current = db.get_current_status()
+        assert (current['present'], current['absent']) == (1, 1)
+    finally:
+        db.close()
+
+
+def test_shipped_database_action_codes(workdir):
+    path = str(workdir / 'military_tracker.db')
+    shutil.copy(os.path.join(REPO_DIR, 'military_tracker.db'), path)
+    with sqlite3.connect(path) as conn:
+        if conn.execute('PRAGMA user_version').fetchone()[0]:
+            pytest.skip('military_tracker.db уже мигрирована')
+        legacy = dict(conn.execute('SELECT action, COUNT(*) FROM records GROUP BY action').fetchall())
+
+    db = DatabaseService(path)
+    try:
+        assert action_counts(db) == {
+            int(Action.PRESENT): legacy.get('в части', 0) + legacy.get('прибыл', 0),
+            int(Action.ABSENT): legacy.get('не в части', 0) + legacy.get('убыл', 0),
+        }
+    finally:
+        db.close()
@@ -1,6 +1,7 @@
 
 import re
 import unicodedata
+from datetime import datetime, timedelta
 from typing import Optional
 
 def validate_full_name(full_name: str) -> bool:
@@ -126,6 +127,71 @@ def validate_time_format(time_str: str) -> bool:
     pattern = r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
     return bool(re.match(pattern, time_str))
 
+def parse_moment(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Разбор момента времени в прошлом (местное время)
+
+    Форматы:
+    • "14:00" - ближайшие прошедшие 14:00 (сегодня или вчера)
+    • "вчера 14:00", "сегодня 9:30"
+    • "16.10 14:00", "16.10.2025 14:00"
+    • "2025-10-16T14:00" (ISO 8601) и секунды Unix - для API
+
+    Возвращает None, если формат не распознан или момент в будущем.
+    """
+    if not isinstance(text, str):
+        return None
+
+    now = now or datetime.now()
+    text = ' '.join(text.strip().lower().split())
+    if not text:
+        return None
+
+    if text.isdigit():
+        try:
+            moment = datetime.fromtimestamp(int(text))
+        except (OverflowError, OSError, ValueError):
+            return None
+        return moment if moment <= now else None
+
+    try:
+        moment = datetime.fromisoformat(text.upper())
+        if moment.tzinfo is not None:
+            moment = moment.astimezone().replace(tzinfo=None)
+        return moment if moment <= now else None
+    except ValueError:
+        pass
+
+    match = re.match(
+        r'^(?:(вчера|сегодня)\s+|(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?\s+)?(\d{1,2}):(\d{2})$', text
+    )
+    if not match:
+        return None
+
+    word, day, month, year, hour, minute = match.groups()
+    if int(hour) > 23 or int(minute) > 59:
+        return None
+
+    try:
+        if day:
+            base = datetime(int(year) if year else now.year, int(month), int(day))
+        else:
+            base = now - timedelta(days=1) if word == 'вчера' else now
+        moment = base.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0)
+    except ValueError:
+        return None
+
+    # "14:00" без дня - последние прошедшие 14:00
+    if not day and not word and moment > now:
+        moment -= timedelta(days=1)
+    # "16.10" без года в будущем - тот же день прошлого года
+    if day and not year and moment > now:
+        try:
+            moment = moment.replace(year=moment.year - 1)
+        except ValueError:
+            return None
+
+    return moment if moment <= now else None
+
 def validate_user_id(user_id) -> bool:
     """Валидация Telegram user ID"""
     try:
@@ -1,13 +1,18 @@
 
 from flask import Flask, render_template_string, jsonify, request
-from services.db_service import DatabaseService
+from services.registry import get_db, get_replica_db
+from utils.validators import parse_moment
 from monitoring import monitor, get_system_status
+from config import DB_NAME, REPLICA_DIR
 import json
 from datetime import datetime
-import os
 
 app = Flask(__name__)
-db = DatabaseService()
+
+def get_panel_db():
+    """База панели. Панель только читает: при заданном REPLICA_DIR запросы
+    идут в реплику, а не в рабочую базу бота. Открывается при первом запросе"""
+    return get_replica_db(REPLICA_DIR, DB_NAME) if REPLICA_DIR else get_db()
 
 # HTML шаблон для главной страницы
 HTML_TEMPLATE = """
@@ -295,10 +300,33 @@ def index():
 
 @app.route('/api/status')
 def api_status():
-    """API: Общая статистика"""
+    """API: Общая статистика. ?at= - статус на момент в прошлом
+    (секунды Unix, ISO 8601 или "вчера 14:00")"""
     try:
+        at = request.args.get('at')
+        if at:
+            moment = parse_moment(at)
+            if moment is None:
+                return jsonify({'error': 'Неверный параметр at: нужен момент в прошлом'}), 400
+
+            status = get_panel_db().get_status_at(int(moment.timestamp()))
+            history_from = status.get('history_from')
+            return jsonify({
+                'at': moment.isoformat(),
+                'total_users': status['total'],
+                'present_count': status['present'],
+                'absent_count': status['absent'],
+                'absent_list': status['absent_list'],
+                'location_groups': {
+                    location: group['count'] for location, group in status.get('location_groups', {}).items()
+                },
+                'complete': history_from is None or history_from <= status['at'],
+                'timestamp': datetime.now().isoformat()
+            })
+
+        db = get_panel_db()
         status = db.get_current_status()
-        records_today = len(db.get_records_today())
+        records_today = db.get_period_stats(days=1)['total']
         
         return jsonify({
             'total_users': status['total'],
@@ -314,9 +342,9 @@ def api_status():
 def api_users():
     """API: Список пользователей"""
     try:
-        users = db.get_all_users()
+        users = get_panel_db().get_all_users()
         return jsonify({
-            'users': users,
+            'users': [user.to_dict() for user in users],
             'total': len(users),
             'timestamp': datetime.now().isoformat()
         })
@@ -330,9 +358,9 @@ def api_records():
         days = request.args.get('days', 7, type=int)
         limit = request.args.get('limit', 50, type=int)
         
-        records = db.get_all_records(days=days, limit=limit)
+        records = get_panel_db().get_all_records(days=days, limit=limit)
         return jsonify({
-            'records': records,
+            'records': [record.to_dict() for record in records],
             'count': len(records),
             'period_days': days,
             'timestamp': datetime.now().isoformat()
@@ -355,6 +383,7 @@ def api_export():
     try:
         format_type = request.args.get('format', 'json')
         days = request.args.get('days', 30, type=int)
+        db = get_panel_db()
         
         if format_type == 'excel':
             filename = db.export_to_excel(days=days)
@@ -368,7 +397,7 @@ def api_export():
                 return jsonify({'error': 'Не удалось создать Excel файл'}), 500
                 
         else:  # JSON по умолчанию
-            records = db.get_all_records(days=days)
+            records = [record.to_dict() for record in db.iter_records(days=days)]
             return jsonify({
                 'records': records,
                 'export_date': datetime.now().isoformat(),